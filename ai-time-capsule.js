@@ -1,75 +1,236 @@
 // ai-time-capsule.js
 document.addEventListener('DOMContentLoaded', () => {
     const articlesGrid = document.getElementById('ai-articles-grid');
+    const searchInput = document.getElementById('ai-search-input');
+    const searchStatus = document.getElementById('ai-search-status');
+    const assetManifestUrl = document.documentElement.dataset.assetManifest; // Set on the published page by site_publisher.py: logical name -> fingerprinted file
     const articlesDataUrl = 'ai_articles.json'; // Path to your JSON data
+    const searchIndexUrl = 'search_index/'; // Sharded full-text index built by generate_ai_analysis.py (search_index.py)
+    const maxSearchResults = 20;
+    const minPrefixLength = 3; // The last query term also matches longer words once it has this many characters
+
+    let allArticles = [];
+    let searchManifest = null;
+    const searchFileCache = new Map(); // Shard/doc block file name -> parsed JSON promise
+    let assetManifest = null;
+
+    // Current fingerprinted path of a published file; the plain name when serving the unpublished tree.
+    function assetUrl(name) {
+        if (!assetManifestUrl) {
+            return Promise.resolve(name);
+        }
+        if (!assetManifest) {
+            assetManifest = fetch(assetManifestUrl, { cache: 'no-cache' })
+                .then(response => (response.ok ? response.json() : {}))
+                .catch(() => ({}));
+        }
+        return assetManifest.then(manifest => manifest[name] || name);
+    }
+
+    function createArticleCard(article) {
+        const articleCard = document.createElement('div');
+        articleCard.className = 'ai-article-card';
+
+        if (article.image_path) {
+            const img = document.createElement('img');
+            img.src = article.image_path;
+            img.alt = article.title;
+            img.onerror = function() {
+                this.style.display = 'none'; // Hide broken images
+            };
+            articleCard.appendChild(img);
+        }
+
+        const contentDiv = document.createElement('div');
+        contentDiv.className = 'ai-article-card-content';
+
+        const title = document.createElement('h3');
+        const titleLink = document.createElement('a');
+        titleLink.href = article.wayback_url; // Link to Wayback Machine snapshot
+        titleLink.target = "_blank"; // Open in new tab
+        titleLink.rel = "noopener noreferrer"; // Security best practice
+        titleLink.textContent = article.title;
+        title.appendChild(titleLink);
+        contentDiv.appendChild(title);
+
+        const summary = document.createElement('p');
+        summary.textContent = article.summary;
+        contentDiv.appendChild(summary);
+
+        articleCard.appendChild(contentDiv);
+
+        const metaDiv = document.createElement('div');
+        metaDiv.className = 'ai-article-meta';
+        const source = document.createElement('span');
+        source.textContent = `Source: ${article.source}`;
+        const date = document.createElement('span');
+        date.textContent = article.publish_date ? `Date: ${new Date(article.publish_date).toLocaleDateString()}` : '';
+        metaDiv.append(source, date);
+        articleCard.appendChild(metaDiv);
+
+        return articleCard;
+    }
+
+    function renderArticles(articles, emptyMessage) {
+        articlesGrid.innerHTML = '';
+        if (articles.length === 0) {
+            articlesGrid.innerHTML = `<p>${emptyMessage}</p>`;
+            return;
+        }
+        articles.forEach(article => articlesGrid.appendChild(createArticleCard(article)));
+    }
 
     async function loadArticles() {
         try {
-            const response = await fetch(articlesDataUrl);
+            const response = await fetch(await assetUrl(articlesDataUrl));
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             const articles = await response.json();
-            
+
             // Sort articles by publish date (newest first for the "time capsule" to show most recent additions first)
             articles.sort((a, b) => new Date(b.publish_date) - new Date(a.publish_date));
 
-            articlesGrid.innerHTML = ''; // Clear loading indicator
+            allArticles = articles;
+            renderArticles(articles, 'No AI articles found yet. Please trigger the scraper!');
 
-            if (articles.length === 0) {
-                articlesGrid.innerHTML = '<p>No AI articles found yet. Please trigger the scraper!</p>';
-                return;
-            }
+        } catch (error) {
+            console.error("Could not load AI articles data:", error);
+            articlesGrid.innerHTML = '<p>Error loading AI articles. Please try again later.</p>';
+        }
+    }
 
-            articles.forEach(article => {
-                const articleCard = document.createElement('div');
-                articleCard.className = 'ai-article-card';
-
-                if (article.image_path) {
-                    const img = document.createElement('img');
-                    img.src = article.image_path;
-                    img.alt = article.title;
-                    img.onerror = function() {
-                        this.style.display = 'none'; // Hide broken images
-                    };
-                    articleCard.appendChild(img);
-                }
+    // --- Search: fetch only the term shards the query needs, then the doc blocks of the top hits ---
 
-                const contentDiv = document.createElement('div');
-                contentDiv.className = 'ai-article-card-content';
+    function fetchSearchFile(name) {
+        if (!searchFileCache.has(name)) {
+            searchFileCache.set(name, fetch(searchIndexUrl + name).then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                return response.json();
+            }));
+        }
+        return searchFileCache.get(name);
+    }
 
-                const title = document.createElement('h3');
-                const titleLink = document.createElement('a');
-                titleLink.href = article.wayback_url; // Link to Wayback Machine snapshot
-                titleLink.target = "_blank"; // Open in new tab
-                titleLink.rel = "noopener noreferrer"; // Security best practice
-                titleLink.textContent = article.title;
-                title.appendChild(titleLink);
-                contentDiv.appendChild(title);
+    // Must match search_index.tokenize() on the Python side.
+    function tokenize(text) {
+        const stopwords = new Set(searchManifest.stopwords);
+        return (text.toLowerCase().match(/[a-z0-9]+/g) || []).filter(term =>
+            term.length >= searchManifest.min_term_length && term.length <= searchManifest.max_term_length && !stopwords.has(term));
+    }
 
-                const summary = document.createElement('p');
-                summary.textContent = article.summary;
-                contentDiv.appendChild(summary);
+    // Shards holding `term` exactly, or every term starting with it when `prefix` is set.
+    function shardsFor(term, prefix) {
+        const prefixes = Object.keys(searchManifest.shards);
+        if (prefix) {
+            return prefixes.filter(p => p.startsWith(term) || term.startsWith(p));
+        }
+        const owner = prefixes.filter(p => term.startsWith(p)).sort((a, b) => b.length - a.length)[0];
+        return owner ? [owner] : [];
+    }
 
-                articleCard.appendChild(contentDiv);
+    function decodePostings(encoded) {
+        const postings = new Map();
+        let doc = 0;
+        for (let i = 0; i < encoded.length; i += 2) {
+            doc += encoded[i];
+            postings.set(doc, encoded[i + 1]);
+        }
+        return postings;
+    }
 
-                const metaDiv = document.createElement('div');
-                metaDiv.className = 'ai-article-meta';
-                metaDiv.innerHTML = `
-                    <span>Source: ${article.source}</span>
-                    <span>Date: ${new Date(article.publish_date).toLocaleDateString()}</span>
-                `;
-                articleCard.appendChild(metaDiv);
+    // Doc -> weight for one query term; for a prefix term, the best weight among matching words.
+    async function termPostings(term, prefix) {
+        const shards = await Promise.all(shardsFor(term, prefix).map(p => fetchSearchFile(searchManifest.shards[p])));
+        const merged = new Map();
+        shards.forEach(shard => {
+            Object.entries(shard).forEach(([word, encoded]) => {
+                if (word === term || (prefix && word.startsWith(term))) {
+                    decodePostings(encoded).forEach((weight, doc) => merged.set(doc, Math.max(merged.get(doc) || 0, weight)));
+                }
+            });
+        });
+        return merged;
+    }
 
+    async function search(query) {
+        if (!searchManifest) {
+            const manifestPath = await assetUrl(searchIndexUrl + 'manifest.json');
+            searchManifest = await fetchSearchFile(manifestPath.slice(searchIndexUrl.length));
+        }
+        const terms = [...new Set(tokenize(query))];
+        if (terms.length === 0) {
+            return null;
+        }
+        const lastTerm = terms[terms.length - 1];
+        const postingsPerTerm = await Promise.all(terms.map(term =>
+            termPostings(term, term === lastTerm && lastTerm.length >= minPrefixLength && /[a-z0-9]$/i.test(query))));
 
-                articlesGrid.appendChild(articleCard);
+        // Every term must match (AND); score is BM25 with the term-frequency part precomputed server-side.
+        let scores = null;
+        postingsPerTerm.forEach(postings => {
+            const idf = Math.log(1 + (searchManifest.doc_count - postings.size + 0.5) / (postings.size + 0.5));
+            const next = new Map();
+            postings.forEach((weight, doc) => {
+                if (scores === null || scores.has(doc)) {
+                    next.set(doc, (scores ? scores.get(doc) : 0) + idf * weight / searchManifest.weight_scale);
+                }
             });
+            scores = next;
+        });
+
+        const top = [...scores.entries()].sort((a, b) => b[1] - a[1]).slice(0, maxSearchResults);
+        const blockSize = searchManifest.doc_block_size;
+        const blocks = new Map();
+        await Promise.all([...new Set(top.map(([doc]) => Math.floor(doc / blockSize)))].map(async block => {
+            blocks.set(block, await fetchSearchFile(searchManifest.docs ? searchManifest.docs[block] : `docs-${block}.json`));
+        }));
+        return {
+            total: scores.size,
+            results: top.map(([doc]) => {
+                const meta = blocks.get(Math.floor(doc / blockSize))[doc % blockSize];
+                return {
+                    title: meta.t,
+                    summary: meta.s,
+                    wayback_url: meta.u,
+                    publish_date: meta.d,
+                    source: meta.k === 'analysis' ? 'AI Time Capsule analysis' : new URL(meta.u, window.location.href).hostname,
+                };
+            }),
+        };
+    }
+
+    let searchGeneration = 0; // Ignores results of queries that were superseded while their shards loaded
+    let searchTimer = null;
 
+    async function runSearch(query) {
+        const generation = ++searchGeneration;
+        try {
+            const found = await search(query);
+            if (generation !== searchGeneration) {
+                return;
+            }
+            if (found === null) {
+                searchStatus.textContent = '';
+                renderArticles(allArticles, 'No AI articles found yet. Please trigger the scraper!');
+                return;
+            }
+            searchStatus.textContent = `${found.total} match${found.total === 1 ? '' : 'es'}${found.total > found.results.length ? `, showing the top ${found.results.length}` : ''}.`;
+            renderArticles(found.results, 'Nothing in the time capsule matches that search.');
         } catch (error) {
-            console.error("Could not load AI articles data:", error);
-            articlesGrid.innerHTML = '<p>Error loading AI articles. Please try again later.</p>';
+            console.error("Could not search the AI Time Capsule:", error);
+            searchStatus.textContent = 'Search is unavailable right now.';
         }
     }
 
+    if (searchInput) {
+        searchInput.addEventListener('input', () => {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => runSearch(searchInput.value), 200);
+        });
+    }
+
     loadArticles();
-});
\ No newline at end of file
+});
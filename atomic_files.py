@@ -0,0 +1,40 @@
+# atomic_files.py (Atomic, Durable File Writes Shared by Every Writer in the Pipeline)
+
+import os
+import tempfile
+
+TEMP_PREFIX = ".tmp-" # Half-written files start with this; publishing and cleanup skip them
+
+
+def write_atomic(path, data):
+    """
+    Writes text (UTF-8) or bytes to a temp file in the target's directory, fsyncs it and
+    renames it into place, so readers (and the published site) only ever see the old file
+    or the complete new one, even after a crash.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=TEMP_PREFIX, suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data.encode('utf-8') if isinstance(data, str) else data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_if_changed(path, data):
+    """write_atomic(), skipped when the file already holds exactly `data`. Returns True if written."""
+    encoded = data.encode('utf-8') if isinstance(data, str) else data
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == encoded:
+                return False
+    except FileNotFoundError:
+        pass
+    write_atomic(path, encoded)
+    return True
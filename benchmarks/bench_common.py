@@ -0,0 +1,74 @@
+# benchmarks/bench_common.py (Shared Scaffolding for the Benchmark Scripts: Arguments, Scratch Directory, Timing and Reporting)
+#
+# Each bench_*.py script builds its own corpus and measures its own stage; the argument
+# parsing, temp working directory, timing and result printing/saving they share live here.
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from contextlib import contextmanager
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+@contextmanager
+def scratch_dir(prefix):
+    """Runs the block in a fresh temp working directory (the pipeline writes relative to it), removed afterwards."""
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix=prefix)
+    os.chdir(workdir)
+    try:
+        yield workdir
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def benchmark_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--json", metavar="PATH", help="Write the results to a JSON file.")
+    return parser
+
+
+def print_results(results):
+    """Prints a result dict, or a list of them (one block each, headed by its first value), as aligned lines."""
+    blocks = results if isinstance(results, list) else [results]
+    width = max((len(key) for block in blocks for key in block), default=0)
+    for block in blocks:
+        if len(blocks) > 1:
+            key, value = next(iter(block.items()))
+            print(f"--- {value:,} {key} ---")
+        for key, value in block.items():
+            print(f"{key:>{width}}: {value:,}" if isinstance(value, (int, float)) else f"{key:>{width}}: {value}")
+
+
+def run_benchmark(run, args, scratch_prefix=None):
+    """
+    Calls run(args), inside a scratch working directory when `scratch_prefix` is given,
+    then prints the results and writes them to --json. Returns the results.
+    """
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s', force=True)
+    if scratch_prefix:
+        with scratch_dir(scratch_prefix):
+            results = run(args)
+    else:
+        results = run(args)
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return results
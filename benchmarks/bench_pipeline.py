@@ -0,0 +1,160 @@
+# benchmarks/bench_pipeline.py (Offline End-to-End and Per-Stage Benchmark of the Generation Pipeline)
+#
+# Usage:
+#   python benchmarks/bench_pipeline.py                      # synthetic corpus, one page set per month
+#   python benchmarks/bench_pipeline.py --cassette DIR       # replay a cassette recorded with --record
+#   python benchmarks/bench_pipeline.py --json results.json  # also write the numbers for later comparison
+#
+# Nothing here touches the network: CSE JSON, page HTML and Gemini responses all come
+# from a cassette directory (see cassette.py), so runs are comparable across machines.
+
+import os
+import json
+import random
+import logging
+
+from bench_common import benchmark_parser, run_benchmark, scratch_dir, timed
+from cassette import Cassette, cassette_key, MODE_RECORD, MODE_REPLAY
+
+MONTH_NAMES = ["January", "February", "March", "April", "May", "June",
+               "July", "August", "September", "October", "November", "December"]
+
+DOMAINS = ["aaai.org", "jair.org", "dl.acm.org", "mit.edu", "stanford.edu", "cmu.edu",
+           "spectrum.ieee.org", "wired.com", "sciencedaily.com", "ijcai.org"]
+
+FILLER = ("researchers described how the system learned from examples and how an inference engine "
+          "combined rules with statistics to reach conclusions that surprised its designers").split()
+
+
+def synthetic_page(title, year, month, rng):
+    # Roughly one page in five carries a modern date, like re-published or mis-ranked results.
+    if rng.random() < 0.2:
+        year = rng.randint(2018, 2024)
+    paragraphs = []
+    for _ in range(rng.randint(6, 60)):
+        words = rng.choices(FILLER, k=rng.randint(40, 90))
+        words.insert(rng.randrange(len(words)), rng.choice(["machine learning", "neural network", "expert system", "robotics"]))
+        paragraphs.append(f"<p>{' '.join(words).capitalize()}.</p>")
+    return f"""<!DOCTYPE html><html><head><title>{title}</title>
+<meta property="article:published_time" content="{year:04d}-{month:02d}-15T00:00:00">
+</head><body><article><h1>{title}</h1>{''.join(paragraphs)}</article></body></html>"""
+
+
+def synthetic_analysis(date_str):
+    return f"""<h1>AI in the Era of {date_str}</h1>
+<p class="hook">What the researchers of {date_str} expected from machine intelligence, and what they missed.</p>
+<h3>The Echoes of Foresight</h3><p>They saw <span class="highlight">learning from data</span> coming.</p>
+<blockquote>Machines will learn.</blockquote><hr class="section-divider">
+<h3>Unseen Paths</h3><ol><li>Scale matters.</li><li>Data matters.</li></ol>"""
+
+
+def build_synthetic_cassette(root, gaa, results_per_month=10, seed=1234):
+    """Writes one CSE page per month of PAST_YEAR_RANGE, its pages and a Gemini reply per month."""
+    rng = random.Random(seed)
+    cassette = Cassette(root, MODE_RECORD)
+    pages = 0
+    for year in range(gaa.PAST_YEAR_RANGE[0], gaa.PAST_YEAR_RANGE[1] + 1):
+        for month in range(1, 13):
+            date_str = f"{MONTH_NAMES[month - 1]} {year}"
+            items = []
+            for n in range(results_per_month):
+                domain = rng.choice(DOMAINS)
+                link = f"https://{domain}/papers/{year}/{month:02d}/ai-paper-{n}.html"
+                title = f"Neural Network Research Paper {n} ({date_str})"
+                items.append({"title": title, "link": link, "displayLink": domain,
+                              "snippet": f"A machine learning paper from {date_str}."})
+                cassette.put_document(link, "text/html", synthetic_page(title, year, month, rng).encode('utf-8'))
+                pages += 1
+            cassette.put_json("cse", cassette_key("cse", date_str, 10), {"items": items})
+            cassette.put_json("gemini", cassette_key(gaa.GEMINI_MODEL, date_str),
+                              {"historical_date": date_str, "text": synthetic_analysis(date_str)})
+    return pages
+
+
+def load_corpus(root):
+    """Reads every recorded CSE item and page from a cassette for the per-stage benchmarks."""
+    cassette = Cassette(root, MODE_REPLAY)
+    cse_items, pages = [], []
+    cse_dir = os.path.join(root, "cse")
+    for name in sorted(os.listdir(cse_dir)) if os.path.isdir(cse_dir) else []:
+        with open(os.path.join(cse_dir, name), 'r', encoding='utf-8') as f:
+            cse_items.extend(json.load(f).get("items", []))
+    pages_dir = os.path.join(root, "pages")
+    for name in sorted(os.listdir(pages_dir)) if os.path.isdir(pages_dir) else []:
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(pages_dir, name), 'r', encoding='utf-8') as f:
+            url = json.load(f)["url"]
+        content_type, body = cassette.get_document(url)
+        pages.append((url, body.decode('utf-8', errors='replace')))
+    return cse_items, pages
+
+
+def best_of(repeats, fn):
+    runs = [timed(fn) for _ in range(repeats)]
+    return min(elapsed for elapsed, _ in runs), runs[-1][1]
+
+
+def run_benchmarks(gaa, cassette_root, repeats, max_pages):
+    results = {}
+    cse_items, pages = load_corpus(cassette_root)
+    pages = pages[:max_pages] if max_pages else pages
+
+    elapsed, candidates = best_of(repeats, lambda: gaa.filter_cse_items(cse_items))
+    results["urls_filtered_per_s"] = len(cse_items) / elapsed if elapsed else 0.0
+
+    def fetch_all():
+        gaa.CASSETTE = Cassette(cassette_root, MODE_REPLAY)
+        gaa.RUN_STATS.clear()
+        return [gaa.fetch_document(url) for url, _ in pages]
+    elapsed, fetched = best_of(1, fetch_all)
+    results["pages_fetched_per_s"] = len(pages) / elapsed if elapsed else 0.0
+    results["fetch_kb_downloaded"] = gaa.RUN_STATS["bytes_downloaded"] // 1024
+    results["fetch_kb_saved"] = gaa.RUN_STATS["bytes_saved"] // 1024
+    results["fetch_early_rejects"] = gaa.RUN_STATS["early_rejects"]
+    gaa.CASSETTE = None
+
+    elapsed, parsed = best_of(1, lambda: [gaa.extract_article_from_html(url, html) for url, html in pages])
+    accepted = [p for p in parsed if p]
+    results["pages_parsed_per_s"] = len(pages) / elapsed if elapsed else 0.0
+    results["pages_accepted"] = len(accepted)
+
+    batches = [accepted[i:i + gaa.MAX_SCRAPED_ARTICLES_FOR_SYNTHESIS]
+               for i in range(0, len(accepted), gaa.MAX_SCRAPED_ARTICLES_FOR_SYNTHESIS)]
+    elapsed, _ = best_of(repeats, lambda: [gaa.build_synthesis_prompt(b, "January 2000") for b in batches])
+    results["prompts_packed_per_s"] = len(batches) / elapsed if elapsed else 0.0
+
+    bodies = [synthetic_analysis(f"{MONTH_NAMES[i % 12]} {2000 + i % 16}") for i in range(len(batches) or 1)]
+    elapsed, _ = best_of(repeats, lambda: [gaa.create_full_html_article(b, "January 2000", "https://example.invalid/i.jpg") for b in bodies])
+    results["pages_rendered_per_s"] = len(bodies) / elapsed if elapsed else 0.0
+
+    def end_to_end():
+        with scratch_dir("capsule-run-"):
+            os.makedirs(gaa.GENERATED_ARTICLES_DIR, exist_ok=True)
+            return gaa.main(["--replay", cassette_root])
+    results["end_to_end_s"], results["end_to_end_analyses_added"] = best_of(repeats, end_to_end)
+    results["corpus_pages"] = len(pages)
+    results["corpus_cse_items"] = len(cse_items)
+    return {name: round(value, 2) if isinstance(value, float) else value for name, value in results.items()}
+
+
+def run(args):
+    import generate_ai_analysis as gaa
+    logging.getLogger().setLevel(logging.WARNING)
+    cassette_root = os.path.abspath(args.cassette) if args.cassette else os.path.abspath("cassette")
+    if not args.cassette:
+        pages = build_synthetic_cassette(cassette_root, gaa, seed=args.seed)
+        print(f"Built synthetic cassette with {pages} pages in {cassette_root}")
+    return run_benchmarks(gaa, cassette_root, args.repeats, args.max_pages)
+
+
+def main(argv=None):
+    parser = benchmark_parser("Offline benchmark of the AI Time Capsule generation pipeline.")
+    parser.add_argument("--cassette", help="Existing cassette directory to replay (default: build a synthetic one).")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--max-pages", type=int, default=0, help="Limit pages fed to the parse stage (0 = all).")
+    return run_benchmark(run, parser.parse_args(argv), scratch_prefix="capsule-bench-")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/bench_publish.py (Publish Stage: Cold, No-Op and Single-Change Timings and Transfer Bytes Saved)
+#
+# Usage:
+#   python benchmarks/bench_publish.py                        # 2,000 analysis pages
+#   python benchmarks/bench_publish.py --size 5000
+#   python benchmarks/bench_publish.py --json results.json
+#
+# Renders synthetic analysis pages with the real page template, writes pretty-printed
+# ai_articles.json / ai_analyses_index.json and a search index into a temp directory, then
+# drives publish_site() the way build_site() does.
+
+import os
+import json
+import random
+
+from bench_common import benchmark_parser, run_benchmark, timed
+
+WORDS = ["machine", "learning", "expert", "systems", "neural", "logic", "vision", "perceptron", "lisp", "robotics",
+         "knowledge", "representation", "fuzzy", "speech", "recognition", "chess", "planning", "agents"]
+
+
+def build_corpus(size, seed):
+    import generate_ai_analysis as gaa
+    from search_index import build_search_index
+
+    rng = random.Random(seed)
+    os.makedirs("generated_articles", exist_ok=True)
+    entries = []
+    for n in range(size):
+        era = f"Era {1990 + n % 26}"
+        sections = "".join(f"<h3>Section {k}</h3>\n<p>{' '.join(rng.choices(WORDS, k=150))}.</p>\n" for k in range(4))
+        body = f'<h1>AI in the {era}</h1>\n<p class="hook">What {era} expected.</p>\n{sections}'
+        html_path = f"generated_articles/ai_analysis_{n:08x}.html"
+        with open(html_path, 'w', encoding='utf-8') as f:
+            f.write(gaa.create_full_html_article(body, era, f"https://example.org/{n}.jpg"))
+        entries.append({"id": f"analysis_{n:08x}", "title": f"AI in the {era}", "summary": " ".join(rng.choices(WORDS, k=30)),
+                        "html_path": html_path, "generated_date": "2025-06-24T11:12:05", "original_sources_count": 3})
+    articles = [{"id": f"article_{n}", "title": " ".join(rng.choices(WORDS, k=6)), "summary": " ".join(rng.choices(WORDS, k=60)),
+                 "original_url": f"https://example.org/{n}", "wayback_url": f"https://web.archive.org/web/1998/https://example.org/{n}",
+                 "publish_date": "1998-01-01", "source": "example.org", "image_path": ""} for n in range(size // 2)]
+    for path, data in (("ai_analyses_index.json", entries), ("ai_articles.json", articles)):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2) # As the pipeline writes them
+    build_search_index(entries, articles)
+    return entries
+
+
+def run(size, seed):
+    from site_publisher import publish_site
+
+    entries = build_corpus(size, seed)
+    serial_s, cold = timed(lambda: publish_site(workers=1))
+    parallel_s, _ = timed(lambda: publish_site(force=True))
+    noop_s, noop = timed(publish_site)
+
+    with open(entries[size // 2]["html_path"], 'a', encoding='utf-8') as f:
+        f.write("<!-- edited -->\n")
+    edit_s, edit = timed(publish_site)
+
+    return {
+        "analyses": size,
+        "cpu_count": os.cpu_count(),
+        "files": cold["files"],
+        "cold_publish_serial_s": round(serial_s, 3),
+        "cold_publish_parallel_s": round(parallel_s, 3),
+        "noop_publish_s": round(noop_s, 3),
+        "noop_files_changed": noop["files_changed"],
+        "one_page_edit_s": round(edit_s, 3),
+        "one_page_edit_files_changed": edit["files_changed"],
+        "raw_kb": cold["raw_bytes"] // 1024,
+        "minified_kb": cold["minified_bytes"] // 1024,
+        "gzip_kb": cold["gzip_bytes"] // 1024,
+        "brotli_kb": cold["brotli_bytes"] // 1024,
+        "transfer_saved_pct": round(100 * cold["saved_bytes"] / cold["raw_bytes"], 1),
+    }
+
+
+def main(argv=None):
+    parser = benchmark_parser("Benchmark the publish stage.")
+    parser.add_argument("--size", type=int, default=2000, help="Number of synthetic analysis pages.")
+    return run_benchmark(lambda args: run(args.size, args.seed), parser.parse_args(argv), scratch_prefix="capsule-publish-")
+
+
+if __name__ == "__main__":
+    main()
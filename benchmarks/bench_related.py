@@ -0,0 +1,102 @@
+# benchmarks/bench_related.py (Full vs Incremental "Related Eras" Linking on a Synthetic Corpus)
+#
+# Usage:
+#   python benchmarks/bench_related.py                        # 10,000 analyses, 20 incremental additions
+#   python benchmarks/bench_related.py --size 2000 --adds 50
+#   python benchmarks/bench_related.py --json results.json
+#
+# Documents are drawn from a mixture of synthetic "era" topics (each era has its own
+# favoured vocabulary on top of shared Zipf-distributed filler), so neighbour quality
+# can be checked: a good neighbour comes from the same era.
+
+import os
+import random
+
+from bench_common import benchmark_parser, run_benchmark, scratch_dir, timed
+from related_analyses import RelatedAnalyses
+
+ERAS = 60
+SHARED_VOCABULARY = 15000
+ERA_VOCABULARY = 80
+WORDS_PER_DOCUMENT = (500, 1200)
+ERA_WORD_SHARE = 0.15
+
+
+def random_word(rng):
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 10)))
+
+
+def synthetic_corpus(size, seed):
+    rng = random.Random(seed)
+    shared = [random_word(rng) for _ in range(SHARED_VOCABULARY)]
+    shared_weights = [1 / (rank + 1) for rank in range(len(shared))]
+    era_words = [[random_word(rng) for _ in range(ERA_VOCABULARY)] for _ in range(ERAS)]
+    documents, eras = [], []
+    for n in range(size):
+        era = rng.randrange(ERAS)
+        length = rng.randint(*WORDS_PER_DOCUMENT)
+        era_count = int(length * ERA_WORD_SHARE)
+        words = rng.choices(shared, shared_weights, k=length - era_count) + rng.choices(era_words[era], k=era_count)
+        documents.append((f"analysis_{n:06d}", " ".join(words)))
+        eras.append(era)
+    return documents, eras
+
+
+def same_era_precision(linker, eras):
+    era_of = {analysis_id: eras[n] for n, analysis_id in enumerate(linker.ids)}
+    hits = total = 0
+    for analysis_id, neighbors in linker.neighbors.items():
+        for neighbor_id, _ in neighbors:
+            hits += era_of[neighbor_id] == era_of[analysis_id]
+            total += 1
+    return hits / total if total else 0.0
+
+
+def run(size, adds, seed):
+    documents, eras = synthetic_corpus(size + adds, seed)
+    with scratch_dir("bench-related-") as workdir:
+        linker = RelatedAnalyses(os.path.join(workdir, "related_index"))
+        bulk_add, _ = timed(lambda: linker.add(documents[:size]))
+        full_rebuild, _ = timed(linker.rebuild)
+        save_time, _ = timed(linker.save)
+        load_time, linker = timed(lambda: RelatedAnalyses(os.path.join(workdir, "related_index")))
+
+        incremental_times, changed_counts = [], []
+        for document in documents[size:]:
+            elapsed, changed = timed(lambda: linker.add([document]))
+            incremental_times.append(elapsed)
+            changed_counts.append(len(changed))
+
+        # How far the incrementally maintained lists drift from an exact recomputation.
+        incremental_neighbors = {analysis_id: [n for n, _ in pairs] for analysis_id, pairs in linker.neighbors.items()}
+        precision = same_era_precision(linker, eras)
+        linker.rebuild()
+        agreement = [len(set(incremental_neighbors[analysis_id]) & {n for n, _ in pairs}) / len(pairs)
+                     for analysis_id, pairs in linker.neighbors.items() if pairs]
+
+        return {
+            "analyses": size,
+            "vocabulary": len(linker.vocabulary),
+            "matrix_nnz": int(linker.counts.nnz),
+            "bulk_add_s": round(bulk_add, 3),
+            "full_rebuild_s": round(full_rebuild, 3),
+            "save_s": round(save_time, 3),
+            "load_s": round(load_time, 3),
+            "incremental_add_ms_avg": round(1000 * sum(incremental_times) / len(incremental_times), 1) if adds else 0,
+            "incremental_add_ms_max": round(1000 * max(incremental_times), 1) if adds else 0,
+            "pages_touched_per_add": round(sum(changed_counts) / len(changed_counts), 1) if adds else 0,
+            "speedup_vs_full_rebuild": round(full_rebuild / (sum(incremental_times) / len(incremental_times)), 1) if adds else 0,
+            "same_era_precision": round(precision, 3),
+            "agreement_with_full_rebuild": round(sum(agreement) / len(agreement), 3) if agreement else 0,
+        }
+
+
+def main(argv=None):
+    parser = benchmark_parser("Benchmark the related-analyses linker.")
+    parser.add_argument("--size", type=int, default=10000, help="Analyses in the corpus before incremental additions.")
+    parser.add_argument("--adds", type=int, default=20, help="Analyses added one at a time afterwards.")
+    return run_benchmark(lambda args: run(args.size, args.adds, args.seed), parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# benchmarks/bench_search_index.py (Build Time and Shard Size of the Static Search Index as the Capsule Grows)
+#
+# Usage:
+#   python benchmarks/bench_search_index.py                          # 500, 2000 and 5000 analyses
+#   python benchmarks/bench_search_index.py --sizes 1000 10000       # custom corpus sizes
+#   python benchmarks/bench_search_index.py --json results.json      # also write the numbers
+#
+# Each corpus is a set of synthetic analysis pages (Zipf-distributed vocabulary, so a few
+# terms are very common like in real prose) plus a scraped-articles list a quarter its size.
+# Besides build times it reports what a browser would download per query: the manifest,
+# the term shards the query touches and the doc blocks of the top results.
+
+import os
+import json
+import random
+
+from bench_common import benchmark_parser, run_benchmark, scratch_dir, timed
+import search_index
+
+VOCABULARY_SIZE = 20000
+QUERIES = ["expert systems", "neural network", "perceptron", "lisp machine", "backpropagation learning",
+           "knowledge representation", "fuzzy logic", "robotics vision", "chess", "speech recognition"]
+TOP_RESULTS = 20 # Same as maxSearchResults in ai-time-capsule.js
+
+
+def synthetic_vocabulary(rng):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = {w for query in QUERIES for w in query.split()}
+    while len(words) < VOCABULARY_SIZE:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 11))))
+    return sorted(words)
+
+
+def build_corpus(root, size, rng):
+    vocabulary = synthetic_vocabulary(rng)
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    rng.shuffle(vocabulary)
+    os.makedirs(os.path.join(root, "generated_articles"), exist_ok=True)
+    analyses = []
+    for n in range(size):
+        html_path = os.path.join(root, "generated_articles", f"ai_analysis_{n:06d}.html")
+        paragraphs = "".join(f"<p>{' '.join(rng.choices(vocabulary, weights, k=rng.randint(60, 120)))}.</p>" for _ in range(8))
+        with open(html_path, 'w', encoding='utf-8') as f:
+            f.write(f'<!DOCTYPE html><html><body><div class="content-panel">{paragraphs}</div>'
+                    f'<div class="cta-container">Dive Deeper</div></body></html>')
+        analyses.append({"id": f"analysis_{n:06d}", "title": f"AI in the Era of {' '.join(rng.choices(vocabulary, weights, k=3))}",
+                         "summary": " ".join(rng.choices(vocabulary, weights, k=40)), "html_path": html_path,
+                         "generated_date": "2025-06-24T11:12:05"})
+    articles = [{"id": f"article_{n}", "title": " ".join(rng.choices(vocabulary, weights, k=6)),
+                 "summary": " ".join(rng.choices(vocabulary, weights, k=60)),
+                 "original_url": f"https://example.org/{n}", "publish_date": "1998-01-01"} for n in range(size // 4)]
+    return analyses, articles
+
+
+def query_cost(output_dir, query):
+    """Bytes and files a browser fetches for one query, following ai-time-capsule.js."""
+    def size(name):
+        return os.path.getsize(os.path.join(output_dir, name))
+
+    with open(os.path.join(output_dir, "manifest.json"), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    files = {"manifest.json"}
+    scores = None
+    for term in dict.fromkeys(search_index.tokenize(query)):
+        owners = [p for p in manifest["shards"] if term.startswith(p)]
+        if not owners:
+            return len(files), sum(size(name) for name in files)
+        shard_name = manifest["shards"][max(owners, key=len)]
+        files.add(shard_name)
+        with open(os.path.join(output_dir, shard_name), 'r', encoding='utf-8') as f:
+            encoded = json.load(f).get(term, [])
+        docs, doc = set(), 0
+        for gap in encoded[::2]:
+            doc += gap
+            docs.add(doc)
+        scores = docs if scores is None else scores & docs
+    for doc in sorted(scores or ())[:TOP_RESULTS]:
+        files.add(f"docs-{doc // manifest['doc_block_size']}.json")
+    return len(files), sum(size(name) for name in files)
+
+
+def run_size(size, seed):
+    with scratch_dir("bench-search-") as workdir:
+        analyses, articles = build_corpus(workdir, size, random.Random(seed))
+        output_dir = os.path.join(workdir, "search_index")
+
+        search_index._BODY_CACHE.clear()
+        cold, stats = timed(lambda: search_index.build_search_index(analyses, articles, output_dir))
+        warm, noop = timed(lambda: search_index.build_search_index(analyses, articles, output_dir))
+
+        costs = [query_cost(output_dir, query) for query in QUERIES]
+        return {
+            "analyses": size,
+            "documents": stats["documents"],
+            "terms": stats["terms"],
+            "shards": stats["shards"],
+            "cold_build_s": round(cold, 3),
+            "warm_rebuild_s": round(warm, 3),
+            "warm_files_written": noop["files_written"],
+            "index_kb": stats["total_bytes"] // 1024,
+            "max_shard_kb": round(stats["max_shard_bytes"] / 1024, 1),
+            "avg_query_files": round(sum(n for n, _ in costs) / len(costs), 1),
+            "avg_query_kb": round(sum(b for _, b in costs) / len(costs) / 1024, 1),
+            "max_query_kb": round(max(b for _, b in costs) / 1024, 1),
+        }
+
+
+def main(argv=None):
+    parser = benchmark_parser("Benchmark the static search index build.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 5000], help="Corpus sizes (number of analyses).")
+    args = parser.parse_args(argv)
+    return run_benchmark(lambda a: [run_size(size, a.seed) for size in a.sizes], args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# benchmarks/bench_service.py (Per-Job Latency: One Process per Run vs Jobs Posted to a Warm Service)
+#
+# Usage:
+#   python benchmarks/bench_service.py                        # 5 jobs of one analysis each
+#   python benchmarks/bench_service.py --jobs 10
+#   python benchmarks/bench_service.py --json results.json
+#
+# Both sides replay the same synthetic cassette (see bench_pipeline.py), so no network or
+# API key is needed. Replay skips the Gemini model probe and real TLS handshakes, so live
+# runs save more per job than the numbers here show.
+
+import os
+import sys
+import json
+import time
+import socket
+import subprocess
+from contextlib import contextmanager
+from urllib import request as urllib_request
+
+from bench_common import REPO_ROOT, benchmark_parser, run_benchmark
+
+SCRIPT = os.path.join(REPO_ROOT, "generate_ai_analysis.py")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def call(url, payload=None):
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    req = urllib_request.Request(url, data=data, headers={"Content-Type": "application/json"}, method="POST" if data else "GET")
+    with urllib_request.urlopen(req, timeout=10) as response:
+        return json.load(response)
+
+
+def cold_runs(workdir, cassette, jobs):
+    times = []
+    for _ in range(jobs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, SCRIPT, "--replay", cassette, "--count", "1"], cwd=workdir,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - started)
+    with open(os.path.join(workdir, "ai_analyses_index.json"), 'r', encoding='utf-8') as f:
+        return times, len(json.load(f))
+
+
+@contextmanager
+def warm_service(workdir, cassette):
+    """Starts the service on a free port replaying `cassette`; yields (url, startup seconds) once it answers."""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, SCRIPT, "serve", "--replay", cassette, "--port", str(port), "--workers", "1"],
+                              cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                call(f"{url}/health")
+                break
+            except OSError:
+                time.sleep(0.02)
+        yield url, time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+
+def post_job(url):
+    """Posts a one-analysis job and polls it to completion. Returns the finished job."""
+    job = call(f"{url}/jobs", {"count": 1})
+    while job["state"] not in ("done", "failed"):
+        time.sleep(0.01)
+        job = call(f"{url}/jobs/{job['id']}")
+    return job
+
+
+def warm_runs(workdir, cassette, jobs):
+    with warm_service(workdir, cassette) as (url, startup):
+        times = []
+        for _ in range(jobs):
+            started = time.perf_counter()
+            post_job(url)
+            times.append(time.perf_counter() - started)
+        metrics = call(f"{url}/metrics")
+    return startup, times, metrics
+
+
+def run(jobs, seed):
+    import generate_ai_analysis as gaa
+    from bench_pipeline import build_synthetic_cassette
+
+    workdir = os.getcwd()
+    cassette = os.path.join(workdir, "cassette")
+    build_synthetic_cassette(cassette, gaa, seed=seed)
+    cold_dir, warm_dir = os.path.join(workdir, "cold"), os.path.join(workdir, "warm")
+    for site_dir in (cold_dir, warm_dir):
+        os.makedirs(os.path.join(site_dir, "generated_articles"))
+    cold_times, cold_added = cold_runs(cold_dir, cassette, jobs)
+    startup, warm_times, metrics = warm_runs(warm_dir, cassette, jobs)
+
+    cold_avg, warm_avg = sum(cold_times) / jobs, sum(warm_times) / jobs
+    result = {
+        "jobs": jobs,
+        "cold_analyses_added": cold_added,
+        "cold_avg_job_s": round(cold_avg, 3),
+        "warm_service_startup_s": round(startup, 3),
+        "warm_avg_job_s": round(warm_avg, 3),
+        "warm_analyses_added": metrics["total_analyses"],
+        "per_job_speedup": round(cold_avg / warm_avg, 1) if warm_avg else 0,
+    }
+    for stage, entry in metrics["stages"].items():
+        result[f"stage_{stage}_avg_s"] = entry["avg_s"]
+    return result
+
+
+def main(argv=None):
+    parser = benchmark_parser("Benchmark cold per-run processes against a warm service.")
+    parser.add_argument("--jobs", type=int, default=5, help="Jobs of one analysis each, run on both sides.")
+    # generate_ai_analysis creates generated_articles/ in the working directory on import
+    return run_benchmark(lambda args: run(args.jobs, args.seed), parser.parse_args(argv), scratch_prefix="capsule-service-")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# benchmarks/bench_site_build.py (Incremental Static-Site Build: Cold, No-Op, Single-Change and Template-Change Timings)
+#
+# Usage:
+#   python benchmarks/bench_site_build.py                     # 3,000 analyses
+#   python benchmarks/bench_site_build.py --size 10000
+#   python benchmarks/bench_site_build.py --json results.json
+#
+# Writes synthetic stored bodies and index entries into a temp directory and drives
+# SiteBuilder with the real page template from generate_ai_analysis.py.
+
+import os
+import random
+
+from bench_common import benchmark_parser, run_benchmark, timed
+
+MONTH_NAMES = ["January", "February", "March", "April", "May", "June",
+               "July", "August", "September", "October", "November", "December"]
+
+
+def synthetic_body(era, rng):
+    sections = "".join(
+        f"<h3>Section {n}</h3><p>{' '.join(rng.choices(['machine', 'learning', 'expert', 'systems', 'neural', 'logic', 'vision'], k=180))}.</p>"
+        for n in range(4)
+    )
+    return f'<h1>AI in the Era of {era}</h1>\n<p class="hook">What {era} expected from AI.</p>\n{sections}'
+
+
+def build_corpus(size, seed, write_body):
+    rng = random.Random(seed)
+    entries = []
+    for n in range(size):
+        era = f"{MONTH_NAMES[n % 12]} {1990 + (n // 12) % 26}"
+        analysis_id = f"analysis_{n:08x}"
+        write_body(analysis_id, era, synthetic_body(era, rng))
+        entries.append({"id": analysis_id, "title": f"AI in the Era of {era}", "summary": f"What {era} expected from AI.",
+                        "html_path": f"generated_articles/ai_analysis_{n:08x}.html",
+                        "generated_date": f"2025-{1 + n % 12:02d}-{1 + n % 28:02d}T12:00:00",
+                        "original_sources_count": 3, "featured_image": f"https://example.org/{n}.jpg"})
+    return entries
+
+
+def run(size, seed):
+    import generate_ai_analysis as gaa
+    from site_builder import SiteBuilder, write_body
+
+    entries = build_corpus(size, seed, write_body)
+    blocks = {}
+
+    def builder(template_version=gaa.TEMPLATE_VERSION, workers=None):
+        return SiteBuilder(gaa.render_page, template_version, workers=workers)
+
+    cold_s, cold = timed(lambda: builder().build(entries, blocks))
+    noop_s, noop = timed(lambda: builder().build(entries, blocks))
+
+    changed = dict(entries[size // 2], summary="An edited summary.")
+    entries[size // 2] = changed
+    edit_s, edit = timed(lambda: builder().build(entries, blocks))
+
+    write_body("analysis_new", "March 1994", synthetic_body("March 1994", random.Random(seed)))
+    entries.append({"id": "analysis_new", "title": "AI in the Era of March 1994", "summary": "New.",
+                    "html_path": "generated_articles/ai_analysis_new.html", "generated_date": "2026-01-01T00:00:00",
+                    "original_sources_count": 3, "featured_image": ""})
+    add_s, add = timed(lambda: builder().build(entries, blocks))
+
+    template_serial_s, _ = timed(lambda: builder("template-v2", workers=1).build(entries, blocks))
+    template_parallel_s, template = timed(lambda: builder("template-v3").build(entries, blocks))
+
+    return {
+        "analyses": size,
+        "cpu_count": os.cpu_count(),
+        "cold_build_s": round(cold_s, 3),
+        "cold_pages_written": cold["pages_written"],
+        "noop_rebuild_s": round(noop_s, 3),
+        "noop_pages_stale": noop["pages_stale"],
+        "one_entry_edit_s": round(edit_s, 3),
+        "one_entry_edit_pages_stale": edit["pages_stale"],
+        "one_entry_edit_archives_written": edit["archives_written"],
+        "one_analysis_added_s": round(add_s, 3),
+        "one_analysis_added_archives_written": add["archives_written"],
+        "template_change_serial_s": round(template_serial_s, 3),
+        "template_change_parallel_s": round(template_parallel_s, 3),
+        "template_change_pages_stale": template["pages_stale"],
+    }
+
+
+def main(argv=None):
+    parser = benchmark_parser("Benchmark the incremental site build.")
+    parser.add_argument("--size", type=int, default=3000, help="Number of synthetic analyses.")
+    return run_benchmark(lambda args: run(args.size, args.seed), parser.parse_args(argv), scratch_prefix="capsule-site-")
+
+
+if __name__ == "__main__":
+    main()
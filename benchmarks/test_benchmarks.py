@@ -0,0 +1,210 @@
+# benchmarks/test_benchmarks.py (pytest-benchmark Suite: End-to-End Run Time and Per-Stage Throughput)
+#
+# Usage:
+#   pip install pytest pytest-benchmark
+#   python -m pytest benchmarks/test_benchmarks.py                                   # all benchmarks
+#   python -m pytest benchmarks/test_benchmarks.py --benchmark-autosave              # keep the run for comparison
+#   python -m pytest benchmarks/test_benchmarks.py --benchmark-compare --benchmark-compare-fail=mean:10%
+#
+# The pipeline benchmarks replay a synthetic cassette (see bench_pipeline.py) of a few thousand
+# pages; the later stages reuse the corpus builders of their bench_*.py scripts. No network or
+# API key is needed, so numbers are comparable across machines. Throughputs (items/s) are
+# recorded in each benchmark's extra_info next to pytest-benchmark's timings; the scripts
+# remain for the one-off reports (cold vs warm, sizes) that do not fit a timing loop.
+# Correctness (sharding, resume, breakers, budgets) is covered by the unit tests in tests/.
+
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from bench_pipeline import build_synthetic_cassette, load_corpus, synthetic_analysis, MONTH_NAMES
+
+PACKED_PAGES = 300 # Pages parsed to feed the prompt-packing benchmark
+RENDERED_PAGES = 500
+SEARCH_INDEX_ANALYSES = 1000
+RELATED_ANALYSES = 2000 # Corpus the incremental "Related eras" additions are linked into
+RELATED_ADDS = 20
+SITE_ANALYSES = 1000 # Stored bodies the site build re-renders on a template change
+PUBLISH_PAGES = 500
+SERVICE_JOBS = 5 # One-analysis jobs posted to the warm service
+
+
+@pytest.fixture(scope="module")
+def workdir(tmp_path_factory):
+    """Working directory for the module: generate_ai_analysis writes its outputs relative to it."""
+    path = tmp_path_factory.mktemp("capsule-bench")
+    cwd = os.getcwd()
+    os.chdir(path)
+    yield path
+    os.chdir(cwd)
+
+
+@pytest.fixture(scope="module")
+def gaa(workdir):
+    import generate_ai_analysis
+    return generate_ai_analysis
+
+
+@pytest.fixture(scope="module")
+def cassette_root(gaa, workdir):
+    root = str(workdir / "cassette")
+    build_synthetic_cassette(root, gaa)
+    return root
+
+
+@pytest.fixture(scope="module")
+def corpus(cassette_root):
+    return load_corpus(cassette_root)
+
+
+@pytest.fixture(scope="module")
+def accepted_pages(gaa, corpus):
+    _, pages = corpus
+    return [article for article in (gaa.extract_article_from_html(url, html) for url, html in pages[:PACKED_PAGES]) if article]
+
+
+def record_throughput(benchmark, name, items):
+    benchmark.extra_info[name] = round(items / benchmark.stats.stats.mean, 1)
+
+
+def test_urls_filtered(benchmark, gaa, corpus):
+    cse_items, _ = corpus
+    candidates = benchmark(gaa.filter_cse_items, cse_items)
+    assert candidates
+    record_throughput(benchmark, "urls_filtered_per_s", len(cse_items))
+
+
+def test_pages_fetched(benchmark, gaa, corpus, cassette_root):
+    from cassette import Cassette, MODE_REPLAY
+    _, pages = corpus
+
+    def fetch_all():
+        return [gaa.fetch_document(url) for url, _ in pages]
+
+    gaa.CASSETTE = Cassette(cassette_root, MODE_REPLAY)
+    try:
+        documents = benchmark.pedantic(fetch_all, rounds=1)
+    finally:
+        gaa.CASSETTE = None
+    assert any(documents)
+    record_throughput(benchmark, "pages_fetched_per_s", len(pages))
+
+
+def test_pages_parsed(benchmark, gaa, corpus):
+    _, pages = corpus
+    parsed = benchmark.pedantic(lambda: [gaa.extract_article_from_html(url, html) for url, html in pages], rounds=1)
+    assert any(parsed)
+    record_throughput(benchmark, "pages_parsed_per_s", len(pages))
+
+
+def test_prompts_packed(benchmark, gaa, accepted_pages):
+    size = gaa.MAX_SCRAPED_ARTICLES_FOR_SYNTHESIS
+    batches = [accepted_pages[i:i + size] for i in range(0, len(accepted_pages), size)]
+    prompts = benchmark(lambda: [gaa.build_synthesis_prompt(batch, "January 2000") for batch in batches])
+    assert len(prompts) == len(batches)
+    record_throughput(benchmark, "prompts_packed_per_s", len(batches))
+
+
+def test_pages_rendered(benchmark, gaa):
+    bodies = [synthetic_analysis(f"{MONTH_NAMES[n % 12]} {2000 + n % 16}") for n in range(RENDERED_PAGES)]
+    pages = benchmark(lambda: [gaa.create_full_html_article(body, "January 2000", "https://example.invalid/i.jpg") for body in bodies])
+    assert all("AI in the Era of" in page for page in pages)
+    record_throughput(benchmark, "pages_rendered_per_s", len(bodies))
+
+
+def test_end_to_end(benchmark, gaa, cassette_root, workdir):
+    runs = iter(range(1000))
+
+    def fresh_site():
+        run_dir = workdir / f"run-{next(runs)}"
+        os.makedirs(run_dir / gaa.GENERATED_ARTICLES_DIR)
+        os.chdir(run_dir)
+
+    try:
+        added = benchmark.pedantic(gaa.main, args=(["--replay", cassette_root],), setup=fresh_site, rounds=3)
+    finally:
+        os.chdir(workdir)
+    assert added == 1
+
+
+def test_search_index_build(benchmark, tmp_path):
+    import random
+    import search_index
+    from bench_search_index import build_corpus, query_cost, QUERIES
+
+    analyses, articles = build_corpus(str(tmp_path), SEARCH_INDEX_ANALYSES, random.Random(1234))
+    output_dir = str(tmp_path / "search_index")
+
+    def cold_build():
+        shutil.rmtree(output_dir, ignore_errors=True)
+        search_index._BODY_CACHE.clear()
+
+    stats = benchmark.pedantic(search_index.build_search_index, args=(analyses, articles, output_dir), setup=cold_build, rounds=3)
+    assert stats["documents"] == len(analyses) + len(articles)
+    record_throughput(benchmark, "documents_indexed_per_s", stats["documents"])
+    benchmark.extra_info["avg_query_kb"] = round(sum(b for _, b in (query_cost(output_dir, q) for q in QUERIES)) / len(QUERIES) / 1024, 1)
+
+
+def test_related_incremental_add(benchmark, tmp_path):
+    from related_analyses import RelatedAnalyses
+    from bench_related import synthetic_corpus
+
+    documents, _ = synthetic_corpus(RELATED_ANALYSES + RELATED_ADDS, 1234)
+    linker = RelatedAnalyses(str(tmp_path / "related_index"))
+    linker.add(documents[:RELATED_ANALYSES])
+    additions = iter(documents[RELATED_ANALYSES:])
+
+    def next_document():
+        return ([next(additions)],), {}
+
+    changed = benchmark.pedantic(linker.add, setup=next_document, rounds=RELATED_ADDS)
+    assert changed and len(linker.ids) == RELATED_ANALYSES + RELATED_ADDS
+    benchmark.extra_info["corpus_analyses"] = RELATED_ANALYSES
+
+
+def test_site_template_change(benchmark, gaa, workdir):
+    from site_builder import SiteBuilder, write_body
+    from bench_site_build import build_corpus
+
+    entries = build_corpus(SITE_ANALYSES, 1234, write_body)
+    blocks = {}
+    SiteBuilder(gaa.render_page, gaa.TEMPLATE_VERSION).build(entries, blocks)
+    versions = iter(range(1000))
+
+    def next_template():
+        return (SiteBuilder(gaa.render_page, f"bench-template-{next(versions)}"),), {}
+
+    stats = benchmark.pedantic(lambda builder: builder.build(entries, blocks), setup=next_template, rounds=3)
+    assert stats["pages_stale"] == SITE_ANALYSES
+    record_throughput(benchmark, "pages_rebuilt_per_s", SITE_ANALYSES)
+
+
+def test_publish_noop(benchmark, gaa, tmp_path):
+    from site_publisher import publish_site
+    from bench_publish import build_corpus
+
+    cwd = os.getcwd()
+    os.chdir(tmp_path) # publish_site globs its sources relative to the working directory
+    try:
+        build_corpus(PUBLISH_PAGES, 1234)
+        cold = publish_site()
+        stats = benchmark(publish_site)
+    finally:
+        os.chdir(cwd)
+    assert stats["files_changed"] == 0
+    record_throughput(benchmark, "files_checked_per_s", cold["files"])
+
+
+def test_service_warm_job(benchmark, cassette_root, tmp_path):
+    from bench_service import warm_service, post_job, call
+
+    os.makedirs(tmp_path / "generated_articles")
+    with warm_service(str(tmp_path), cassette_root) as (url, startup):
+        job = benchmark.pedantic(post_job, args=(url,), rounds=SERVICE_JOBS)
+        metrics = call(f"{url}/metrics")
+    assert job["state"] == "done"
+    assert metrics["total_analyses"] == SERVICE_JOBS
+    benchmark.extra_info["service_startup_s"] = round(startup, 3)
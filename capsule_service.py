@@ -0,0 +1,371 @@
+# capsule_service.py (Long-Running Service Mode: Persistent Job Queue, Worker Pool and Local HTTP Job API)
+#
+# `python generate_ai_analysis.py serve` keeps one process alive so the Gemini client, HTTP
+# connection pools, the extraction process pool and the on-disk caches (URL dates, domain
+# health, related-eras graph, usage ledger) are loaded once instead of once per article.
+# The pipeline hands CapsuleService a `run_job(job, metrics)` callable; this module only
+# knows about jobs, so it imports nothing heavy and doubles as a quick enqueue client.
+#
+# HTTP API (JSON, bound to loopback by default):
+#
+#   POST /jobs        {"count": 2, "month": "1987-03", "options": {"pages_per_month": 3, "max_attempts": 5}}
+#                     all fields optional; answers 202 with the queued job
+#   GET  /jobs        the most recent jobs, newest first
+#   GET  /jobs/<id>   one job: state, result, error and per-stage metrics (live while it runs)
+#   GET  /metrics     queue depth, per-stage totals across all jobs and the pipeline's own status
+#   GET  /health      liveness
+#
+# Scheduled triggers only enqueue:
+#
+#   python capsule_service.py enqueue --count 2
+#   curl -X POST -d '{"count": 2}' http://127.0.0.1:8765/jobs
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import signal
+import logging
+import argparse
+import threading
+from datetime import datetime
+from urllib import request as urllib_request
+from urllib.error import HTTPError, URLError
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from atomic_files import write_atomic
+
+JOB_QUEUE_FILE = "service_jobs.jsonl" # Append-only job events, replayed when the service starts
+SERVICE_HOST = os.getenv("CAPSULE_SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("CAPSULE_SERVICE_PORT", "8765"))
+SERVICE_WORKERS = 2 # Concurrent jobs; the pipeline serializes the stages that write the index
+MAX_JOB_COUNT = 20 # Analyses per job; larger batches should be several jobs so the queue stays responsive
+MAX_REQUEST_BYTES = 64 * 1024
+RECENT_JOBS = 50 # Returned by GET /jobs
+KEEP_FINISHED_JOBS = 500 # Finished jobs kept when the queue file is compacted at startup
+JOB_OPTIONS = ("pages_per_month", "max_attempts")
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+def validate_job_spec(spec):
+    """Normalizes a POSTed job spec; raises ValueError with a message fit for the client."""
+    if not isinstance(spec, dict):
+        raise ValueError("Job must be a JSON object.")
+    unknown = set(spec) - {"count", "month", "options"}
+    if unknown:
+        raise ValueError(f"Unknown job field(s): {', '.join(sorted(unknown))}.")
+    count = spec.get("count", 1)
+    if not isinstance(count, int) or isinstance(count, bool) or not 1 <= count <= MAX_JOB_COUNT:
+        raise ValueError(f"count must be an integer between 1 and {MAX_JOB_COUNT}.")
+    month = spec.get("month")
+    if month is not None:
+        if not isinstance(month, str) or not re.fullmatch(r'\d{4}-\d{2}', month):
+            raise ValueError("month must look like YYYY-MM.")
+        if not 1 <= int(month[5:]) <= 12:
+            raise ValueError("month must be between 01 and 12.")
+    options = spec.get("options") or {}
+    if not isinstance(options, dict) or set(options) - set(JOB_OPTIONS):
+        raise ValueError(f"options may only contain: {', '.join(JOB_OPTIONS)}.")
+    for name, value in options.items():
+        if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+            raise ValueError(f"options.{name} must be a positive integer.")
+    return {"count": count, "month": month, "options": options}
+
+
+class StageMetrics:
+    """Count, total and max seconds per pipeline stage. A job's metrics also feed the service-wide totals."""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            entry = self.stages.setdefault(stage, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+            entry["count"] += 1
+            entry["total_s"] += seconds
+            entry["max_s"] = max(entry["max_s"], seconds)
+        if self.parent is not None:
+            self.parent.observe(stage, seconds)
+
+    def snapshot(self):
+        with self.lock:
+            return {stage: {"count": e["count"], "total_s": round(e["total_s"], 3), "avg_s": round(e["total_s"] / e["count"], 3),
+                            "max_s": round(e["max_s"], 3)} for stage, e in self.stages.items()}
+
+
+class JobQueue:
+    """
+    Persistent FIFO of generation jobs, kept as an append-only JSON Lines log of job events
+    (queued, started, finished, failed) that is replayed on start. Jobs a crashed or killed
+    service left running go back to the front of the queue; the run journal lets them
+    resume from their last completed stage.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.jobs = {}
+        self.pending = []
+        self.condition = threading.Condition()
+        self._load()
+        self._compact()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    self._apply(json.loads(line))
+                except json.JSONDecodeError:
+                    continue # Torn final line from a crash mid-write
+        interrupted = sorted((j for j in self.jobs.values() if j["state"] == JOB_RUNNING), key=lambda j: j["queued_at"])
+        queued = sorted((j for j in self.jobs.values() if j["state"] == JOB_QUEUED), key=lambda j: j["queued_at"])
+        for job in interrupted:
+            logging.info(f"Re-queueing job {job['id']}, interrupted while running.")
+            job["state"] = JOB_QUEUED
+        self.pending = [job["id"] for job in interrupted + queued]
+
+    def _apply(self, event):
+        kind, job_id = event["event"], event["id"]
+        if kind in ("queued", "snapshot"):
+            self.jobs[job_id] = dict(event["job"], id=job_id)
+            if kind == "queued":
+                self.jobs[job_id].update(state=JOB_QUEUED, queued_at=event["ts"])
+            return
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        if kind == "started":
+            job.update(state=JOB_RUNNING, started_at=event["ts"], runs=job.get("runs", 0) + 1)
+        elif kind == "finished":
+            job.update(state=JOB_DONE, finished_at=event["ts"], result=event.get("result"), metrics=event.get("metrics"))
+        elif kind == "failed":
+            job.update(state=JOB_FAILED, finished_at=event["ts"], error=event.get("error"), metrics=event.get("metrics"))
+
+    def _compact(self):
+        """Rewrites the log as one snapshot per job, dropping all but the latest KEEP_FINISHED_JOBS finished ones."""
+        if not os.path.exists(self.path):
+            return
+        finished = sorted((j for j in self.jobs.values() if j["state"] in (JOB_DONE, JOB_FAILED)), key=lambda j: j["queued_at"])
+        for job in finished[:-KEEP_FINISHED_JOBS]:
+            del self.jobs[job["id"]]
+        write_atomic(self.path, "".join(json.dumps({"event": "snapshot", "id": job["id"], "ts": job["queued_at"], "job": job}) + "\n"
+                                        for job in sorted(self.jobs.values(), key=lambda j: j["queued_at"])))
+
+    def _append(self, event):
+        """Caller holds self.condition."""
+        event["ts"] = datetime.now().isoformat()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(event) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._apply(event)
+
+    def submit(self, spec):
+        with self.condition:
+            job_id = f"job-{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:6]}"
+            self._append({"event": "queued", "id": job_id, "job": spec})
+            self.pending.append(job_id)
+            self.condition.notify()
+            return dict(self.jobs[job_id])
+
+    def take(self, timeout=None):
+        """Blocks until a job is queued (or `timeout` passes), marks it running and returns a copy; None on timeout."""
+        with self.condition:
+            if not self.pending and not self.condition.wait_for(lambda: self.pending, timeout):
+                return None
+            job_id = self.pending.pop(0)
+            self._append({"event": "started", "id": job_id})
+            return dict(self.jobs[job_id])
+
+    def finish(self, job_id, result, metrics):
+        with self.condition:
+            self._append({"event": "finished", "id": job_id, "result": result, "metrics": metrics})
+
+    def fail(self, job_id, error, metrics):
+        with self.condition:
+            self._append({"event": "failed", "id": job_id, "error": error, "metrics": metrics})
+
+    def get(self, job_id):
+        with self.condition:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def recent(self, limit=RECENT_JOBS):
+        with self.condition:
+            return [dict(j) for j in sorted(self.jobs.values(), key=lambda j: j["queued_at"], reverse=True)[:limit]]
+
+    def counts(self):
+        with self.condition:
+            counts = {JOB_QUEUED: 0, JOB_RUNNING: 0, JOB_DONE: 0, JOB_FAILED: 0}
+            for job in self.jobs.values():
+                counts[job["state"]] += 1
+            return counts
+
+
+class CapsuleService:
+    """
+    Worker threads draining a JobQueue plus the HTTP front end. `run_job(job, metrics)` does
+    the work and returns a JSON-serializable result; `status()`, if given, adds the
+    pipeline's own counters to GET /metrics.
+    """
+
+    def __init__(self, run_job, status=None, queue_path=JOB_QUEUE_FILE, workers=SERVICE_WORKERS):
+        self.run_job = run_job
+        self.status = status
+        self.queue = JobQueue(queue_path)
+        self.workers = workers
+        self.metrics = StageMetrics()
+        self.running = {} # job id -> StageMetrics, for live progress
+        self.stopping = threading.Event()
+        self.started = time.time()
+
+    def _worker(self):
+        while not self.stopping.is_set():
+            job = self.queue.take(timeout=1)
+            if job is None:
+                continue
+            metrics = StageMetrics(self.metrics)
+            self.running[job["id"]] = metrics
+            logging.info(f"Job {job['id']} started: {job['count']} analysis(es), month {job['month'] or 'any'}, options {job['options']}.")
+            started = time.perf_counter()
+            try:
+                result = self.run_job(job, metrics)
+                metrics.observe("job", time.perf_counter() - started)
+                self.queue.finish(job["id"], result, metrics.snapshot())
+                logging.info(f"Job {job['id']} finished in {time.perf_counter() - started:.1f}s: {result}")
+            except Exception as e:
+                logging.exception(f"Job {job['id']} failed: {e}")
+                self.queue.fail(job["id"], f"{type(e).__name__}: {e}", metrics.snapshot())
+            finally:
+                self.running.pop(job["id"], None)
+
+    def job_report(self, job_id):
+        job = self.queue.get(job_id)
+        if job and job["id"] in self.running:
+            job["metrics"] = self.running[job["id"]].snapshot()
+        return job
+
+    def metrics_report(self):
+        report = {"uptime_s": round(time.time() - self.started, 1), "workers": self.workers,
+                  "jobs": self.queue.counts(), "stages": self.metrics.snapshot()}
+        if self.status:
+            report.update(self.status())
+        return report
+
+    def serve_forever(self, host=SERVICE_HOST, port=SERVICE_PORT):
+        """Runs until SIGINT/SIGTERM; workers finish the job they are on before the call returns."""
+        server = ThreadingHTTPServer((host, port), make_handler(self))
+        threads = [threading.Thread(target=self._worker, name=f"capsule-worker-{n + 1}", daemon=True) for n in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+        logging.info(f"Service listening on http://{host}:{server.server_port} with {self.workers} worker(s); "
+                     f"{len(self.queue.pending)} job(s) queued.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            logging.info("Service stopping; waiting for running jobs to finish.")
+            self.stopping.set()
+            server.server_close()
+            for thread in threads:
+                thread.join()
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload, indent=2).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0].rstrip("/")
+            if path == "/health":
+                self._send(200, {"ok": True})
+            elif path == "/metrics":
+                self._send(200, service.metrics_report())
+            elif path == "/jobs":
+                self._send(200, {"jobs": service.queue.recent()})
+            elif path.startswith("/jobs/"):
+                job = service.job_report(path[len("/jobs/"):])
+                if job:
+                    self._send(200, job)
+                else:
+                    self._send(404, {"error": "No such job."})
+            else:
+                self._send(404, {"error": "Not found."})
+
+        def do_POST(self):
+            if self.path.split("?", 1)[0].rstrip("/") != "/jobs":
+                self._send(404, {"error": "Not found."})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_REQUEST_BYTES:
+                self._send(413, {"error": "Request too large."})
+                return
+            try:
+                spec = validate_job_spec(json.loads(self.rfile.read(length) or b"{}"))
+            except (ValueError, json.JSONDecodeError) as e:
+                self._send(400, {"error": str(e)})
+                return
+            self._send(202, service.queue.submit(spec))
+
+        def log_message(self, format, *args):
+            logging.debug(f"{self.address_string()} {format % args}")
+
+    return Handler
+
+
+def _call(url, payload=None):
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    req = urllib_request.Request(url, data=data, headers={"Content-Type": "application/json"}, method="POST" if data else "GET")
+    try:
+        with urllib_request.urlopen(req, timeout=10) as response:
+            return json.load(response)
+    except HTTPError as e:
+        return json.load(e)
+
+
+def main(argv=None):
+    """Thin client for cron jobs and shells: enqueue work or read status without loading the pipeline."""
+    parser = argparse.ArgumentParser(description="Talk to a running AI Time Capsule service.")
+    parser.add_argument("command", choices=["enqueue", "status", "metrics"])
+    parser.add_argument("job_id", nargs="?", help="With status: show one job instead of the recent ones.")
+    parser.add_argument("--url", default=f"http://{SERVICE_HOST}:{SERVICE_PORT}")
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument("--month", help="YYYY-MM; default: any month not done yet.")
+    parser.add_argument("--pages-per-month", type=int)
+    parser.add_argument("--max-attempts", type=int)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "enqueue":
+            options = {k: v for k, v in (("pages_per_month", args.pages_per_month), ("max_attempts", args.max_attempts)) if v}
+            reply = _call(f"{args.url}/jobs", {"count": args.count, "month": args.month, "options": options})
+        elif args.command == "status":
+            reply = _call(f"{args.url}/jobs/{args.job_id}" if args.job_id else f"{args.url}/jobs")
+        else:
+            reply = _call(f"{args.url}/metrics")
+    except URLError as e:
+        print(f"Service not reachable at {args.url}: {e.reason}", file=sys.stderr)
+        return 1
+    print(json.dumps(reply, indent=2))
+    return 1 if "error" in reply else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
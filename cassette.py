@@ -0,0 +1,103 @@
+# cassette.py (Record/Replay Fixtures for Offline Runs of the Generation Pipeline)
+
+import os
+import json
+import hashlib
+import random
+
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+META_FILE = "meta.json"
+
+
+def cassette_key(*parts):
+    """Stable key for a recorded interaction (a CSE query, a page URL, a prompt)."""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class Cassette:
+    """
+    A directory of recorded network interactions, one file per interaction:
+
+        <root>/meta.json          run seed, so replay picks the same months/shuffles
+        <root>/cse/<key>.json     raw Google CSE JSON responses
+        <root>/pages/<key>.json   fetched documents (content type + body file name)
+        <root>/pages/<key>.bin    raw document bytes
+        <root>/gemini/<key>.json  Gemini response text and token usage
+
+    In record mode every live response is written through; in replay mode nothing
+    touches the network and a missing entry behaves like a failed request.
+    """
+
+    def __init__(self, root, mode):
+        if mode not in (MODE_RECORD, MODE_REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.root = root
+        self.mode = mode
+        self.misses = 0
+        if mode == MODE_REPLAY and not os.path.isdir(root):
+            raise FileNotFoundError(f"Cassette directory not found: {root}")
+        os.makedirs(root, exist_ok=True)
+        self.meta = self._load_meta()
+
+    @property
+    def replaying(self):
+        return self.mode == MODE_REPLAY
+
+    @property
+    def recording(self):
+        return self.mode == MODE_RECORD
+
+    def _load_meta(self):
+        meta_path = os.path.join(self.root, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        if self.replaying:
+            return {}
+        meta = {"seed": random.randrange(2 ** 32)}
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        return meta
+
+    def seed(self):
+        return self.meta.get("seed")
+
+    def _path(self, kind, key, ext):
+        return os.path.join(self.root, kind, f"{key}.{ext}")
+
+    def get_json(self, kind, key):
+        path = self._path(kind, key, "json")
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def put_json(self, kind, key, value):
+        path = self._path(kind, key, "json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(value, f, indent=2, ensure_ascii=False)
+
+    def get_document(self, url):
+        """Returns (Content-Type as recorded, charset included, body_bytes) for a recorded URL, or None."""
+        key = cassette_key(url)
+        entry = self.get_json("pages", key)
+        if entry is None:
+            return None
+        with open(self._path("pages", key, "bin"), 'rb') as f:
+            return entry.get("content_type", "text/html"), f.read()
+
+    def put_document(self, url, content_type, body):
+        key = cassette_key(url)
+        path = self._path("pages", key, "bin")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(body)
+        self.put_json("pages", key, {"url": url, "content_type": content_type})
@@ -0,0 +1,152 @@
+# date_resolver.py (Cheap Publish-Date Resolution for Search Results, Ahead of Scraping)
+
+import os
+import re
+import json
+import logging
+import threading
+from datetime import datetime
+from urllib.parse import urlparse
+
+from dateutil import parser as date_parser
+
+from atomic_files import write_atomic
+
+CONFIDENCE_NONE = "none"
+CONFIDENCE_LOW = "low"
+CONFIDENCE_MEDIUM = "medium"
+CONFIDENCE_HIGH = "high"
+CONFIDENCE_RANK = {CONFIDENCE_NONE: 0, CONFIDENCE_LOW: 1, CONFIDENCE_MEDIUM: 2, CONFIDENCE_HIGH: 3}
+
+# Keys in a CSE item's pagemap (metatags and schema.org blocks) that carry a publication date.
+PAGEMAP_DATE_KEYS = ("citation_publication_date", "citation_date", "citation_online_date",
+                     "article:published_time", "dc.date", "dc.date.issued", "dcterms.created",
+                     "datepublished", "datecreated", "pubdate", "og:published_time")
+
+URL_DATE_SEGMENT = re.compile(r'^(19[5-9]\d|20[0-4]\d)(?:[-_]?(0[1-9]|1[0-2]))?(?:[-_]?(0[1-9]|[12]\d|3[01]))?(?:[-_.].*)?$')
+
+
+def pagemap_date_fields(pagemap):
+    """Keeps only the date-bearing fields of a CSE pagemap, so search results stay small in the journal."""
+    fields = {}
+    for block in (pagemap or {}).values():
+        for entry in block if isinstance(block, list) else []:
+            for key, value in entry.items():
+                if key.lower() in PAGEMAP_DATE_KEYS and isinstance(value, str) and key.lower() not in fields:
+                    fields[key.lower()] = value
+    return fields
+
+
+def _parse_date(value):
+    try:
+        return date_parser.parse(value, default=datetime(1900, 1, 1)).replace(tzinfo=None)
+    except (ValueError, OverflowError, TypeError):
+        return None
+
+
+def date_from_pagemap(fields):
+    for key in PAGEMAP_DATE_KEYS:
+        if key in fields:
+            date = _parse_date(fields[key])
+            if date:
+                return date
+    return None
+
+
+def date_from_url(url):
+    """Year (and month/day when present) from a path segment like /2003/05/ or /2003-05-17-title."""
+    segments = [s for s in urlparse(url).path.split('/') if s]
+    for i, segment in enumerate(segments):
+        match = URL_DATE_SEGMENT.match(segment)
+        if not match:
+            continue
+        year, month, day = match.group(1), match.group(2), match.group(3)
+        # /2003/05/ style: the month lives in the next segment.
+        if month is None and i + 1 < len(segments) and re.fullmatch(r'0[1-9]|1[0-2]', segments[i + 1]):
+            month = segments[i + 1]
+        # A bare number that happens to look like a year (an id, a page count) is only trusted
+        # when it is the whole segment or followed by a month.
+        if month is None and segment != year:
+            continue
+        return datetime(int(year), int(month or 1), int(day or 1))
+    return None
+
+
+class DateResolver:
+    """
+    Resolves a search result's publication date from what the search result itself carries,
+    with a confidence level per source:
+
+        high    CSE pagemap metadata (citation_/dc./article: tags the publisher set)
+        medium  a year/month segment in the URL path
+
+    Nothing is fetched: a network probe (HEAD for Last-Modified) costs a round trip per
+    candidate and almost never yields a date confident enough to reject on, so undated
+    results are left to the checks run on the fetched page.
+
+    Results (including "nothing found") are cached per URL on disk, so a URL is resolved once.
+    """
+
+    def __init__(self, cache_path, year_range):
+        self.cache_path = cache_path
+        self.year_range = year_range
+        self.lock = threading.Lock()
+        self.cache = self._load()
+        self.dirty = False
+
+    def _load(self):
+        if os.path.exists(self.cache_path):
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                try:
+                    return json.load(f)
+                except json.JSONDecodeError:
+                    logging.warning(f"Corrupt or empty {self.cache_path}. Starting fresh.")
+        return {}
+
+    def save(self):
+        if not self.dirty:
+            return
+        with self.lock:
+            write_atomic(self.cache_path, json.dumps(self.cache, ensure_ascii=False))
+            self.dirty = False
+
+    def _in_range(self, date):
+        return self.year_range[0] <= date.year <= self.year_range[1]
+
+    def resolve(self, result):
+        url = result['link']
+        with self.lock:
+            cached = self.cache.get(url)
+        if cached is not None:
+            return cached
+
+        resolution = {"date": None, "confidence": CONFIDENCE_NONE, "source": None}
+        date = date_from_pagemap(result.get('pagemap_dates') or {})
+        if date:
+            resolution = {"date": date.isoformat(), "confidence": CONFIDENCE_HIGH, "source": "pagemap"}
+        else:
+            date = date_from_url(url)
+            if date:
+                resolution = {"date": date.isoformat(), "confidence": CONFIDENCE_MEDIUM, "source": "url"}
+
+        with self.lock:
+            self.cache[url] = resolution
+            self.dirty = True
+        return resolution
+
+    def is_out_of_range(self, resolution, min_confidence=CONFIDENCE_MEDIUM):
+        if CONFIDENCE_RANK[resolution["confidence"]] < CONFIDENCE_RANK[min_confidence]:
+            return False
+        return not self._in_range(datetime.fromisoformat(resolution["date"]))
+
+    def filter_candidates(self, results):
+        """Resolves all results and drops those confidently outside the year range."""
+        kept = []
+        for result in results:
+            resolution = self.resolve(result)
+            if self.is_out_of_range(resolution):
+                logging.info(f"  Skipping {result['link']}: {resolution['source']} date {resolution['date'][:10]} is outside target range {self.year_range[0]}-{self.year_range[1]}.")
+                continue
+            kept.append(result)
+        self.save()
+        return kept
@@ -0,0 +1,151 @@
+# domain_health.py (Persisted Per-Domain Health: Circuit Breaking, Adaptive Timeouts, Domain Ordering)
+
+import os
+import json
+import time
+import logging
+import threading
+from urllib.parse import urlparse
+
+from atomic_files import write_atomic
+
+OUTCOME_OK = "ok" # Fetched and accepted
+OUTCOME_REJECTED = "rejected" # Fetched fine, but the content was not usable (wrong era, off topic)
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_ERROR = "error" # HTTP/connection errors, including paywall 401/403s
+OUTCOME_PARSE_FAILURE = "parse_failure" # Downloaded, but held no article (paywall, login wall, stub) or extraction failed
+
+FAILURE_OUTCOMES = (OUTCOME_TIMEOUT, OUTCOME_ERROR, OUTCOME_PARSE_FAILURE)
+
+HISTORY_SIZE = 50 # Most recent outcomes/latencies kept per domain
+MIN_SAMPLES = 5 # Fewer observations than this and a domain is treated as healthy
+BREAKER_FAILURE_RATE = 0.7 # Open the breaker when this share of recent fetches failed
+BREAKER_COOLDOWN_SECONDS = 7 * 24 * 3600 # Runs are daily, so skip a bad host for about a week
+TIMEOUT_P95_MULTIPLIER = 2.0
+
+
+def domain_of(url):
+    netloc = urlparse(url).netloc.lower()
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class DomainHealth:
+    """
+    Rolling per-domain record of fetch outcomes and latencies, persisted between runs.
+
+    It drives three decisions: a circuit breaker that skips a domain for a cool-down after
+    mostly failed fetches, a per-domain timeout from the observed p95 latency, and a
+    health-based ordering of the targeted domains used to build the search query.
+    """
+
+    def __init__(self, path, default_timeout, min_timeout=5):
+        self.path = path
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.lock = threading.Lock()
+        self.domains = self._load()
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                try:
+                    return json.load(f)
+                except json.JSONDecodeError:
+                    logging.warning(f"Corrupt or empty {self.path}. Starting fresh.")
+        return {}
+
+    def save(self):
+        with self.lock:
+            write_atomic(self.path, json.dumps(self.domains, indent=2, sort_keys=True))
+
+    def _entry(self, domain):
+        return self.domains.setdefault(domain, {"outcomes": [], "latencies": [], "open_until": 0})
+
+    def _match(self, domain):
+        """Maps a URL's host to a tracked key, so 'cs.stanford.edu' counts toward 'stanford.edu' when present."""
+        for known in sorted(self.domains, key=len, reverse=True):
+            if domain == known or domain.endswith("." + known):
+                return known
+        return domain
+
+    def record(self, url, outcome, latency=None):
+        with self.lock:
+            domain = self._match(domain_of(url))
+            entry = self._entry(domain)
+            if entry.get("open_until") and not self._is_open(entry) and outcome not in FAILURE_OUTCOMES:
+                # A success in the half-open state closes the breaker with a fresh failure window,
+                # so the failures kept from before the cool-down cannot re-open it straight away.
+                entry["outcomes"], entry["open_until"] = [], 0
+                logging.info(f"Circuit breaker closed for {domain} after a successful fetch.")
+            entry["outcomes"] = (entry["outcomes"] + [outcome])[-HISTORY_SIZE:]
+            if latency is not None:
+                entry["latencies"] = (entry["latencies"] + [round(latency, 3)])[-HISTORY_SIZE:]
+            stats = self._stats(entry)
+            if stats["samples"] >= MIN_SAMPLES and stats["failure_rate"] >= BREAKER_FAILURE_RATE and not self._is_open(entry):
+                entry["open_until"] = time.time() + BREAKER_COOLDOWN_SECONDS
+                # Half-open after the cool-down: one more failure re-opens it, a success starts rebuilding.
+                entry["outcomes"] = entry["outcomes"][-(MIN_SAMPLES - 1):]
+                logging.warning(f"Circuit breaker opened for {domain}: {stats['failure_rate']:.0%} of the last {stats['samples']} fetches failed.")
+
+    @staticmethod
+    def _is_open(entry):
+        return entry.get("open_until", 0) > time.time()
+
+    @staticmethod
+    def _stats(entry):
+        outcomes = entry["outcomes"]
+        samples = len(outcomes)
+        failures = sum(1 for o in outcomes if o in FAILURE_OUTCOMES)
+        return {
+            "samples": samples,
+            "success_rate": (samples - failures) / samples if samples else 1.0,
+            "failure_rate": failures / samples if samples else 0.0,
+            "parse_failure_rate": outcomes.count(OUTCOME_PARSE_FAILURE) / samples if samples else 0.0,
+            "p50_latency": percentile(entry["latencies"], 50),
+            "p95_latency": percentile(entry["latencies"], 95),
+        }
+
+    def stats(self, domain):
+        with self.lock:
+            return self._stats(self._entry(self._match(domain)))
+
+    def is_open(self, url):
+        with self.lock:
+            entry = self.domains.get(self._match(domain_of(url)))
+            return bool(entry) and self._is_open(entry)
+
+    def timeout_for(self, url):
+        """p95 latency with headroom, clamped to [min_timeout, default_timeout]."""
+        with self.lock:
+            entry = self.domains.get(self._match(domain_of(url)))
+            if not entry or len(entry["latencies"]) < MIN_SAMPLES:
+                return self.default_timeout
+            p95 = percentile(entry["latencies"], 95)
+        return max(self.min_timeout, min(self.default_timeout, p95 * TIMEOUT_P95_MULTIPLIER))
+
+    def _score(self, domain):
+        entry = self.domains.get(self._match(domain))
+        if not entry:
+            return 1.0
+        return self._stats(entry)["success_rate"]
+
+    def order_domains(self, domains):
+        """
+        Healthy domains first (by success rate, ties keep the configured order); domains
+        with an open breaker are left out so the query does not spend results on them.
+        """
+        with self.lock:
+            usable = [d for d in domains if not (self.domains.get(self._match(d)) and self._is_open(self.domains[self._match(d)]))]
+            ranked = sorted(usable, key=lambda d: -self._score(d))
+        skipped = len(domains) - len(ranked)
+        if skipped:
+            logging.info(f"  Leaving {skipped} domain(s) with an open circuit breaker out of the search query.")
+        return ranked or list(domains)
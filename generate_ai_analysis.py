@@ -5,14 +5,47 @@ import newspaper
 import os
 import json
 import re
+import codecs
+import multiprocessing
 from PIL import Image
 import io
 import time
 import random
+import glob
 from datetime import datetime, timedelta
 import logging
+import argparse
+import hashlib
+import inspect
+import tempfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from dateutil import parser as date_parser
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
+from requests.adapters import HTTPAdapter
 import google.generativeai as genai 
+from google.api_core import exceptions as google_exceptions
+
+try:
+    from pypdf import PdfReader
+except ImportError: # PDF candidates are skipped without it
+    PdfReader = None
+
+from atomic_files import write_atomic
+from cassette import Cassette, cassette_key, MODE_RECORD, MODE_REPLAY
+from run_journal import RunJournal, attempt_id_for_month, STAGE_ABANDONED
+from date_resolver import DateResolver, pagemap_date_fields
+from search_index import build_search_index, load_articles
+from related_analyses import RelatedAnalyses, related_block_html, inject_related_block, term_counts, BLOCK_START, BLOCK_END
+from site_builder import SiteBuilder, write_body, read_source_terms
+from site_publisher import publish_site
+from usage_ledger import UsageLedger, KIND_CSE, KIND_GEMINI, is_daily_quota_error
+from capsule_service import CapsuleService, JOB_QUEUE_FILE, SERVICE_HOST, SERVICE_PORT, SERVICE_WORKERS
+from domain_health import (DomainHealth, OUTCOME_OK, OUTCOME_REJECTED, OUTCOME_TIMEOUT,
+                           OUTCOME_ERROR, OUTCOME_PARSE_FAILURE)
 
 # --- Configuration ---
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")  
@@ -23,6 +56,13 @@ GEMINI_MODEL = "models/gemini-2.0-flash-latest"
 
 GENERATED_ARTICLES_DIR = "generated_articles"
 INDEX_FILE = "ai_analyses_index.json" 
+ARTICLES_FILE = "ai_articles.json" # Scraped articles (scrape_ai_articles.py), also covered by the search index
+RUN_JOURNAL_FILE = "run_journal.jsonl" # Stage journal that lets an interrupted run resume its attempts
+INDEX_FRAGMENTS_DIR = "index_fragments" # Per-shard index entries, folded into INDEX_FILE by the merge command
+URL_DATE_CACHE_FILE = "url_date_cache.json" # url -> resolved publish date, see date_resolver.py
+DOMAIN_HEALTH_FILE = "domain_health.json" # Per-domain outcomes/latencies, see domain_health.py
+USAGE_LEDGER_FILE = "usage_ledger.jsonl" # Every CSE/Gemini call and published analysis, see usage_ledger.py
+SHARD_LEDGER_PATTERN = "usage_ledger.shard-*.jsonl"
 
 AI_KEYWORDS = ["artificial intelligence", "ai", "machine learning", "deep learning", "neural network", 
                "robotics", "nlp", "computer vision", "AGI", "expert system", "neural computing", 
@@ -39,9 +79,49 @@ AI_KEYWORDS = ["artificial intelligence", "ai", "machine learning", "deep learni
 PUBLICATION_KEYWORDS = ["paper", "proceedings", "journal", "report", "technical report", "conference", "symposium", "magazine", "article", "thesis", "dissertation", "review", "abstract", "news"] # Re-added "magazine" and "article" as they are relevant in this new range
 
 MAX_SCRAPED_ARTICLES_FOR_SYNTHESIS = 3 
-# --- FIX: Significantly reduced MAX_SEARCH_ATTEMPTS_PER_RUN to stay within free quota ---
-MAX_SEARCH_ATTEMPTS_PER_RUN = 5 # Changed from 100 to 5 to avoid hitting 429 errors quickly
+CSE_PAGES_PER_MONTH = 3 # Result pages (10 results each) an attempt may page through before giving up on a month
+CSE_MAX_RESULTS = 100 # CSE never serves results beyond start=91
+# Fallback attempt cap for runs without a usage ledger (cassette replays); live runs are
+# bounded by the remaining daily budget instead (see usage_ledger.py).
+MAX_SEARCH_ATTEMPTS_PER_RUN = 5 
 REQUEST_TIMEOUT = 25      
+HTTP_POOL_HOSTS = 32 # Hosts whose keep-alive connections the shared session keeps open
+HTTP_POOL_SIZE = 8 # Idle connections kept per host (fetcher threads + CSE prefetch)
+MAX_IDLE_ATTEMPTS = 3 # Consecutive new attempts that spent no CSE quota (CSE unreachable) before a budgeted run stops
+RATE_LIMIT_RETRIES = 3 # Retries after a per-minute rate limit (HTTP 429 that is not the daily quota)
+RATE_LIMIT_BACKOFF_SECONDS = 5 # Doubled on each retry unless the API sends Retry-After
+
+# --- Daily quota and pricing (Google resets both quotas at midnight Pacific) ---
+CSE_DAILY_QUOTA = int(os.getenv("CSE_DAILY_QUOTA", "100")) # Free Custom Search queries per day
+GEMINI_DAILY_REQUESTS = int(os.getenv("GEMINI_DAILY_REQUESTS", "1500"))
+GEMINI_DAILY_TOKENS = int(os.getenv("GEMINI_DAILY_TOKENS", "1000000"))
+USAGE_PRICES = {
+    "cse_free_per_day": 100,
+    "cse_per_query": 5.0 / 1000,
+    "gemini_input_per_mtok": float(os.getenv("GEMINI_INPUT_PRICE_PER_MTOK", "0.10")),
+    "gemini_output_per_mtok": float(os.getenv("GEMINI_OUTPUT_PRICE_PER_MTOK", "0.40")),
+}
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# --- Document extraction ---
+MAX_HTML_BYTES = 5000 * 1024 # Same ceiling newspaper3k's MAX_FILE_MEM_KB used to apply
+MAX_PDF_BYTES = 15 * 1024 * 1024 # PDFs are spooled to disk, never held in memory
+PDF_MAX_PAGES = 5 # Title, abstract and introduction are all the synthesis needs
+PDF_FIRST_YEAR = 1993 # PDF did not exist before this, so earlier /CreationDate values are bogus
+PDF_YEAR = r'(19[5-9]\d|20[0-4]\d)'
+# Years a paper states about itself, with how far into the text to look for each; bare years
+# on the first pages are mostly citations ("Rosenblatt (1958)"), so headers are only trusted
+# in the running head, before the introduction starts citing other proceedings.
+PDF_STATED_YEAR_PATTERNS = [
+    (re.compile(r'(?:©|\(c\)|copyright)\s*(?:by\s+)?(?:\d{4}\s*[-–]\s*)?' + PDF_YEAR + r'\b', re.IGNORECASE), 5000),
+    (re.compile(r'\b(?:proceedings|conference|symposium|workshop)\b[^\n]{0,80}?\b' + PDF_YEAR + r'\b', re.IGNORECASE), 600),
+    (re.compile(r'\b(?:vol\.|volume)\s*\d+[^\n]{0,40}?\b' + PDF_YEAR + r'\b', re.IGNORECASE), 600),
+]
+FETCH_CHUNK_BYTES = 16 * 1024
+EARLY_CHECK_BYTES = 32 * 1024 # Run the cheap reject checks once </head> or this many bytes have arrived
+MIN_ARTICLE_CHARS = 250 # Less text than this is a paywall, login wall or stub, not an article
+SCRAPE_WORKERS = 3 # Concurrent fetcher threads per attempt
+EXTRACTION_WORKERS = max(1, (os.cpu_count() or 2) - 1) # Processes for CPU-bound PDF parsing
 
 # --- CRITICAL PIVOT: New, more reliable historical date range ---
 PAST_YEAR_RANGE = (1990, 2015) # Focusing on 2000-2015 for better content availability
@@ -50,6 +130,28 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 os.makedirs(GENERATED_ARTICLES_DIR, exist_ok=True)
 
+# Set by main() for --record/--replay runs; None means plain live network access.
+CASSETTE = None
+EXTRACTION_POOL = None # Created on first PDF, see get_extraction_pool()
+EXTRACTION_POOL_LOCK = threading.Lock() # Fetcher threads race to create the pool
+DATE_RESOLVER = None # Set by init_run_state(); drops confidently out-of-range candidates before they are fetched
+DOMAIN_HEALTH = None # Set by init_run_state(); circuit breaker, adaptive timeouts and domain ordering
+USAGE_LEDGER = None # Set by init_run_state() for live runs; enforces the daily CSE/Gemini budget
+RELATED_ANALYSES = None # Set by init_run_state() outside shard mode; TF-IDF neighbour graph behind the "Related eras" blocks
+RUN_STATS = Counter() # Per-run fetch/parse counters, reported at the end of main()
+RUN_STATS_LOCK = threading.Lock()
+INDEX_LOCK = threading.RLock() # Serializes index, related-graph and site updates between service workers
+ACTIVE_ATTEMPTS = set() # Attempt ids some worker is running right now, see claim_attempt()
+ACTIVE_ATTEMPTS_LOCK = threading.Lock()
+GEMINI_CLIENT = None # Created on first use, see gemini_model()
+GEMINI_MODEL_VERIFIED = False # Set once check_gemini_model() succeeds; a long-running service probes only once
+
+# One session for every request, so connections (and TLS sessions) are reused across
+# fetches, attempts and, in service mode, jobs.
+HTTP_SESSION = requests.Session()
+HTTP_SESSION.mount("https://", HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE))
+HTTP_SESSION.mount("http://", HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE))
+
 if GOOGLE_API_KEY:
     try:
         genai.configure(api_key=GOOGLE_API_KEY)
@@ -59,15 +161,89 @@ if GOOGLE_API_KEY:
 else:
     logging.warning("GOOGLE_API_KEY environment variable not set. LLM synthesis will not work.")
 
+def pause(seconds):
+    """Politeness/backoff sleep; skipped when replaying a cassette since nothing hits the network."""
+    if CASSETTE and CASSETTE.replaying:
+        return
+    time.sleep(seconds)
+
+def rate_limit_delay(retry, retry_after=None):
+    """Seconds to wait before retry number `retry` (0-based): the API's Retry-After if usable, else exponential backoff."""
+    try:
+        return max(0.0, float(retry_after))
+    except (TypeError, ValueError):
+        return RATE_LIMIT_BACKOFF_SECONDS * 2 ** retry
+
+MONTH_NAMES = ["January", "February", "March", "April", "May", "June", 
+               "July", "August", "September", "October", "November", "December"]
+
 def get_random_past_month(start_year, end_year):
     year = random.randint(start_year, end_year)
     month = random.randint(1, 12)
     return datetime(year, month, 1)
 
-def fetch_google_cse_results(query, num_results=10):
+# --- REVISED URL FILTERING FOR 2000-2015 RANGE ---
+# Removed some of the most aggressive filters that might be too strict for this era.
+# Kept filters for social media, docs, generic pages.
+EXCLUDE_URL_TERMS = [
+    '.zip', '.exe', '.jpg', '.png', '.gif', '.mp3', '.mp4', '.avi', # Media files
+    'forum', 'forums', 'discussion', 'archive.org', # Community/Archival general (too broad often)
+    'support.google.com', 'jobs.google.com', 'developers.google.com', 'policies.google.com', 
+    'privacy', 'legal', 'terms', 'about', 'contact', 'careers', 'sitemap.xml', 'robots.txt',
+    'github.com', 'aws.amazon.com', 'azure.microsoft.com', 'cloud.google.com', 
+    'openai.com', 'perplexity.ai', 'reddit.com', 'twitter.com', 'facebook.com', 'youtube.com', 
+    'blog', '/blog/', 'newsroom', '/newsroom/', 'press', '/press/',
+    'login', 'signup', 'subscribe', 'cart', 'shop', 'cdn.', 'assets.', 'static.', 'media.',
+    'docs.', 'api.', 'dev.', 'help.', 'solutions', 'products', 'services', 
+    'faq', 'events', 'webinars', 'tutorials', 'guides', 'overview', 'definition', 'what-is', 
+    'wikipedia.org', 'wikidata.org', 'wikibooks.org', # Wikipedia/Wiki sites
+    # Removed specific corporate sites that are less problematic in newer ranges if their content is relevant
+    # e.g., 'energy.gov', 'ifr.org', 'ri.cmu.edu' (keep these if they produce relevant content from 2000s)
+]
+
+def filter_cse_items(items):
+    """Turns raw CSE 'items' into candidate results, dropping non-article URLs."""
+    results = []
+    for item in items:
+        if 'link' in item and 'title' in item:
+            if any(term in item['link'].lower() for term in EXCLUDE_URL_TERMS):
+                logging.debug(f"  Skipping {item['link']}: Excluded by URL filter.")
+                continue
+            
+            # Heuristic for too-short URL paths indicating not a deep article - keep this
+            if item['link'].count('/') <= 3 and not any(d in item['link'].lower() for d in ['paper', 'article', 'journal', 'report', 'proceedings', 'news']):
+                logging.debug(f"  Skipping {item['link']}: Appears to be a generic base domain or shallow path.")
+                continue
+
+            results.append({
+                "title": item['title'],
+                "link": item['link'],
+                "snippet": item.get('snippet', ''),
+                "source_domain": item.get('displayLink', '').replace('www.', ''),
+                "pagemap_dates": pagemap_date_fields(item.get('pagemap'))
+            })
+    return results
+
+def fetch_google_cse_page(query, page_number=1, num_results=10, historical_date_str=None):
+    """
+    Fetches one page of CSE results (page_number is 1-based; CSE serves at most 100 results).
+    Returns (results, has_more_pages).
+    """
+    start = (page_number - 1) * num_results + 1
+    # With a month label the recording is keyed on the month rather than the exact query
+    # text, which changes as domain health reorders (or drops) the site: operators.
+    key_parts = ("cse", historical_date_str, num_results) if historical_date_str else (query, num_results)
+    key = cassette_key(*key_parts, start) if start > 1 else cassette_key(*key_parts)
+    if CASSETTE and CASSETTE.replaying:
+        data = CASSETTE.get_json("cse", key)
+        if data is None:
+            logging.warning(f"  No recorded Google CSE response (page {page_number}) for: '{query[:80]}...'")
+            return [], False
+        return filter_cse_items(data.get('items', [])), _cse_has_more(data, start, num_results)
+
     if not GOOGLE_API_KEY or not GOOGLE_CSE_ID: 
         logging.error("GOOGLE_API_KEY or GOOGLE_CSE_ID environment variables not set.")
-        return []
+        return [], False
 
     params = {
         "key": GOOGLE_API_KEY,
@@ -75,58 +251,47 @@ def fetch_google_cse_results(query, num_results=10):
         "q": query,
         "num": num_results, 
     }
+    if start > 1:
+        params["start"] = start
+
+    if USAGE_LEDGER and not USAGE_LEDGER.has_budget(KIND_CSE):
+        logging.warning("  Daily Google CSE budget is spent; not querying.")
+        return [], False
     
     try:
-        logging.info(f"  Querying Google CSE for: '{query}'")
-        response = requests.get(GOOGLE_CSE_API_URL, params=params, timeout=REQUEST_TIMEOUT)
+        for retry in range(RATE_LIMIT_RETRIES + 1):
+            logging.info(f"  Querying Google CSE (page {page_number}) for: '{query}'")
+            count_stat("cse_pages_fetched")
+            response = HTTP_SESSION.get(GOOGLE_CSE_API_URL, params=params, timeout=REQUEST_TIMEOUT)
+            if response.status_code != 429:
+                if USAGE_LEDGER:
+                    USAGE_LEDGER.record_cse()
+                break
+            if is_daily_quota_error(response.text):
+                if USAGE_LEDGER:
+                    USAGE_LEDGER.record_exhausted(KIND_CSE)
+                break
+            if retry < RATE_LIMIT_RETRIES:
+                delay = rate_limit_delay(retry, response.headers.get("Retry-After"))
+                logging.warning(f"  Google CSE rate limit hit; retrying in {delay:.0f}s.")
+                pause(delay)
         response.raise_for_status() 
         data = response.json()
-        
-        results = []
-        if 'items' in data:
-            for item in data['items']:
-                if 'link' in item and 'title' in item:
-                    # --- REVISED URL FILTERING FOR 2000-2015 RANGE ---
-                    # Removed some of the most aggressive filters that might be too strict for this era.
-                    # Kept filters for social media, docs, generic pages.
-                    EXCLUDE_URL_TERMS = [
-                        '.zip', '.exe', '.jpg', '.png', '.gif', '.mp3', '.mp4', '.avi', # Media files
-                        'forum', 'forums', 'discussion', 'archive.org', # Community/Archival general (too broad often)
-                        'support.google.com', 'jobs.google.com', 'developers.google.com', 'policies.google.com', 
-                        'privacy', 'legal', 'terms', 'about', 'contact', 'careers', 'sitemap.xml', 'robots.txt',
-                        'github.com', 'aws.amazon.com', 'azure.microsoft.com', 'cloud.google.com', 
-                        'openai.com', 'perplexity.ai', 'reddit.com', 'twitter.com', 'facebook.com', 'youtube.com', 
-                        'blog', '/blog/', 'newsroom', '/newsroom/', 'press', '/press/',
-                        'login', 'signup', 'subscribe', 'cart', 'shop', 'cdn.', 'assets.', 'static.', 'media.',
-                        'docs.', 'api.', 'dev.', 'help.', 'solutions', 'products', 'services', 
-                        'faq', 'events', 'webinars', 'tutorials', 'guides', 'overview', 'definition', 'what-is', 
-                        'wikipedia.org', 'wikidata.org', 'wikibooks.org', # Wikipedia/Wiki sites
-                        # Removed specific corporate sites that are less problematic in newer ranges if their content is relevant
-                        # e.g., 'energy.gov', 'ifr.org', 'ri.cmu.edu' (keep these if they produce relevant content from 2000s)
-                    ]
-                    
-                    if any(term in item['link'].lower() for term in EXCLUDE_URL_TERMS):
-                        logging.debug(f"  Skipping {item['link']}: Excluded by URL filter.")
-                        continue
-                    
-                    # Heuristic for too-short URL paths indicating not a deep article - keep this
-                    if item['link'].count('/') <= 3 and not any(d in item['link'].lower() for d in ['paper', 'article', 'journal', 'report', 'proceedings', 'news']):
-                        logging.debug(f"  Skipping {item['link']}: Appears to be a generic base domain or shallow path.")
-                        continue
-
-                    results.append({
-                        "title": item['title'],
-                        "link": item['link'],
-                        "snippet": item.get('snippet', ''),
-                        "source_domain": item.get('displayLink', '').replace('www.', '') 
-                    })
-        return results
+        if CASSETTE and CASSETTE.recording:
+            CASSETTE.put_json("cse", key, data)
+        return filter_cse_items(data.get('items', [])), _cse_has_more(data, start, num_results)
     except requests.exceptions.RequestException as e:
         logging.error(f"Error fetching Google CSE results: {e}")
-        return []
+        return [], False
     except json.JSONDecodeError as e:
         logging.error(f"JSON decode error from Google CSE response: {e}. Response preview: {response.text[:200]}...")
-        return []
+        return [], False
+
+def _cse_has_more(data, start, num_results):
+    return bool(data.get('queries', {}).get('nextPage')) and start + 2 * num_results - 1 <= CSE_MAX_RESULTS
+
+def fetch_google_cse_results(query, num_results=10, historical_date_str=None):
+    return fetch_google_cse_page(query, 1, num_results, historical_date_str)[0]
 
 def get_header_image_url(article_id):
     try:
@@ -144,62 +309,375 @@ def is_ai_relevant(title, text):
             return True
     return False
 
-def scrape_full_article_text(article_url):
-    try:
-        config = newspaper.Config()
-        config.browser_user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        config.request_timeout = REQUEST_TIMEOUT
-        config.fetch_images = False 
-        config.MAX_FILE_MEM_KB = 5000 
-        config.browser = "chrome" 
-        config.memoize_articles = False 
-
-        article = newspaper.Article(article_url, config=config)
-        article.download()
-        article.parse()
+def newspaper_config():
+    config = newspaper.Config()
+    config.browser_user_agent = USER_AGENT
+    config.request_timeout = REQUEST_TIMEOUT
+    config.fetch_images = False 
+    config.MAX_FILE_MEM_KB = 5000 
+    config.browser = "chrome" 
+    config.memoize_articles = False 
+    return config
+
+def validate_extracted_article(article_url, title, text, publish_date, source):
+    """Applies the synthesis checks (length, AI relevance, date range) to any extracted document."""
+    if not title or not text or len(text) < MIN_ARTICLE_CHARS: 
+        logging.info(f"Skipping {article_url}: Missing title or too short content for synthesis (len {len(text) if text else 0}).")
+        return None
+
+    if not is_ai_relevant(title, text):
+        logging.info(f"Skipping {article_url}: Not AI relevant after full content check for synthesis.")
+        return None
+    
+    if publish_date:
+        target_start_date = datetime(PAST_YEAR_RANGE[0], 1, 1)
+        target_end_date = datetime(PAST_YEAR_RANGE[1] + 1, 1, 1) - timedelta(days=1)
+        publish_date = publish_date.replace(tzinfo=None)
         
-        if not article.title or not article.text or len(article.text) < 250: 
-            logging.info(f"Skipping {article_url}: Missing title or too short content for synthesis (len {len(article.text) if article.text else 0}).")
+        if not (target_start_date <= publish_date <= target_end_date):
+            logging.info(f"Skipping {article_url}: Publish date {publish_date.strftime('%Y-%m-%d')} is outside target range {PAST_YEAR_RANGE[0]}-{PAST_YEAR_RANGE[1]}.")
+            return None
+
+    return {
+        "title": title,
+        "text": text,
+        "url": article_url,
+        "publish_date": publish_date.isoformat() if publish_date else "Unknown",
+        "source": source 
+    }
+
+def parse_html_article(article_url, html):
+    """Runs newspaper3k over already-fetched HTML. Returns {"title", "text", "publish_date", "source"}."""
+    count_stat("pages_parsed")
+    article = newspaper.Article(article_url, config=newspaper_config())
+    article.download(input_html=html)
+    article.parse()
+    return {"title": article.title, "text": article.text, "publish_date": article.publish_date, "source": article.source_url}
+
+def extract_article_from_html(article_url, html):
+    """Parses already-fetched HTML with newspaper3k and applies the synthesis checks."""
+    extracted = parse_html_article(article_url, html)
+    return validate_extracted_article(article_url, extracted["title"], extracted["text"], extracted["publish_date"], extracted["source"])
+
+def extract_pdf_document(pdf_path, max_pages=PDF_MAX_PAGES):
+    """
+    Extracts title, text and a best-guess publication date from the first `max_pages`
+    pages of a PDF. Runs inside the extraction process pool, so it only takes and
+    returns picklable values and never touches module state.
+    """
+    reader = PdfReader(pdf_path)
+    pages_text = []
+    for page in reader.pages[:max_pages]:
+        try:
+            pages_text.append(page.extract_text() or "")
+        except Exception as e:
+            # One malformed page should not cost us the rest of the paper.
+            pages_text.append("")
+            logging.debug(f"PDF page extraction error in {pdf_path}: {e}")
+    text = "\n".join(t.strip() for t in pages_text if t.strip())
+
+    metadata = reader.metadata or {}
+    title = (metadata.get("/Title") or "").strip()
+    if not title or title.lower() in ("untitled", "microsoft word"):
+        # Academic PDFs rarely set /Title; the first substantial line is almost always the paper title.
+        title = next((line.strip() for line in text.splitlines() if len(line.strip()) > 15), "")
+
+    publish_date = None
+    try:
+        publish_date = metadata.creation_date
+    except Exception:
+        pass
+    if publish_date and not PDF_FIRST_YEAR <= publish_date.year <= datetime.now().year:
+        publish_date = None
+    # Scanned/re-digitised papers carry the scan date in their metadata, so a year the paper
+    # states about itself (copyright line, proceedings header) wins when it is earlier.
+    stated = [int(m.group(1)) for pattern, span in PDF_STATED_YEAR_PATTERNS for m in pattern.finditer(text[:span])]
+    if stated and (publish_date is None or min(stated) < publish_date.year):
+        publish_date = datetime(min(stated), 1, 1)
+    elif publish_date is None:
+        # No usable metadata either: the most frequent year beats any single citation.
+        years = Counter(int(y) for y in re.findall(r'\b' + PDF_YEAR + r'\b', text[:5000]))
+        if years:
+            publish_date = datetime(years.most_common(1)[0][0], 1, 1)
+
+    return {"title": title, "text": text, "publish_date": publish_date}
+
+def get_extraction_pool():
+    """Process pool for CPU-heavy document extraction, so parsing never stalls the fetcher threads."""
+    global EXTRACTION_POOL
+    with EXTRACTION_POOL_LOCK:
+        if EXTRACTION_POOL is None:
+            # Workers come from a fork server rather than forking this process, whose fetcher
+            # threads may hold locks (logging, the HTTP pool) at the moment of the fork.
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            EXTRACTION_POOL = ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS, mp_context=multiprocessing.get_context(method))
+        return EXTRACTION_POOL
+
+def shutdown_extraction_pool():
+    global EXTRACTION_POOL
+    with EXTRACTION_POOL_LOCK:
+        if EXTRACTION_POOL is not None:
+            EXTRACTION_POOL.shutdown(wait=True)
+            EXTRACTION_POOL = None
+
+def is_pdf_document(article_url, content_type):
+    return content_type == "application/pdf" or urlparse(article_url).path.lower().endswith(".pdf")
+
+def spool_pdf(chunks, max_bytes):
+    """Streams PDF bytes to a temp file, giving up (None) past max_bytes since a truncated PDF is unparseable."""
+    fd, pdf_path = tempfile.mkstemp(suffix=".pdf")
+    size = 0
+    with os.fdopen(fd, 'wb') as f:
+        for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                break
+            f.write(chunk)
+    if size > max_bytes:
+        os.remove(pdf_path)
+        return None
+    return pdf_path
+
+def _known_codec(name):
+    try:
+        return codecs.lookup(name).name
+    except (LookupError, TypeError):
+        return None
+
+def declared_encoding(content_type_header, head_bytes):
+    """Charset from the Content-Type header, else from a <meta> charset in the first bytes; None if neither declares one."""
+    match = re.search(r'charset\s*=\s*["\']?([\w.:-]+)', content_type_header or "", re.IGNORECASE)
+    candidates = [match.group(1)] if match else []
+    candidates += requests.utils.get_encodings_from_content(bytes(head_bytes[:EARLY_CHECK_BYTES]).decode('ascii', errors='ignore'))
+    return next((codec for codec in map(_known_codec, candidates) if codec), None)
+
+def decode_html(body, encoding):
+    """
+    Decodes with the declared `encoding`. Undeclared pages are read as UTF-8 when they
+    validate (a multi-byte character cut off at the end still counts) and as Windows-1252
+    otherwise, as browsers do; requests' ISO-8859-1 default would garble UTF-8 pages.
+    """
+    if encoding:
+        return bytes(body).decode(encoding, errors='replace')
+    try:
+        return codecs.getincrementaldecoder('utf-8')().decode(bytes(body), final=False)
+    except UnicodeDecodeError:
+        return bytes(body).decode('cp1252', errors='replace')
+
+DATE_META_NAMES = ("article:published_time", "citation_publication_date", "citation_date", "dc.date",
+                   "dc.date.issued", "dcterms.created", "date", "pubdate", "publish_date", "og:published_time")
+
+def find_meta_dates(html_head):
+    """Publication dates declared in <meta> tags (name/property from DATE_META_NAMES)."""
+    dates = []
+    for tag in re.findall(r'<meta\b[^>]*>', html_head, re.IGNORECASE):
+        name = re.search(r'(?:name|property|itemprop)\s*=\s*["\']([^"\']+)["\']', tag, re.IGNORECASE)
+        content = re.search(r'content\s*=\s*["\']([^"\']+)["\']', tag, re.IGNORECASE)
+        if not name or not content or name.group(1).strip().lower() not in DATE_META_NAMES:
+            continue
+        try:
+            dates.append(date_parser.parse(content.group(1), default=datetime(1900, 1, 1)).replace(tzinfo=None))
+        except (ValueError, OverflowError):
+            continue
+    return dates
+
+def is_in_target_range(date):
+    return PAST_YEAR_RANGE[0] <= date.year <= PAST_YEAR_RANGE[1]
+
+class StubPageError(Exception):
+    """
+    A fetched page with too little text to hold an article (paywall, login wall, stub).
+    Unlike an off-topic or out-of-range page, it counts against the domain's health.
+    """
+
+def early_reject_reason(html, complete):
+    """
+    Cheap checks on a partial (or, with complete=True, the full) HTML document, run before
+    the rest is downloaded and before newspaper3k's parse. Only clear rejects are reported,
+    as (reason, domain health outcome); anything uncertain is left to the full checks in
+    validate_extracted_article().
+    """
+    head_end = re.search(r'</head\s*>', html, re.IGNORECASE)
+    head = html[:head_end.start()] if head_end else html
+    meta_dates = find_meta_dates(head)
+    if meta_dates and not any(is_in_target_range(d) for d in meta_dates):
+        return (f"meta publish date {meta_dates[0].strftime('%Y-%m-%d')} is outside target range {PAST_YEAR_RANGE[0]}-{PAST_YEAR_RANGE[1]}",
+                OUTCOME_REJECTED)
+    if complete:
+        visible_text = re.sub(r'<[^>]+>', ' ', re.sub(r'<(script|style)\b.*?</\1\s*>', ' ', html, flags=re.IGNORECASE | re.DOTALL))
+        visible_text = re.sub(r'\s+', ' ', visible_text).strip()
+        if len(visible_text) < MIN_ARTICLE_CHARS:
+            return f"too little text for synthesis (len {len(visible_text)})", OUTCOME_PARSE_FAILURE
+        title = re.search(r'<title[^>]*>(.*?)</title\s*>', head, re.IGNORECASE | re.DOTALL)
+        if not is_ai_relevant(title.group(1) if title else "", visible_text):
+            return "not AI relevant", OUTCOME_REJECTED
+    return None
+
+def count_stat(name, amount=1):
+    with RUN_STATS_LOCK:
+        RUN_STATS[name] += amount
+
+@contextmanager
+def timed_stage(metrics, stage):
+    """Reports how long a pipeline stage took to `metrics` (a capsule_service.StageMetrics), if given."""
+    started = time.perf_counter()
+    yield
+    if metrics is not None:
+        metrics.observe(stage, time.perf_counter() - started)
+
+def fetch_document(article_url):
+    """
+    Fetches a candidate and dispatches on Content-Type: PDFs are streamed to a temp file
+    under MAX_PDF_BYTES, HTML is read incrementally under MAX_HTML_BYTES and the transfer
+    is aborted as soon as the first chunk shows a clear reject (see early_reject_reason()).
+    Returns {"content_type", "html"} or {"content_type", "pdf_path"}, or None for a reject;
+    raises StubPageError for a page too thin to hold an article.
+    """
+    if CASSETTE and CASSETTE.replaying:
+        recorded = CASSETTE.get_document(article_url)
+        if recorded is None:
+            logging.warning(f"No recorded page for {article_url}.")
             return None
+        content_type_header, recorded_bytes = recorded
+        # Replayed bodies arrive in network-sized chunks so early aborts behave as they do live.
+        chunks = (recorded_bytes[i:i + FETCH_CHUNK_BYTES] for i in range(0, len(recorded_bytes), FETCH_CHUNK_BYTES))
+        expected_bytes = len(recorded_bytes)
+        response = None
+    else:
+        timeout = DOMAIN_HEALTH.timeout_for(article_url) if DOMAIN_HEALTH else REQUEST_TIMEOUT
+        response = HTTP_SESSION.get(article_url, headers={"User-Agent": USER_AGENT}, timeout=timeout, stream=True)
+        response.raise_for_status()
+        content_type_header = response.headers.get("Content-Type", "")
+        chunks = response.iter_content(chunk_size=FETCH_CHUNK_BYTES)
+        expected_bytes = int(response.headers.get("Content-Length") or 0)
+    content_type = content_type_header.split(";")[0].strip().lower()
 
-        if not is_ai_relevant(article.title, article.text):
-            logging.info(f"Skipping {article_url}: Not AI relevant after full content check for synthesis.")
+    try:
+        if content_type and not is_pdf_document(article_url, content_type) and not content_type.startswith(("text/", "application/xhtml")):
+            logging.info(f"Skipping {article_url}: Content-Type '{content_type}' is not an article.")
+            count_stat("early_rejects")
+            count_stat("bytes_saved", expected_bytes)
             return None
-        
-        if article.publish_date:
-            target_start_date = datetime(PAST_YEAR_RANGE[0], 1, 1)
-            target_end_date = datetime(PAST_YEAR_RANGE[1] + 1, 1, 1) - timedelta(days=1)
-            
-            if not (target_start_date <= article.publish_date <= target_end_date):
-                logging.info(f"Skipping {article_url}: Publish date {article.publish_date.strftime('%Y-%m-%d')} is outside target range {PAST_YEAR_RANGE[0]}-{PAST_YEAR_RANGE[1]}.")
+
+        recording = bool(CASSETTE and CASSETTE.recording)
+        recorded_body = [] if recording else None
+        if recording:
+            chunks = _tee(chunks, recorded_body)
+
+        if is_pdf_document(article_url, content_type):
+            if PdfReader is None:
+                logging.warning(f"Skipping {article_url}: PDF support needs the 'pypdf' package.")
+                return None
+            pdf_path = spool_pdf(chunks, MAX_PDF_BYTES)
+            if pdf_path is None:
+                logging.info(f"Skipping {article_url}: PDF larger than {MAX_PDF_BYTES // 1024} KB.")
                 return None
+            count_stat("bytes_downloaded", os.path.getsize(pdf_path))
+            document = {"content_type": "application/pdf", "pdf_path": pdf_path}
+        else:
+            body = bytearray()
+            reject = None
+            checked_head = False
+            encoding = None
+            for chunk in chunks:
+                body.extend(chunk)
+                if len(body) >= MAX_HTML_BYTES:
+                    del body[MAX_HTML_BYTES:]
+                    break
+                if not checked_head and (len(body) >= EARLY_CHECK_BYTES or re.search(rb'</head\s*>', body, re.IGNORECASE)):
+                    checked_head = True
+                    encoding = declared_encoding(content_type_header, body)
+                    reject = early_reject_reason(decode_html(body, encoding), complete=False)
+                    # While recording, keep reading so the cassette holds the whole page.
+                    if reject and not recording:
+                        break
+            count_stat("bytes_downloaded", len(body))
+            if not checked_head:
+                encoding = declared_encoding(content_type_header, body)
+            html = decode_html(body, encoding)
+            if reject is None:
+                reject = early_reject_reason(html, complete=True)
+            if reject:
+                reject_reason, reject_outcome = reject
+                logging.info(f"Skipping {article_url}: {reject_reason} (rejected after {len(body)} bytes).")
+                count_stat("early_rejects")
+                if expected_bytes > len(body):
+                    count_stat("bytes_saved", expected_bytes - len(body))
+                if reject_outcome == OUTCOME_PARSE_FAILURE:
+                    raise StubPageError(reject_reason)
+                return None
+            document = {"content_type": content_type or "text/html", "html": html}
+
+        if recording:
+            # The full header is kept so replay sees the same charset (or lack of one) as the live fetch.
+            CASSETTE.put_document(article_url, content_type_header or document["content_type"], b"".join(recorded_body))
+        return document
+    finally:
+        if response is not None:
+            response.close()
+
+def _tee(chunks, sink):
+    for chunk in chunks:
+        sink.append(chunk)
+        yield chunk
+
+def scrape_full_article_text(article_url):
+    outcome, latency = OUTCOME_ERROR, None
+    try:
+        started = time.monotonic()
+        try:
+            document = fetch_document(article_url)
+        finally:
+            # Failed and timed-out fetches count too, so a slow host keeps a long timeout.
+            if not (CASSETTE and CASSETTE.replaying):
+                latency = time.monotonic() - started
+        if document is None:
+            outcome = OUTCOME_REJECTED
+            return None
+
+        if "pdf_path" in document:
+            count_stat("pages_parsed")
+            try:
+                extracted = get_extraction_pool().submit(extract_pdf_document, document["pdf_path"]).result()
+            finally:
+                os.remove(document["pdf_path"])
+            parsed_url = urlparse(article_url)
+            extracted["source"] = f"{parsed_url.scheme}://{parsed_url.netloc}"
+        else:
+            extracted = parse_html_article(article_url, document["html"])
 
-        return {
-            "title": article.title,
-            "text": article.text,
-            "url": article_url,
-            "publish_date": article.publish_date.isoformat() if article.publish_date else "Unknown",
-            "source": article.source_url 
-        }
+        if not extracted["title"] or len(extracted["text"] or "") < MIN_ARTICLE_CHARS:
+            # Typically a paywall or login wall: the page downloads but holds no article.
+            outcome = OUTCOME_PARSE_FAILURE
+        article_content = validate_extracted_article(article_url, extracted["title"], extracted["text"],
+                                                     extracted["publish_date"], extracted["source"])
+        if outcome != OUTCOME_PARSE_FAILURE:
+            outcome = OUTCOME_OK if article_content else OUTCOME_REJECTED
+        return article_content
+    except StubPageError:
+        outcome = OUTCOME_PARSE_FAILURE
+        return None
     except newspaper.article.ArticleException as e:
+        outcome = OUTCOME_PARSE_FAILURE
         logging.warning(f"Newspaper3k error processing {article_url}: {e}")
         return None
+    except requests.exceptions.Timeout as e:
+        outcome = OUTCOME_TIMEOUT
+        logging.warning(f"Timed out fetching {article_url}: {e}")
+        return None
     except requests.exceptions.RequestException as e:
         logging.warning(f"Request error fetching {article_url}: {e}")
         return None
     except Exception as e:
+        outcome = OUTCOME_PARSE_FAILURE
         logging.error(f"General error processing {article_url}: {e}")
         return None
+    finally:
+        if DOMAIN_HEALTH:
+            DOMAIN_HEALTH.record(article_url, outcome, latency)
 
-def generate_ai_analysis(scraped_articles, historical_date_str):
-    if not GOOGLE_API_KEY: 
-        logging.error("Google Gemini client not configured. Cannot generate analysis.")
-        return None
-
-    if not scraped_articles:
-        logging.warning("No articles provided for AI analysis.")
-        return None
-
+def build_synthesis_prompt(scraped_articles, historical_date_str):
+    """Packs the scraped source articles into the Gemini synthesis prompt."""
     combined_content = ""
     for i, article in enumerate(scraped_articles):
         combined_content += f"--- Source Article {i+1} ---\n"
@@ -245,24 +723,87 @@ def generate_ai_analysis(scraped_articles, historical_date_str):
 
     **Your Synthesized Article (HTML formatted, directly insertable into the content-panel div):**
     """
-    
+    return prompt_template
+
+def generate_ai_analysis(scraped_articles, historical_date_str):
+    if not scraped_articles:
+        logging.warning("No articles provided for AI analysis.")
+        return None
+
+    prompt_template = build_synthesis_prompt(scraped_articles, historical_date_str)
+    return generate_from_prompt(prompt_template, historical_date_str)
+
+def gemini_model():
+    global GEMINI_CLIENT
+    if GEMINI_CLIENT is None:
+        GEMINI_CLIENT = genai.GenerativeModel(GEMINI_MODEL)
+    return GEMINI_CLIENT
+
+def gemini_error_detail(error):
+    """Message plus structured details (quota metric/id) of a Gemini API error."""
+    return f"{error} {getattr(error, 'details', '') or ''}"
+
+def generate_content_with_backoff(prompt_template):
+    """Calls Gemini, retrying per-minute rate limits with backoff; a daily quota error is raised at once."""
+    for retry in range(RATE_LIMIT_RETRIES + 1):
+        try:
+            return gemini_model().generate_content(
+                prompt_template,
+                generation_config=genai.types.GenerationConfig(
+                    candidate_count=1,
+                    stop_sequences=None,
+                    max_output_tokens=2500, 
+                    temperature=0.8, 
+                    top_p=0.95,
+                    top_k=40,
+                ),
+            )
+        except google_exceptions.ResourceExhausted as e:
+            if retry == RATE_LIMIT_RETRIES or is_daily_quota_error(gemini_error_detail(e)):
+                raise
+            delay = rate_limit_delay(retry)
+            logging.warning(f"Gemini rate limit hit; retrying in {delay:.0f}s.")
+            pause(delay)
+
+def generate_from_prompt(prompt_template, historical_date_str):
+    # Keyed on the request's meaning rather than the exact prompt text, so recorded
+    # cassettes keep replaying after the prompt template is edited.
+    key = cassette_key(GEMINI_MODEL, historical_date_str)
+    if CASSETTE and CASSETTE.replaying:
+        recorded = CASSETTE.get_json("gemini", key)
+        if recorded is None:
+            logging.warning(f"No recorded Gemini response for {historical_date_str}.")
+            return None
+        return recorded["text"]
+
+    if not GOOGLE_API_KEY: 
+        logging.error("Google Gemini client not configured. Cannot generate analysis.")
+        return None
+
+    if USAGE_LEDGER and not USAGE_LEDGER.has_budget(KIND_GEMINI):
+        logging.warning("Daily Gemini budget is spent; not generating.")
+        return None
+
     try:
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        response = model.generate_content(
-            prompt_template,
-            generation_config=genai.types.GenerationConfig(
-                candidate_count=1,
-                stop_sequences=None,
-                max_output_tokens=2500, 
-                temperature=0.8, 
-                top_p=0.95,
-                top_k=40,
-            ),
-        )
+        response = generate_content_with_backoff(prompt_template)
+        usage = getattr(response, "usage_metadata", None)
+        input_tokens = getattr(usage, "prompt_token_count", 0) or 0
+        output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+        if USAGE_LEDGER:
+            USAGE_LEDGER.record_gemini(input_tokens, output_tokens)
         generated_text = response.candidates[0].content.parts[0].text
-        logging.info("Successfully generated analysis using Google Gemini API.")
+        logging.info(f"Successfully generated analysis using Google Gemini API ({input_tokens} input / {output_tokens} output tokens).")
+        if CASSETTE and CASSETTE.recording:
+            CASSETTE.put_json("gemini", key, {
+                "historical_date": historical_date_str,
+                "prompt_sha1": cassette_key(prompt_template),
+                "text": generated_text,
+                "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+            })
         return generated_text
     except Exception as e:
+        if USAGE_LEDGER and isinstance(e, google_exceptions.ResourceExhausted) and is_daily_quota_error(gemini_error_detail(e)):
+            USAGE_LEDGER.record_exhausted(KIND_GEMINI)
         logging.error(f"Error generating AI analysis with Google Gemini: {e}")
         if hasattr(e, 'response') and hasattr(e.response, 'text'):
             logging.error(f"Gemini API error response: {e.response.text}")
@@ -333,6 +874,7 @@ h1{{{{font-family:'Source Code Pro',monospace;font-size:2.8rem;font-weight:700;c
                 <a href="https://www.amazon.com/Architecting-You-Bohemai-Art-ebook/dp/B0F9WDHYSL/" class="action-button" target="_blank">[ View on Amazon ]</a>
             </div>
         </div>
+        {BLOCK_START}{BLOCK_END}
         <div class="button-container">
             <a href="index.html" class="action-button">[ Back to Home ]</a>
             <a href="ai-time-capsule.html" class="action-button">[ Back to AI Time Capsule Index ]</a>
@@ -344,31 +886,141 @@ h1{{{{font-family:'Source Code Pro',monospace;font-size:2.8rem;font-weight:700;c
     """
     return html_template
 
-def load_existing_index():
+def render_page(body, entry, related_block=None):
+    """Full page for a stored body record; the site builder calls this (in worker processes) for stale pages."""
+    page = create_full_html_article(body["generated_html"], body["era"], entry.get("featured_image", ""))
+    return inject_related_block(page, related_block or f"{BLOCK_START}{BLOCK_END}")
+
+# Changes whenever the page markup does, which makes every analysis page stale for the next build.
+TEMPLATE_VERSION = hashlib.sha256(
+    (inspect.getsource(create_full_html_article) + inspect.getsource(related_block_html)).encode('utf-8')
+).hexdigest()[:12]
+
+def load_existing_index(index_path=INDEX_FILE):
     """Loads the index of previously generated analysis articles."""
-    if os.path.exists(INDEX_FILE):
-        with open(INDEX_FILE, 'r', encoding='utf-8') as f:
+    if os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
             try:
                 return json.load(f)
             except json.JSONDecodeError:
-                logging.warning(f"Corrupt or empty {INDEX_FILE}. Starting fresh.")
+                logging.warning(f"Corrupt or empty {index_path}. Starting fresh.")
                 return []
     return []
 
-def save_index(index_data):
-    """Saves the updated index of generated analysis articles."""
-    with open(INDEX_FILE, 'w', encoding='utf-8') as f:
-        json.dump(index_data, f, indent=2, ensure_ascii=False)
+def save_index(index_data, index_path=INDEX_FILE):
+    """Saves the updated index of generated analysis articles (and, for the published index, its search index)."""
+    write_atomic(index_path, json.dumps(index_data, indent=2, ensure_ascii=False))
+    if index_path == INDEX_FILE:
+        build_search_index(index_data, load_articles(ARTICLES_FILE))
 
-def main():
-    generated_analyses_index = load_existing_index()
-    
-    analyses_added_this_run = 0
-    attempts = 0
-    
-    logging.info("Starting Google CSE + Google Gemini AI Time Capsule Generation run (AI News Detective Mode)...")
+def link_related_analyses(linker, index_data):
+    """
+    Links analyses the neighbour graph has not seen yet, with the scraped-source term counts
+    stored in their body records; the next site build re-renders the pages whose block changed.
+    """
+    known = set(linker.ids)
+    source_terms = {entry["id"]: read_source_terms(entry["id"]) for entry in index_data if entry["id"] not in known}
+    changed = linker.sync(index_data, source_terms)
+    if changed:
+        linker.save()
+        logging.info(f"Related eras: {len(changed)} neighbour list(s) changed.")
+    return changed
+
+def build_site(index_data, linker=None, force=False):
+    """
+    Incrementally re-renders analysis pages, era archives, feed and sitemap (see site_builder.py),
+    then publishes whatever changed (see site_publisher.py). Returns the site build stats.
+    """
+    linker = linker or RelatedAnalyses()
+    entries_by_id = {entry["id"]: entry for entry in index_data}
+    related_blocks = {analysis_id: related_block_html(linker.neighbors.get(analysis_id, []), entries_by_id) for analysis_id in entries_by_id}
+    builder = SiteBuilder(render_page, TEMPLATE_VERSION)
+    recovered = builder.ensure_bodies(index_data)
+    if recovered:
+        logging.info(f"Recovered stored bodies for {recovered} page(s) rendered before bodies were kept.")
+    stats = builder.build(index_data, related_blocks, force=force)
+    publish_site(force=force)
+    return stats
+
+def parse_shard(spec):
+    """Parses '--shard i/N' (1-based) into (i, N)."""
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+)\s*', spec or "")
+    if not match:
+        raise argparse.ArgumentTypeError(f"Shard must look like i/N, got '{spec}'.")
+    shard_index, shard_count = int(match.group(1)), int(match.group(2))
+    if not 1 <= shard_index <= shard_count:
+        raise argparse.ArgumentTypeError(f"Shard index must be between 1 and {shard_count}, got {shard_index}.")
+    return shard_index, shard_count
+
+def shard_months(shard_index, shard_count, start_year=PAST_YEAR_RANGE[0], end_year=PAST_YEAR_RANGE[1]):
+    """
+    Deterministic partition of the (year, month) space: months are numbered in calendar
+    order and dealt round-robin, so every shard covers the whole era evenly and no two
+    shards can ever pick the same month.
+    """
+    months = [datetime(year, month, 1) for year in range(start_year, end_year + 1) for month in range(1, 13)]
+    return [m for k, m in enumerate(months) if k % shard_count == shard_index - 1]
+
+def shard_fragment_path(shard_index, shard_count):
+    return os.path.join(INDEX_FRAGMENTS_DIR, f"shard-{shard_index}-of-{shard_count}.json")
+
+def merge_index_fragments(fragments_dir=INDEX_FRAGMENTS_DIR, index_path=INDEX_FILE):
+    """
+    Folds every shard's index fragment into the main index. Entries are keyed by id, so
+    merging the same fragments twice (or overlapping reruns of a shard) adds nothing new.
+    """
+    index_data = load_existing_index(index_path)
+    known_ids = {entry.get("id") for entry in index_data}
+    merged = []
+    fragment_paths = sorted(
+        os.path.join(fragments_dir, name) for name in os.listdir(fragments_dir) if name.endswith(".json")
+    ) if os.path.isdir(fragments_dir) else []
+
+    for fragment_path in fragment_paths:
+        for entry in load_existing_index(fragment_path):
+            if entry.get("id") in known_ids:
+                continue
+            if not os.path.exists(entry.get("html_path", "")):
+                logging.warning(f"Skipping {entry.get('id')} from {fragment_path}: article file {entry.get('html_path')} is missing.")
+                continue
+            known_ids.add(entry["id"])
+            merged.append(entry)
+
+    merged.sort(key=lambda entry: entry.get("generated_date", ""))
+    index_data.extend(merged)
+    save_index(index_data, index_path)
+    linker = RelatedAnalyses()
+    link_related_analyses(linker, index_data)
+    build_site(index_data, linker)
+    for fragment_path in fragment_paths:
+        os.remove(fragment_path)
+    logging.info(f"Merged {len(merged)} new analyses from {len(fragment_paths)} fragment(s). Total analyses in index: {len(index_data)}")
+    return merged
+
+# --- REFINED TARGETED DOMAINS ---
+# Excluded problematic general corporate/organizational sites.
+# Focused on true academic/research/journal sources.
+TARGETED_DOMAINS = [
+    "aaai.org", "jair.org", "dl.acm.org", "acm.org", 
+    "mit.edu", "stanford.edu", "cmu.edu", "berkeley.edu", 
+    "ieee.org", "spectrum.ieee.org", 
+    "sciencedirect.com", "onlinelibrary.wiley.com", 
+    "wired.com", "sciencedaily.com", 
+    "ijcai.org", "nips.cc", "icml.cc" 
+]
+
+def build_search_query(primary_scrape_date_str):
+    ai_search_terms = " OR ".join(f'"{kw}"' for kw in AI_KEYWORDS) 
+    publication_search_terms = " OR ".join(f'"{kw}"' for kw in PUBLICATION_KEYWORDS) 
+    domains = DOMAIN_HEALTH.order_domains(TARGETED_DOMAINS) if DOMAIN_HEALTH else TARGETED_DOMAINS
+    site_operators = " OR ".join(f"site:{d}" for d in domains)
+    return f'({ai_search_terms}) ({publication_search_terms}) {primary_scrape_date_str} ({site_operators})'
 
-    # --- Diagnostic: List available Gemini models ---
+def check_gemini_model():
+    """Diagnostic: confirms GEMINI_MODEL is available and supports generateContent."""
+    global GEMINI_MODEL_VERIFIED
+    if GEMINI_MODEL_VERIFIED:
+        return True
     logging.info("Attempting to list available Gemini models for debugging:")
     try:
         found_target_model = False
@@ -382,151 +1034,518 @@ def main():
         
         if not found_target_model:
             logging.error(f"Configured model '{GEMINI_MODEL}' was NOT found in the list of models supporting generateContent for your API Key. Please check API key permissions/restrictions or Google Cloud billing setup.")
-            time.sleep(10)
-            return 
-        else:
-            logging.info(f"Configured model '{GEMINI_MODEL}' IS found and supports generateContent. Proceeding.")
+            return False
+        logging.info(f"Configured model '{GEMINI_MODEL}' IS found and supports generateContent. Proceeding.")
+        GEMINI_MODEL_VERIFIED = True
+        return True
 
     except Exception as e:
         logging.error(f"Failed to list Gemini models: {e}. This might indicate API key/billing issue.")
         logging.info("Exiting due to Gemini model listing failure.")
-        time.sleep(10)
-        return 
-    # --- End Diagnostic ---
+        return False
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate AI Time Capsule analyses from historical AI articles.")
+    parser.add_argument("command", nargs="?", default="generate", choices=["generate", "merge", "index", "related", "build", "publish", "serve"],
+                        help="generate (default) runs the pipeline; merge folds shard index fragments into the index; "
+                             "index rebuilds the search index; related recomputes every page's related eras; "
+                             "build re-renders stale pages, era archives, feed and sitemap; "
+                             "publish writes minified, fingerprinted and precompressed copies of changed files into public/; "
+                             "serve keeps clients and caches warm and runs jobs posted to a local HTTP API (see capsule_service.py).")
+    parser.add_argument("--shard", type=parse_shard, metavar="i/N",
+                        help="Only work on the i-th of N deterministic partitions of the month space, writing an index fragment.")
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument("--record", metavar="DIR",
+                                help="Record CSE, page and Gemini responses into a cassette directory.")
+    cassette_group.add_argument("--replay", metavar="DIR",
+                                help="Replay a recorded cassette directory with no network access.")
+    parser.add_argument("--pages-per-month", type=int, default=CSE_PAGES_PER_MONTH,
+                        help=f"CSE result pages to harvest per month before moving on (default: {CSE_PAGES_PER_MONTH}).")
+    parser.add_argument("--count", type=int, default=1,
+                        help="Analyses to publish in this run, budget permitting (default: 1).")
+    parser.add_argument("--max-attempts", type=int,
+                        help=f"Hard cap on attempts (default: whatever today's budget allows; {MAX_SEARCH_ATTEMPTS_PER_RUN} without a ledger).")
+    parser.add_argument("--force", action="store_true",
+                        help="With build or publish: regenerate every output regardless of recorded input hashes.")
+    parser.add_argument("--journal",
+                        help=f"Stage journal used to resume interrupted attempts (default: {RUN_JOURNAL_FILE}, or one per shard).")
+    parser.add_argument("--host", default=SERVICE_HOST, help=f"With serve: address to listen on (default: {SERVICE_HOST}).")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT, help=f"With serve: port to listen on (default: {SERVICE_PORT}).")
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS,
+                        help=f"With serve: jobs run concurrently (default: {SERVICE_WORKERS}).")
+    args = parser.parse_args(argv)
+    if args.command == "serve" and args.shard:
+        parser.error("serve owns the whole index; it cannot run as a shard.")
+    return args
+
+def content_slug(generated_html_content, primary_scrape_date_str):
+    """Content-derived article slug: identical output maps to the same file, different output never collides."""
+    digest = hashlib.sha256(f"{primary_scrape_date_str}\n{generated_html_content}".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def render_analysis(generated_html_content, primary_scrape_date_str, original_sources_count):
+    """Renders the full article page and builds its index entry. Returns (html_path, full_html, analysis_data)."""
+    slug = content_slug(generated_html_content, primary_scrape_date_str)
+    filename = f"ai_analysis_{slug}.html"
+    html_path = os.path.join(GENERATED_ARTICLES_DIR, filename)
     
-    month_names = ["January", "February", "March", "April", "May", "June", 
-                   "July", "August", "September", "October", "November", "December"]
+    header_image_url = get_header_image_url(filename) 
+    
+    analysis_data = {
+        "id": f"analysis_{slug}",
+        "title": f"AI in the Era of {primary_scrape_date_str}", 
+        "summary": "An insightful look back at historical AI concepts and their prescience.", 
+        "html_path": html_path.replace("\\", "/"), 
+        "generated_date": datetime.now().isoformat(),
+        "original_sources_count": original_sources_count,
+        "featured_image": header_image_url
+    }
+    match_h1_for_index = re.search(r'<h1[^>]*>(.*?)<\/h1>', generated_html_content, re.IGNORECASE | re.DOTALL)
+    if match_h1_for_index:
+        analysis_data['title'] = match_h1_for_index.group(1).strip()
+    
+    match_hook_for_index = re.search(r'<p\s+class="hook"[^>]*>(.*?)<\/p>', generated_html_content, re.IGNORECASE | re.DOTALL)
+    if match_hook_for_index:
+        analysis_data['summary'] = match_hook_for_index.group(1).strip()
 
-    while analyses_added_this_run < 1 and attempts < MAX_SEARCH_ATTEMPTS_PER_RUN: 
-        attempts += 1
-        
-        random_month_date = get_random_past_month(*PAST_YEAR_RANGE)
-        primary_scrape_date_str = f"{month_names[random_month_date.month - 1]} {random_month_date.year}"
-        logging.info(f"Attempt {attempts}/{MAX_SEARCH_ATTEMPTS_PER_RUN}: Searching for raw articles from: {primary_scrape_date_str}")
-        
-        ai_search_terms = " OR ".join(f'"{kw}"' for kw in AI_KEYWORDS) 
-        publication_search_terms = " OR ".join(f'"{kw}"' for kw in PUBLICATION_KEYWORDS) 
-
-        # --- REFINED TARGETED DOMAINS ---
-        # Excluded problematic general corporate/organizational sites.
-        # Focused on true academic/research/journal sources.
-        targeted_domains = [
-            "aaai.org", "jair.org", "dl.acm.org", "acm.org", 
-            "mit.edu", "stanford.edu", "cmu.edu", "berkeley.edu", 
-            "ieee.org", "spectrum.ieee.org", 
-            "sciencedirect.com", "onlinelibrary.wiley.com", 
-            "wired.com", "sciencedaily.com", 
-            "ijcai.org", "nips.cc", "icml.cc" 
-        ]
-        site_operators = " OR ".join(f"site:{d}" for d in targeted_domains)
-
-        search_query = f'({ai_search_terms}) ({publication_search_terms}) {primary_scrape_date_str} ({site_operators})'
-        
-        logging.debug(f"  Generated search query: {search_query}")
-        
-        google_cse_results = fetch_google_cse_results(search_query, num_results=10) 
-        
-        if not google_cse_results:
-            logging.info(f"  No relevant search results found in Google CSE for {primary_scrape_date_str} with current query. Trying next date.")
-            time.sleep(2) 
-            continue
+    # Same rendering path as the site builder, so the next build finds this page up to date.
+    full_article_html = render_page({"generated_html": generated_html_content, "era": primary_scrape_date_str}, analysis_data)
+    return html_path, full_article_html, analysis_data
 
-        random.shuffle(google_cse_results) 
-        
-        scraped_articles_for_synthesis = []
-        for i, result in enumerate(google_cse_results):
-            if len(scraped_articles_for_synthesis) >= MAX_SCRAPED_ARTICLES_FOR_SYNTHESIS:
-                break 
-
-            # --- Aggressive URL Filtering ---
-            if any(term in result['link'].lower() for term in [
-                '.zip', '.exe', '.jpg', '.png', '.gif', '.mp3', '.mp4', '.avi', 
-                'forum', 'forums', 'discussion', 'archive.org', 'support.google.com', 
-                'jobs.google.com', 'developers.google.com', 'policies.google.com', 
-                'privacy', 'legal', 'terms', 'about', 'contact', 'careers', 'sitemap.xml', 'robots.txt',
-                'github.com', 'aws.amazon.com', 'azure.microsoft.com', 'cloud.google.com', 
-                'openai.com', 'perplexity.ai', 'reddit.com', 'twitter.com', 'facebook.com', 'youtube.com', 
-                'blog', '/blog/', 'newsroom', '/newsroom/', 'press', '/press/',
-                'login', 'signup', 'subscribe', 'cart', 'shop', 'cdn.', 'assets.', 'static.', 'media.',
-                'docs.', 'api.', 'dev.', 'help.', 'solutions', 'products', 'services', 
-                'faq', 'events', 'webinars', 'tutorials', 'guides', 'overview', 'definition', 'what-is', 
-                'wikipedia.org', 'wikidata.org', 'wikibooks.org', 
-                'energy.gov', 'ifr.org', 'ri.cmu.edu' 
-                ]) or (result['link'].count('/') <= 3 and any(d in result['link'].lower() for d in ['org', 'edu', 'com', 'net'])): 
-                logging.debug(f"  Skipping {result['link']}: Appears to be a non-article page type or too generic base domain.")
-                continue
+def is_scrape_candidate(result):
+    """Cheap pre-scrape checks on a search result's URL, title and snippet."""
+    # --- Aggressive URL Filtering ---
+    if any(term in result['link'].lower() for term in [
+        '.zip', '.exe', '.jpg', '.png', '.gif', '.mp3', '.mp4', '.avi', 
+        'forum', 'forums', 'discussion', 'archive.org', 'support.google.com', 
+        'jobs.google.com', 'developers.google.com', 'policies.google.com', 
+        'privacy', 'legal', 'terms', 'about', 'contact', 'careers', 'sitemap.xml', 'robots.txt',
+        'github.com', 'aws.amazon.com', 'azure.microsoft.com', 'cloud.google.com', 
+        'openai.com', 'perplexity.ai', 'reddit.com', 'twitter.com', 'facebook.com', 'youtube.com', 
+        'blog', '/blog/', 'newsroom', '/newsroom/', 'press', '/press/',
+        'login', 'signup', 'subscribe', 'cart', 'shop', 'cdn.', 'assets.', 'static.', 'media.',
+        'docs.', 'api.', 'dev.', 'help.', 'solutions', 'products', 'services', 
+        'faq', 'events', 'webinars', 'tutorials', 'guides', 'overview', 'definition', 'what-is', 
+        'wikipedia.org', 'wikidata.org', 'wikibooks.org', 
+        'energy.gov', 'ifr.org', 'ri.cmu.edu' 
+        ]) or (result['link'].count('/') <= 3 and any(d in result['link'].lower() for d in ['org', 'edu', 'com', 'net'])): 
+        logging.debug(f"  Skipping {result['link']}: Appears to be a non-article page type or too generic base domain.")
+        return False
 
-            potential_ai = False
-            combined_text_from_search = (result['title'] + " " + result['snippet']).lower()
-            if any(keyword in combined_text_from_search for keyword in AI_KEYWORDS):
-                potential_ai = True
+    potential_ai = False
+    combined_text_from_search = (result['title'] + " " + result['snippet']).lower()
+    if any(keyword in combined_text_from_search for keyword in AI_KEYWORDS):
+        potential_ai = True
 
-            if not potential_ai:
-                logging.debug(f"  Skipping {result['link']}: No strong AI keywords in title/snippet from search result.")
-                continue
+    if not potential_ai:
+        logging.debug(f"  Skipping {result['link']}: No strong AI keywords in title/snippet from search result.")
+        return False
+    return True
 
-            logging.info(f"  Attempting to scrape raw text from potential AI article: {result['link']}")
-            article_content = scrape_full_article_text(result['link'])
-            
+def _scrape_one(result):
+    logging.info(f"  Attempting to scrape raw text from potential AI article: {result['link']}")
+    article_content = scrape_full_article_text(result['link'])
+    pause(1.5) # Per-fetcher politeness delay
+    return article_content
+
+def select_candidates(google_cse_results):
+    """Search results worth fetching: scrapeable links on healthy domains, not confidently out of range."""
+    candidates = [result for result in google_cse_results if is_scrape_candidate(result)]
+    if DOMAIN_HEALTH:
+        healthy = [result for result in candidates if not DOMAIN_HEALTH.is_open(result['link'])]
+        if len(healthy) < len(candidates):
+            logging.info(f"  Skipping {len(candidates) - len(healthy)} candidate(s) on domains with an open circuit breaker.")
+            count_stat("breaker_skips", len(candidates) - len(healthy))
+        candidates = healthy
+    if DATE_RESOLVER:
+        resolved = DATE_RESOLVER.filter_candidates(candidates)
+        count_stat("date_prefiltered", len(candidates) - len(resolved))
+        candidates = resolved
+    return candidates
+
+def scrape_candidates(candidates, limit=MAX_SCRAPED_ARTICLES_FOR_SYNTHESIS):
+    """
+    Scrapes selected candidates (see select_candidates()) with SCRAPE_WORKERS concurrent
+    fetchers until `limit` usable articles are found. Only as many fetches
+    as can still be useful are in flight, and results keep the search order.
+    """
+    accepted = {}
+    next_candidate = 0
+    with ThreadPoolExecutor(max_workers=SCRAPE_WORKERS) as executor:
+        in_flight = {}
+        while True:
+            while (next_candidate < len(candidates) and len(in_flight) < SCRAPE_WORKERS
+                   and len(accepted) + len(in_flight) < limit):
+                in_flight[executor.submit(_scrape_one, candidates[next_candidate])] = next_candidate
+                next_candidate += 1
+            if not in_flight:
+                break
+            future = next(as_completed(in_flight))
+            position = in_flight.pop(future)
+            article_content = future.result()
             if article_content:
-                scraped_articles_for_synthesis.append(article_content)
-                logging.info(f"  Successfully scraped raw text from '{article_content['title']}'. Scraped count: {len(scraped_articles_for_synthesis)}")
+                accepted[position] = article_content
+                logging.info(f"  Successfully scraped raw text from '{article_content['title']}'. Scraped count: {len(accepted)}")
             else:
-                logging.info(f"  Failed to scrape or validate content from {result['link']}.")
-            
-            time.sleep(1.5) 
+                logging.info(f"  Failed to scrape or validate content from {candidates[position]['link']}.")
+    return [accepted[position] for position in sorted(accepted)][:limit]
+
+def search_and_scrape(journal, attempt_id, primary_scrape_date_str, pages_per_month):
+    """
+    Pages through CSE results for a month (start offsets of 10), scraping each page while
+    the next one is prefetched in the background when the page has too few viable
+    candidates to fill the remaining slots. Stops at `pages_per_month`, when CSE has
+    no more results, or once MAX_SCRAPED_ARTICLES_FOR_SYNTHESIS articles are accepted.
+    Progress is journalled per page, so a resume continues with the next unscraped page.
+    Returns (cse_pages, accepted_articles).
+    """
+    data = journal.data(attempt_id)
+    cse_pages = data.get("cse_pages") or ([data["cse_results"]] if "cse_results" in data else [])
+    accepted = list(data.get("accepted_articles", []))
+    exhausted = data.get("cse_exhausted", False)
+    page_number = data.get("scraped_pages", 0) + 1
+    search_query = build_search_query(primary_scrape_date_str)
+    logging.debug(f"  Generated search query: {search_query}")
 
+    def fetch_page(number):
+        return fetch_google_cse_page(search_query, number, num_results=10, historical_date_str=primary_scrape_date_str)
+
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        prefetched = None
+        while len(accepted) < MAX_SCRAPED_ARTICLES_FOR_SYNTHESIS and page_number <= pages_per_month:
+            if page_number <= len(cse_pages):
+                results = cse_pages[page_number - 1]
+            elif exhausted:
+                break
+            else:
+                results, has_more = prefetched.result() if prefetched else fetch_page(page_number)
+                prefetched = None
+                random.shuffle(results) 
+                cse_pages.append(results)
+                exhausted = not has_more
+
+            candidates = select_candidates(results) if results else []
+            needed = MAX_SCRAPED_ARTICLES_FOR_SYNTHESIS - len(accepted)
+            # Only prefetch when this page cannot fill the remaining slots on its own; otherwise
+            # the next page would usually cost a CSE query that is never used.
+            if (prefetched is None and not exhausted and len(candidates) < needed
+                    and page_number == len(cse_pages) and page_number < pages_per_month):
+                prefetched = prefetcher.submit(fetch_page, page_number + 1)
+
+            if candidates:
+                accepted.extend(scrape_candidates(candidates, limit=needed))
+            journal.record(attempt_id, "searched", cse_pages=cse_pages, cse_exhausted=exhausted,
+                           scraped_pages=page_number, accepted_articles=accepted)
+            page_number += 1
+        if prefetched is not None:
+            # Enough accepted before the prefetched page was needed; keep it for a resume.
+            results, has_more = prefetched.result()
+            random.shuffle(results)
+            cse_pages.append(results)
+            journal.record(attempt_id, "searched", cse_pages=cse_pages, cse_exhausted=not has_more,
+                           scraped_pages=page_number - 1, accepted_articles=accepted)
+    return cse_pages, accepted
+
+def run_attempt(journal, month_date, generated_analyses_index, index_path=INDEX_FILE, pages_per_month=CSE_PAGES_PER_MONTH, metrics=None):
+    """
+    Runs one month through searched -> scraped -> packed -> generated -> rendered -> indexed,
+    skipping any stage the journal already has, and returns the new index entry (or None).
+    Stages that actually run are timed into `metrics` (see timed_stage()).
+    """
+    attempt_id = attempt_id_for_month(month_date)
+    primary_scrape_date_str = f"{MONTH_NAMES[month_date.month - 1]} {month_date.year}"
+    data = journal.data(attempt_id)
+
+    if journal.reached(attempt_id, "scraped"):
+        scraped_articles_for_synthesis = data["scraped_articles"]
+    else:
+        if journal.reached(attempt_id, "searched"):
+            logging.info(f"  Resuming {attempt_id} from journal ({journal.stage(attempt_id)}).")
+        with timed_stage(metrics, "scraped"):
+            cse_pages, scraped_articles_for_synthesis = search_and_scrape(journal, attempt_id, primary_scrape_date_str, pages_per_month)
+        if not any(cse_pages):
+            logging.info(f"  No relevant search results found in Google CSE for {primary_scrape_date_str} with current query. Trying next date.")
+            journal.record(attempt_id, STAGE_ABANDONED, reason="no_search_results")
+            pause(2) 
+            return None
         if not scraped_articles_for_synthesis:
-            logging.info(f"  No suitable articles scraped for synthesis from {primary_scrape_date_str} after full scraping attempts. Trying next date.")
-            time.sleep(3) 
-            continue
+            logging.info(f"  No suitable articles scraped for synthesis from {primary_scrape_date_str} after {len(cse_pages)} page(s) of results. Trying next date.")
+            journal.record(attempt_id, STAGE_ABANDONED, reason="nothing_scraped")
+            pause(3) 
+            return None
+        journal.record(attempt_id, "scraped", scraped_articles=scraped_articles_for_synthesis)
 
+    if journal.reached(attempt_id, "packed"):
+        prompt = data["prompt"]
+    else:
+        with timed_stage(metrics, "packed"):
+            prompt = build_synthesis_prompt(scraped_articles_for_synthesis, primary_scrape_date_str)
+        journal.record(attempt_id, "packed", prompt=prompt)
+
+    if journal.reached(attempt_id, "generated"):
+        generated_html_content = data["generated_html"]
+    else:
         logging.info(f"  Proceeding to generate AI analysis using Gemini for {len(scraped_articles_for_synthesis)} articles scraped from {primary_scrape_date_str}.")
-        generated_html_content = generate_ai_analysis(scraped_articles_for_synthesis, primary_scrape_date_str)
+        with timed_stage(metrics, "generated"):
+            generated_html_content = generate_from_prompt(prompt, primary_scrape_date_str)
+        if not generated_html_content:
+            # Not abandoned: the sources are still good, so a rerun retries only the LLM call.
+            logging.warning("  Failed to generate analysis content with Gemini for this attempt.")
+            return None
+        journal.record(attempt_id, "generated", generated_html=generated_html_content)
 
-        if generated_html_content:
-            timestamp_slug = datetime.now().strftime("%Y%m%d%H%M%S")
-            filename = f"ai_analysis_{timestamp_slug}.html"
-            html_path = os.path.join(GENERATED_ARTICLES_DIR, filename)
-            
-            header_image_url = get_header_image_url(filename) 
+    if journal.reached(attempt_id, "rendered"):
+        html_path, analysis_data = data["html_path"], data["analysis"]
+    else:
+        with timed_stage(metrics, "rendered"):
+            html_path, full_article_html, analysis_data = render_analysis(
+                generated_html_content, primary_scrape_date_str, len(scraped_articles_for_synthesis))
+            source_terms = term_counts("\n".join(f"{a.get('title', '')}\n{a.get('text', '')}" for a in scraped_articles_for_synthesis))
+            write_body(analysis_data["id"], primary_scrape_date_str, generated_html_content, source_terms)
+            write_atomic(html_path, full_article_html)
+        journal.record(attempt_id, "rendered", html_path=html_path, analysis=analysis_data,
+                       analysis_id=analysis_data["id"])
 
-            full_article_html = create_full_html_article(
-                generated_html_content,
-                primary_scrape_date_str, 
-                header_image_url
-            )
-            
-            with open(html_path, 'w', encoding='utf-8') as f:
-                f.write(full_article_html)
-            
-            analysis_data = {
-                "id": f"analysis_{timestamp_slug}",
-                "title": f"AI in the Era of {primary_scrape_date_str}", 
-                "summary": "An insightful look back at historical AI concepts and their prescience.", 
-                "html_path": html_path.replace("\\", "/"), 
-                "generated_date": datetime.now().isoformat(),
-                "original_sources_count": len(scraped_articles_for_synthesis),
-                "featured_image": header_image_url
-            }
-            match_h1_for_index = re.search(r'<h1[^>]*>(.*?)<\/h1>', generated_html_content, re.IGNORECASE | re.DOTALL)
-            if match_h1_for_index:
-                analysis_data['title'] = match_h1_for_index.group(1).strip()
-            
-            match_hook_for_index = re.search(r'<p\s+class="hook"[^>]*>(.*?)<\/p>', generated_html_content, re.IGNORECASE | re.DOTALL)
-            if match_hook_for_index:
-                analysis_data['summary'] = match_hook_for_index.group(1).strip()
-            
+    with INDEX_LOCK, timed_stage(metrics, "indexed"):
+        if not any(entry.get("id") == analysis_data["id"] for entry in generated_analyses_index):
             generated_analyses_index.append(analysis_data)
-            analyses_added_this_run += 1
-            logging.info(f"  SUCCESS: Generated new analysis article: {filename}")
+            save_index(generated_analyses_index, index_path)
+        if USAGE_LEDGER and not journal.reached(attempt_id, "indexed"):
+            USAGE_LEDGER.record_published(analysis_data["id"])
+        journal.record(attempt_id, "indexed", analysis_id=analysis_data["id"], html_path=html_path)
+        if RELATED_ANALYSES:
+            link_related_analyses(RELATED_ANALYSES, generated_analyses_index)
+    logging.info(f"  SUCCESS: Generated new analysis article: {os.path.basename(html_path)}")
+    return analysis_data
+
+def claim_attempt(attempt_id):
+    """True if no other worker is running this attempt; the caller must release_attempt() it afterwards."""
+    with ACTIVE_ATTEMPTS_LOCK:
+        if attempt_id in ACTIVE_ATTEMPTS:
+            return False
+        ACTIVE_ATTEMPTS.add(attempt_id)
+        return True
+
+def release_attempt(attempt_id):
+    with ACTIVE_ATTEMPTS_LOCK:
+        ACTIVE_ATTEMPTS.discard(attempt_id)
+
+def init_run_state(ledger_path=USAGE_LEDGER_FILE, shard_count=1, link_related=True):
+    """Loads the date cache, domain health, related-eras graph and usage ledger a generation run works with."""
+    global DATE_RESOLVER, DOMAIN_HEALTH, USAGE_LEDGER, RELATED_ANALYSES
+    DATE_RESOLVER = DateResolver(URL_DATE_CACHE_FILE, PAST_YEAR_RANGE)
+    DOMAIN_HEALTH = DomainHealth(DOMAIN_HEALTH_FILE, REQUEST_TIMEOUT)
+    RELATED_ANALYSES = RelatedAnalyses() if link_related else None
+    if CASSETTE and CASSETTE.replaying:
+        USAGE_LEDGER = None
+    else:
+        # Shards run on separate machines, so each gets an equal slice of the daily quota. The
+        # free CSE allowance is shared too; report_merged_usage() applies it once to the total.
+        prices = USAGE_PRICES if shard_count == 1 else dict(USAGE_PRICES, cse_free_per_day=0)
+        USAGE_LEDGER = UsageLedger(ledger_path, CSE_DAILY_QUOTA // shard_count, GEMINI_DAILY_REQUESTS // shard_count,
+                                   GEMINI_DAILY_TOKENS // shard_count, prices)
+
+def report_merged_usage(pattern=SHARD_LEDGER_PATTERN):
+    """Reports usage and cost over every shard's ledger (and the local one), with the free CSE allowance applied once."""
+    shard_paths = sorted(glob.glob(pattern))
+    if shard_paths:
+        UsageLedger(USAGE_LEDGER_FILE, CSE_DAILY_QUOTA, GEMINI_DAILY_REQUESTS, GEMINI_DAILY_TOKENS, USAGE_PRICES,
+                    extra_paths=shard_paths).report()
+
+def generate_analyses(journal, generated_analyses_index, count=1, candidate_months=None, max_attempts=None, index_path=INDEX_FILE,
+                      pages_per_month=CSE_PAGES_PER_MONTH, resume=True, metrics=None):
+    """
+    The attempt loop: resumes interrupted attempts first (if `resume`), then tries random
+    months (from `candidate_months` if given) until `count` analyses are added, `max_attempts`
+    is reached or today's budget is spent. Attempts another worker holds are skipped.
+    Returns the new index entries.
+    """
+    added = []
+    attempts = 0
+    idle_attempts = 0
+
+    def can_attempt():
+        if max_attempts is not None and attempts >= max_attempts:
+            return False
+        if not USAGE_LEDGER:
+            return attempts < MAX_SEARCH_ATTEMPTS_PER_RUN
+        # Failed CSE calls are not charged, so the budget alone never stops a run that cannot reach CSE.
+        if attempts >= USAGE_LEDGER.limits["cse"]:
+            return False
+        if idle_attempts >= MAX_IDLE_ATTEMPTS:
+            logging.warning(f"{idle_attempts} attempts in a row spent no CSE quota; Custom Search looks unreachable. Stopping.")
+            return False
+        remaining = USAGE_LEDGER.remaining()
+        if not (remaining["cse"] and remaining["gemini_requests"] and remaining["gemini_tokens"]):
+            logging.info(f"Daily budget spent (remaining: {remaining}). Stopping.")
+            return False
+        return True
+
+    # Interrupted attempts from an earlier run go first; their completed stages are not redone.
+    resume_queue = journal.resumable() if resume else []
+    if resume_queue:
+        logging.info(f"Journal has {len(resume_queue)} interrupted attempt(s) to resume: {', '.join(resume_queue)}")
+
+    while len(added) < count and can_attempt(): 
+        attempts += 1
+        budget_note = f"{USAGE_LEDGER.remaining()['cse']} CSE queries left today" if USAGE_LEDGER else f"max {MAX_SEARCH_ATTEMPTS_PER_RUN}"
+        
+        resumed = bool(resume_queue)
+        if resume_queue:
+            attempt_id = resume_queue.pop(0)
+            month_date = datetime(int(attempt_id[:4]), int(attempt_id[4:]), 1)
         else:
-            logging.warning("  Failed to generate analysis content with Gemini for this attempt.")
+            month_date = random.choice(candidate_months) if candidate_months else get_random_past_month(*PAST_YEAR_RANGE)
+            attempt_id = attempt_id_for_month(month_date)
+            if attempt_id in journal.completed():
+                logging.info(f"Attempt {attempts} ({budget_note}): {MONTH_NAMES[month_date.month - 1]} {month_date.year} already has an analysis. Trying next date.")
+                continue
+        if not claim_attempt(attempt_id):
+            logging.info(f"Attempt {attempts}: {MONTH_NAMES[month_date.month - 1]} {month_date.year} is being worked on by another job. Trying next date.")
+            continue
+        logging.info(f"Attempt {attempts} ({budget_note}): Searching for raw articles from: {MONTH_NAMES[month_date.month - 1]} {month_date.year}")
+        
+        cse_before = USAGE_LEDGER.remaining()["cse"] if USAGE_LEDGER else None
+        try:
+            analysis_data = run_attempt(journal, month_date, generated_analyses_index, index_path, pages_per_month, metrics)
+        finally:
+            release_attempt(attempt_id)
+        if USAGE_LEDGER and not resumed: # Resumed attempts may legitimately reuse journaled CSE results
+            idle_attempts = idle_attempts + 1 if USAGE_LEDGER.remaining()["cse"] == cse_before else 0
+        if analysis_data:
+            added.append(analysis_data)
         
-        time.sleep(5) 
+        pause(5) 
+    return added
+
+def log_run_report():
+    logging.info(f"Fetch report: {RUN_STATS['cse_pages_fetched']} CSE pages, {RUN_STATS['bytes_downloaded'] // 1024} KB downloaded, {RUN_STATS['bytes_saved'] // 1024} KB saved by "
+                 f"{RUN_STATS['early_rejects']} early rejects, {RUN_STATS['date_prefiltered']} candidates dropped by date before fetching, "
+                 f"{RUN_STATS['breaker_skips']} skipped by open circuit breakers, {RUN_STATS['pages_parsed']} documents fully parsed.")
+    if USAGE_LEDGER:
+        USAGE_LEDGER.report()
+    if CASSETTE and CASSETTE.replaying and CASSETTE.misses:
+        logging.warning(f"Replay had {CASSETTE.misses} cassette misses (requests not present in the recording).")
+
+def serve(args):
+    """
+    Service mode: loads everything once, then runs queued jobs (see capsule_service.py) on a
+    worker pool until stopped. Each job runs generate_analyses() against the shared journal
+    and index, then the incremental site build. Returns the number of jobs completed.
+    """
+    init_run_state()
+    if not (CASSETTE and CASSETTE.replaying) and not check_gemini_model():
+        return 0
+    journal = RunJournal(args.journal or RUN_JOURNAL_FILE)
+    generated_analyses_index = load_existing_index()
+    completed = Counter()
+
+    def run_job(job, metrics):
+        options = job.get("options", {})
+        months = [datetime.strptime(job["month"], "%Y-%m")] if job.get("month") else None
+        # A named month is tried once; a random-month job gets the usual budget-bounded attempts.
+        max_attempts = options.get("max_attempts", 1 if months else args.max_attempts)
+        added = generate_analyses(journal, generated_analyses_index, job["count"], months, max_attempts, INDEX_FILE,
+                                  options.get("pages_per_month", args.pages_per_month), resume=months is None, metrics=metrics)
+        with INDEX_LOCK, timed_stage(metrics, "site_built"):
+            save_index(generated_analyses_index)
+            build_site(generated_analyses_index, RELATED_ANALYSES)
+        DOMAIN_HEALTH.save()
+        completed["jobs"] += 1
+        return {"analyses_added": len(added), "analysis_ids": [a["id"] for a in added],
+                "html_paths": [a["html_path"] for a in added], "total_analyses": len(generated_analyses_index)}
+
+    def status():
+        with RUN_STATS_LOCK:
+            fetch = dict(RUN_STATS)
+        return {"fetch": fetch, "usage_remaining": USAGE_LEDGER.remaining() if USAGE_LEDGER else None,
+                "total_analyses": len(generated_analyses_index),
+                "warm": {"gemini_client": GEMINI_CLIENT is not None, "gemini_model_verified": GEMINI_MODEL_VERIFIED,
+                         "extraction_pool": EXTRACTION_POOL is not None, "related_analyses": len(RELATED_ANALYSES.ids)}}
+
+    service = CapsuleService(run_job, status, queue_path=JOB_QUEUE_FILE, workers=args.workers)
+    try:
+        service.serve_forever(args.host, args.port)
+    finally:
+        shutdown_extraction_pool()
+        DOMAIN_HEALTH.save()
+        log_run_report()
+    return completed["jobs"]
+
+def main(argv=None):
+    global CASSETTE
+    args = parse_args(argv)
+    RUN_STATS.clear()
+    if args.record:
+        CASSETTE = Cassette(args.record, MODE_RECORD)
+    elif args.replay:
+        CASSETTE = Cassette(args.replay, MODE_REPLAY)
+    else:
+        CASSETTE = None
+    if CASSETTE:
+        random.seed(CASSETTE.seed())
+        logging.info(f"Cassette {CASSETTE.mode} mode: {CASSETTE.root}")
+
+    if args.command == "merge":
+        merged = merge_index_fragments()
+        report_merged_usage()
+        return len(merged)
+    if args.command == "index":
+        documents = build_search_index(load_existing_index(), load_articles(ARTICLES_FILE))["documents"]
+        publish_site()
+        return documents
+    if args.command == "related":
+        index_data = load_existing_index()
+        linker = RelatedAnalyses()
+        linker.sync(index_data)
+        linker.rebuild()
+        linker.save()
+        logging.info(f"Related eras recomputed for {len(linker.ids)} analyses.")
+        return build_site(index_data, linker)["pages_written"]
+    if args.command == "build":
+        return build_site(load_existing_index(), force=args.force)["pages_written"]
+    if args.command == "publish":
+        return publish_site(force=args.force)["files_changed"]
+    if args.command == "serve":
+        return serve(args)
+
+    if args.shard:
+        # A shard never touches INDEX_FILE; it only appends to its own fragment, so N
+        # workers can run at once and a single merge publishes their results.
+        shard_index, shard_count = args.shard
+        candidate_months = shard_months(shard_index, shard_count)
+        index_path = shard_fragment_path(shard_index, shard_count)
+        journal_path = args.journal or f"run_journal.shard-{shard_index}-of-{shard_count}.jsonl"
+        ledger_path = f"usage_ledger.shard-{shard_index}-of-{shard_count}.jsonl"
+        logging.info(f"Shard {shard_index}/{shard_count}: {len(candidate_months)} candidate months, writing {index_path}")
+    else:
+        candidate_months = None
+        index_path = INDEX_FILE
+        journal_path = args.journal or RUN_JOURNAL_FILE
+        ledger_path, shard_count = USAGE_LEDGER_FILE, 1
+
+    generated_analyses_index = load_existing_index(index_path)
+    journal = RunJournal(journal_path)
+    # Shards only see their own months; the merge command links their analyses into the graph.
+    init_run_state(ledger_path, shard_count, link_related=not args.shard)
+    
+    logging.info("Starting Google CSE + Google Gemini AI Time Capsule Generation run (AI News Detective Mode)...")
+
+    if not (CASSETTE and CASSETTE.replaying) and not check_gemini_model():
+        time.sleep(10)
+        return 
+
+    added = generate_analyses(journal, generated_analyses_index, args.count, candidate_months, args.max_attempts,
+                              index_path, args.pages_per_month)
 
-    save_index(generated_analyses_index)
-    logging.info(f"Finished run. Added {analyses_added_this_run} new analysis articles. Total analyses in index: {len(generated_analyses_index)}")
+    save_index(generated_analyses_index, index_path)
+    if not args.shard:
+        build_site(generated_analyses_index, RELATED_ANALYSES)
+    shutdown_extraction_pool()
+    DOMAIN_HEALTH.save()
+    logging.info(f"Finished run. Added {len(added)} new analysis articles. Total analyses in index: {len(generated_analyses_index)}")
+    log_run_report()
+    return len(added)
 
 if __name__ == "__main__":
     main()
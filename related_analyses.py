@@ -0,0 +1,260 @@
+# related_analyses.py (TF-IDF "Related Eras" Linker Between Generated Analyses)
+#
+# Every analysis is a row of a sparse term-count matrix (its body, plus the term counts of
+# the sources it was synthesized from when those are known). Similarity is the cosine of
+# sublinear TF-IDF vectors; each analysis keeps its top-k neighbours, which are rendered
+# as a "Related eras" block on its page.
+#
+# The count matrix, vocabulary and neighbour lists persist in RELATED_INDEX_DIR, so adding
+# an analysis costs one sparse row-by-matrix product instead of recomputing every pair.
+
+import io
+import os
+import json
+import html
+import logging
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+from atomic_files import write_atomic
+from search_index import tokenize, article_body_text
+
+RELATED_INDEX_DIR = "related_index"
+RELATED_TOP_K = 4
+RELATED_MIN_SCORE = 0.05 # Below this two analyses share little more than boilerplate
+BATCH_ROWS = 512 # Rows per similarity block in a full build (BATCH_ROWS x n dense scores in memory)
+MAX_DOCUMENT_FREQUENCY = 0.5 # Terms in more than this share of analyses say nothing about relatedness
+TERMS_PER_VECTOR = 120 # Only each analysis' highest-weighted terms take part in similarity
+SOURCE_TERMS_KEPT = 300 # Most frequent source terms stored with a body, a pool for TERMS_PER_VECTOR to pick from
+
+BLOCK_START = "<!-- related-eras:start -->"
+BLOCK_END = "<!-- related-eras:end -->"
+BLOCK_ANCHOR = '<div class="button-container">' # Pages written before the markers existed get the block here
+
+
+def term_counts(text, limit=SOURCE_TERMS_KEPT):
+    """The `limit` most frequent terms of `text` with their counts, as {term: count}."""
+    return dict(Counter(tokenize(text)).most_common(limit))
+
+
+def tfidf_rows(counts, document_frequency, n_docs):
+    """
+    Row-normalised sublinear TF-IDF (1 + log tf, smoothed idf) of CSR count rows, keeping only
+    the TERMS_PER_VECTOR strongest terms of each row and no near-ubiquitous terms. The pruning
+    keeps the similarity products sparse, which is what makes large corpora cheap.
+    """
+    idf = np.log((1 + n_docs) / (1 + document_frequency)) + 1
+    if n_docs >= 10:
+        idf[document_frequency > MAX_DOCUMENT_FREQUENCY * n_docs] = 0
+    weights = counts.astype(np.float32)
+    weights.data = (1 + np.log(weights.data)) * idf[weights.indices].astype(np.float32)
+    for row in range(weights.shape[0]):
+        start, end = weights.indptr[row], weights.indptr[row + 1]
+        if end - start > TERMS_PER_VECTOR:
+            row_data = weights.data[start:end]
+            row_data[np.argpartition(row_data, -TERMS_PER_VECTOR)[:-TERMS_PER_VECTOR]] = 0
+    weights.eliminate_zeros()
+    norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return (sparse.diags((1 / norms).astype(np.float32)) @ weights).tocsr()
+
+
+def top_k(scores, k, min_score):
+    """Indices and scores of the k best entries of each row of a dense score block, best first."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return [[] for _ in range(scores.shape[0])]
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    rows = []
+    for row, candidates in enumerate(best):
+        ordered = candidates[np.argsort(-scores[row, candidates])]
+        rows.append([(int(j), float(scores[row, j])) for j in ordered if scores[row, j] >= min_score])
+    return rows
+
+
+class RelatedAnalyses:
+    """Persisted TF-IDF neighbour graph over generated analyses."""
+
+    def __init__(self, state_dir=RELATED_INDEX_DIR, k=RELATED_TOP_K, min_score=RELATED_MIN_SCORE):
+        self.state_dir = state_dir
+        self.k = k
+        self.min_score = min_score
+        self.ids = []
+        self.vocabulary = {}
+        self.counts = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self.vectors = sparse.csr_matrix((0, 0), dtype=np.float32) # TF-IDF rows as of when each analysis was linked
+        self.neighbors = {} # analysis id -> [[neighbour id, score], ...], best first
+        self._load()
+
+    def _paths(self):
+        return (os.path.join(self.state_dir, "state.json"), os.path.join(self.state_dir, "counts.npz"),
+                os.path.join(self.state_dir, "vectors.npz"))
+
+    def _load(self):
+        state_path, counts_path, vectors_path = self._paths()
+        if not all(os.path.exists(path) for path in self._paths()):
+            return
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            counts = sparse.load_npz(counts_path).tocsr()
+            vectors = sparse.load_npz(vectors_path).tocsr()
+        except (OSError, ValueError) as e:
+            logging.warning(f"Unreadable related-analyses state in {self.state_dir} ({e}). Starting fresh.")
+            return
+        if not counts.shape[0] == vectors.shape[0] == len(state["ids"]):
+            logging.warning(f"Related-analyses state in {self.state_dir} is inconsistent. Starting fresh.")
+            return
+        self.ids = state["ids"]
+        self.vocabulary = {term: col for col, term in enumerate(state["vocabulary"])}
+        self.neighbors = state["neighbors"]
+        self.counts = counts
+        self.vectors = vectors
+
+    def _document_frequency(self):
+        return np.bincount(self.counts.indices, minlength=self.counts.shape[1])
+
+    def save(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        state_path, counts_path, vectors_path = self._paths()
+        vocabulary = sorted(self.vocabulary, key=self.vocabulary.get)
+        for matrix, path in ((self.counts, counts_path), (self.vectors, vectors_path)):
+            buffer = io.BytesIO()
+            sparse.save_npz(buffer, matrix, compressed=False)
+            write_atomic(path, buffer.getvalue())
+        write_atomic(state_path, json.dumps({"ids": self.ids, "vocabulary": vocabulary, "neighbors": self.neighbors}, ensure_ascii=False))
+
+    def _count_rows(self, texts):
+        """CSR term counts for new documents (text, or {term: count}), growing the vocabulary as needed."""
+        rows, cols, values = [], [], []
+        for row, text in enumerate(texts):
+            for term, count in (text if isinstance(text, dict) else Counter(tokenize(text))).items():
+                col = self.vocabulary.setdefault(term, len(self.vocabulary))
+                rows.append(row)
+                cols.append(col)
+                values.append(count)
+        return sparse.csr_matrix((np.array(values, dtype=np.int32), (rows, cols)), shape=(len(texts), len(self.vocabulary)))
+
+    def _neighbor_list(self, pairs):
+        return [[self.ids[j], round(score, 4)] for j, score in pairs]
+
+    def rebuild(self):
+        """Recomputes every neighbour list from the stored counts, in blocks of BATCH_ROWS rows."""
+        n = len(self.ids)
+        self.neighbors = {}
+        if n == 0:
+            return set()
+        self.vectors = vectors = tfidf_rows(self.counts, self._document_frequency(), n)
+        transposed = vectors.T.tocsc()
+        for start in range(0, n, BATCH_ROWS):
+            block = (vectors[start:start + BATCH_ROWS] @ transposed).toarray()
+            block[np.arange(block.shape[0]), np.arange(start, start + block.shape[0])] = -np.inf # No self-links
+            for offset, pairs in enumerate(top_k(block, self.k, self.min_score)):
+                self.neighbors[self.ids[start + offset]] = self._neighbor_list(pairs)
+        return set(self.ids)
+
+    def add(self, documents):
+        """
+        Adds [(analysis id, text or {term: count}), ...] and links them in. Only the new rows are weighted (with
+        the current idf) and multiplied against the stored vectors; existing analyses gain a new
+        neighbour when it beats their current k-th. Older vectors and scores keep the idf of
+        when they were linked until the next rebuild(). Returns the ids whose lists changed.
+        """
+        documents = [(analysis_id, text) for analysis_id, text in documents if analysis_id not in self.neighbors]
+        if not documents:
+            return set()
+        old_count = len(self.ids)
+        new_rows = self._count_rows([text for _, text in documents])
+        self.counts.resize((old_count, len(self.vocabulary)))
+        self.counts = sparse.vstack([self.counts, new_rows], format="csr")
+        self.ids.extend(analysis_id for analysis_id, _ in documents)
+        if len(documents) >= old_count:
+            # Mostly new corpus (e.g. the first sync): an exact full build costs about the same.
+            return self.rebuild()
+
+        new_vectors = tfidf_rows(new_rows, self._document_frequency(), len(self.ids))
+        self.vectors.resize((old_count, len(self.vocabulary)))
+        self.vectors = vectors = sparse.vstack([self.vectors, new_vectors], format="csr")
+        transposed = vectors.T.tocsc()
+        changed = set()
+        for start in range(old_count, len(self.ids), BATCH_ROWS):
+            scores = (vectors[start:start + BATCH_ROWS] @ transposed).toarray()
+            scores[np.arange(scores.shape[0]), np.arange(start, start + scores.shape[0])] = -np.inf # No self-links
+            for offset, pairs in enumerate(top_k(scores, self.k, self.min_score)):
+                self.neighbors[self.ids[start + offset]] = self._neighbor_list(pairs)
+                changed.add(self.ids[start + offset])
+            changed |= self._offer_to_existing(scores[:, :old_count], start)
+        return changed
+
+    def _offer_to_existing(self, scores, start):
+        """Inserts new analyses (rows of `scores`, starting at id index `start`) into older analyses' lists where they rank."""
+        changed = set()
+        if scores.shape[1] == 0:
+            return changed
+        # Score a newcomer must beat to enter each older list (min_score while a list is not full).
+        thresholds = np.array([current[-1][1] if len(current) >= self.k else self.min_score - 1e-9
+                               for current in (self.neighbors.get(analysis_id, []) for analysis_id in self.ids[:scores.shape[1]])])
+        for i, row in enumerate(scores):
+            new_id = self.ids[start + i]
+            for j in np.flatnonzero((row > thresholds) & (row >= self.min_score)):
+                existing_id = self.ids[j]
+                score = round(float(row[j]), 4)
+                current = sorted(self.neighbors.get(existing_id, []) + [[new_id, score]], key=lambda pair: -pair[1])[:self.k]
+                self.neighbors[existing_id] = current
+                thresholds[j] = current[-1][1] if len(current) >= self.k else self.min_score - 1e-9
+                changed.add(existing_id)
+        return changed
+
+    def remove(self, analysis_ids):
+        """Drops analyses (e.g. deleted from the index) and recomputes the neighbour graph."""
+        keep = [row for row, analysis_id in enumerate(self.ids) if analysis_id not in set(analysis_ids)]
+        self.counts = self.counts[keep]
+        self.vectors = self.vectors[keep]
+        self.ids = [self.ids[row] for row in keep]
+        return self.rebuild()
+
+    def sync(self, index_data, source_terms=None):
+        """
+        Brings the graph in line with the analyses index: links entries it has not seen and
+        drops entries no longer in the index. `source_terms` maps an id to the term counts of
+        its scraped sources (stored with its body record). Returns the changed ids.
+        """
+        source_terms = source_terms or {}
+        indexed_ids = {entry["id"] for entry in index_data}
+        changed = set()
+        removed = [analysis_id for analysis_id in self.ids if analysis_id not in indexed_ids]
+        if removed:
+            changed |= self.remove(removed)
+        known = set(self.ids)
+        documents = [(entry["id"], Counter(tokenize(article_body_text(entry.get("html_path", "")))) + Counter(source_terms.get(entry["id"], {})))
+                     for entry in index_data if entry["id"] not in known]
+        changed |= self.add(documents)
+        return changed & indexed_ids
+
+
+def related_block_html(neighbors, entries_by_id):
+    """The "Related eras" panel for one page; links are relative to GENERATED_ARTICLES_DIR."""
+    items = []
+    for neighbor_id, _ in neighbors:
+        entry = entries_by_id.get(neighbor_id)
+        if not entry:
+            continue
+        href = os.path.basename(entry.get("html_path", ""))
+        items.append(f'<li><a href="{html.escape(href)}">{html.escape(entry.get("title", neighbor_id))}</a></li>')
+    if not items:
+        return f"{BLOCK_START}{BLOCK_END}"
+    return (f'{BLOCK_START}\n<div class="cta-container related-eras">\n    <div class="panel-title-bar">Related Eras</div>\n'
+            f'    <div class="panel-body"><ul>{"".join(items)}</ul></div>\n</div>\n{BLOCK_END}')
+
+
+def inject_related_block(page_html, block):
+    """Replaces the page's related-eras block (or inserts one before the buttons)."""
+    start, end = page_html.find(BLOCK_START), page_html.find(BLOCK_END)
+    if start != -1 and end != -1:
+        return page_html[:start] + block + page_html[end + len(BLOCK_END):]
+    anchor = page_html.find(BLOCK_ANCHOR)
+    if anchor == -1:
+        return page_html
+    return page_html[:anchor] + block + "\n        " + page_html[anchor:]
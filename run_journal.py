@@ -0,0 +1,106 @@
+# run_journal.py (Durable Per-Attempt Stage Journal for Resumable Generation Runs)
+
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+
+from atomic_files import write_atomic
+
+# Stage transitions of one attempt, in order. "abandoned" is terminal but not a success:
+# the month produced nothing usable and may be picked again by a later run.
+STAGES = ("searched", "scraped", "packed", "generated", "rendered", "indexed")
+STAGE_ABANDONED = "abandoned"
+TERMINAL_STAGES = ("indexed", STAGE_ABANDONED)
+
+
+def attempt_id_for_month(month_date):
+    """Stable attempt id: one attempt per historical month, independent of when the run happens."""
+    return f"{month_date.year:04d}{month_date.month:02d}"
+
+
+class RunJournal:
+    """
+    Append-only JSON Lines journal of stage transitions. Each line is fsync'd before the
+    stage's side effects are relied upon, so a crashed or timed-out run can resume every
+    in-flight attempt from its last completed stage instead of redoing network/LLM work.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.attempts = {}
+        self.lock = threading.Lock() # Service workers record attempts concurrently
+        self._load()
+        self._compact()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write; everything before it is intact.
+                    logging.warning(f"Ignoring unreadable line {line_no} in {self.path}.")
+                    continue
+                self._apply(entry)
+
+    def _apply(self, entry):
+        attempt = self.attempts.setdefault(entry["attempt_id"], {"stage": None, "data": {}})
+        if entry["stage"] == STAGE_ABANDONED or entry["stage"] == STAGES[0]:
+            # A fresh search (or giving up) invalidates whatever an earlier try left behind.
+            attempt["data"] = {}
+        attempt["stage"] = entry["stage"]
+        attempt["data"].update(entry.get("data", {}))
+        attempt["updated"] = entry.get("ts")
+
+    def _compact(self):
+        """Drops the payloads of finished attempts so the journal stays small across runs."""
+        if not self.attempts or not os.path.exists(self.path):
+            return
+        lines = []
+        for attempt_id, attempt in self.attempts.items():
+            data = attempt["data"] if attempt["stage"] not in TERMINAL_STAGES else {
+                k: v for k, v in attempt["data"].items() if k in ("analysis_id", "html_path")
+            }
+            lines.append(json.dumps({"attempt_id": attempt_id, "stage": attempt["stage"],
+                                     "ts": attempt.get("updated"), "data": data}, ensure_ascii=False) + "\n")
+        write_atomic(self.path, "".join(lines))
+
+    def record(self, attempt_id, stage, **data):
+        entry = {"attempt_id": attempt_id, "stage": stage, "ts": datetime.now().isoformat(), "data": data}
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._apply(entry)
+
+    def stage(self, attempt_id):
+        return self.attempts.get(attempt_id, {}).get("stage")
+
+    def data(self, attempt_id):
+        return self.attempts.get(attempt_id, {}).get("data", {})
+
+    def reached(self, attempt_id, stage):
+        """True if the attempt has completed `stage` (and has not been abandoned since)."""
+        current = self.stage(attempt_id)
+        if current not in STAGES:
+            return False
+        return STAGES.index(current) >= STAGES.index(stage)
+
+    def resumable(self):
+        """Attempt ids that were interrupted mid-pipeline, oldest first."""
+        with self.lock:
+            pending = [(a.get("updated") or "", attempt_id) for attempt_id, a in self.attempts.items()
+                       if a["stage"] not in TERMINAL_STAGES]
+        return [attempt_id for _, attempt_id in sorted(pending)]
+
+    def completed(self):
+        with self.lock:
+            return {attempt_id for attempt_id, a in self.attempts.items() if a["stage"] == "indexed"}
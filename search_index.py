@@ -0,0 +1,218 @@
+# search_index.py (Static, Prefix-Sharded Full-Text Search Index for the AI Time Capsule)
+#
+# Layout of SEARCH_INDEX_DIR (all minified JSON, fetched on demand by ai-time-capsule.js):
+#
+#   manifest.json       doc count, tokenizer settings, prefix -> term shard file, doc block size
+#   terms-<prefix>.json {term: [doc gap, weight, doc gap, weight, ...]} for terms starting with <prefix>
+#   docs-<n>.json       title/url/snippet/date/kind of docs n*DOC_BLOCK_SIZE .. (n+1)*DOC_BLOCK_SIZE-1
+#
+# Posting lists are delta-encoded doc numbers paired with a precomputed BM25 term weight,
+# so the browser only needs the shards for the query's terms plus the doc blocks of the
+# top hits, never the whole archive.
+
+import os
+import re
+import json
+import logging
+from collections import Counter, defaultdict
+
+from lxml import html as lxml_html
+
+from atomic_files import write_if_changed
+
+SEARCH_INDEX_DIR = "search_index"
+INDEX_FORMAT_VERSION = 1
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 24 # Longer "words" are URLs, hashes and similar noise
+STOPWORDS = frozenset("""
+a an and are as at be but by for from had has have he her his i if in into is it its of on or
+our she that the their them then there these they this to was were what when which who will with
+would you your not no can could than so such also been more most other some about over only
+""".split())
+
+SHARD_TARGET_BYTES = 48 * 1024 # A shard over this size is split on the next character of its prefix
+MAX_PREFIX_LENGTH = 3
+DOC_BLOCK_SIZE = 20 # Small blocks: the top hits of a query are scattered across the archive
+SNIPPET_CHARS = 160
+
+# BM25 parameters; the length-normalised term frequency part is baked into each posting.
+BM25_K1 = 1.2
+BM25_B = 0.75
+WEIGHT_SCALE = 100 # Weights are stored as integers to keep posting lists short
+
+# Extracted body text per analysis file and term counts per document, so repeated saves
+# within one run only re-read and re-tokenize what actually changed.
+_BODY_CACHE = {}
+_TERM_COUNT_CACHE = {}
+
+
+def tokenize(text):
+    """Lowercased alphanumeric runs minus stopwords. ai-time-capsule.js mirrors this exactly."""
+    return [t for t in TOKEN_PATTERN.findall((text or "").lower())
+            if MIN_TERM_LENGTH <= len(t) <= MAX_TERM_LENGTH and t not in STOPWORDS]
+
+
+def article_body_text(html_path):
+    """Visible text of a generated analysis' content panel (not the shared page chrome)."""
+    try:
+        stat = os.stat(html_path)
+    except OSError:
+        return ""
+    cache_key = (html_path, stat.st_mtime_ns, stat.st_size)
+    if cache_key in _BODY_CACHE:
+        return _BODY_CACHE[cache_key]
+    with open(html_path, 'r', encoding='utf-8') as f:
+        markup = f.read()
+    try:
+        tree = lxml_html.fromstring(markup)
+        panels = tree.find_class("content-panel")
+        text = " ".join(panel.text_content() for panel in panels) if panels else tree.text_content()
+    except Exception as e:
+        logging.warning(f"Could not parse {html_path} for the search index: {e}")
+        text = ""
+    _BODY_CACHE[cache_key] = text
+    return text
+
+
+def collect_documents(analyses, articles):
+    """Search documents for generated analyses (title, summary, body) and scraped articles (title, summary)."""
+    documents = []
+    for entry in analyses:
+        documents.append({
+            "fields": [entry.get("title", ""), entry.get("summary", ""), article_body_text(entry.get("html_path", ""))],
+            "meta": {"t": entry.get("title", ""), "u": entry.get("html_path", ""), "s": (entry.get("summary") or "")[:SNIPPET_CHARS],
+                     "d": (entry.get("generated_date") or "")[:10], "k": "analysis"},
+        })
+    for entry in articles:
+        documents.append({
+            "fields": [entry.get("title", ""), entry.get("summary", "")],
+            "meta": {"t": entry.get("title", ""), "u": entry.get("wayback_url") or entry.get("original_url") or "",
+                     "s": (entry.get("summary") or "")[:SNIPPET_CHARS], "d": (entry.get("publish_date") or "")[:10], "k": "article"},
+        })
+    return documents
+
+
+def document_term_counts(fields):
+    cache_key = tuple(fields)
+    cached = _TERM_COUNT_CACHE.get(cache_key)
+    if cached is None:
+        tokens = []
+        for field in fields:
+            tokens.extend(tokenize(field))
+        cached = _TERM_COUNT_CACHE[cache_key] = (Counter(tokens), len(tokens))
+    return cached
+
+
+def build_postings(documents):
+    """term -> [(doc number, weight)] in doc order, with BM25's tf/length component precomputed."""
+    term_counts = [document_term_counts(doc["fields"]) for doc in documents]
+
+    average_length = (sum(length for _, length in term_counts) / len(term_counts)) if term_counts else 0
+    postings = defaultdict(list)
+    for doc_number, (counts, length) in enumerate(term_counts):
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * (length / average_length if average_length else 0))
+        for term, tf in counts.items():
+            # Rounded to the nearest integer; never below 1 since tf >= 1 gives a weight of at least ~0.5.
+            postings[term].append((doc_number, int(tf * (BM25_K1 + 1) * WEIGHT_SCALE / (tf + norm) + 0.5) or 1))
+    return postings
+
+
+def encode_postings(posting_list):
+    """Flat [gap, weight, gap, weight, ...] with doc numbers delta-encoded against the previous one."""
+    encoded, previous = [], 0
+    for doc_number, weight in posting_list:
+        encoded += (doc_number - previous, weight)
+        previous = doc_number
+    return encoded
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+def shard_terms(encoded_terms, term_sizes, prefix_length=1):
+    """
+    Groups terms by prefix, starting with one character and splitting any shard larger than
+    SHARD_TARGET_BYTES on the next character, so common prefixes get small shards of their own.
+    `term_sizes` holds each term's serialized size. Returns {prefix: {term: postings}}.
+    """
+    groups = defaultdict(dict)
+    for term, encoded in encoded_terms.items():
+        groups[term[:prefix_length]][term] = encoded
+
+    shards = {}
+    for prefix, terms in groups.items():
+        too_big = sum(term_sizes[term] for term in terms) > SHARD_TARGET_BYTES
+        # A prefix equal to a whole term (e.g. "ai") cannot be split further.
+        if too_big and prefix_length < MAX_PREFIX_LENGTH and len(prefix) == prefix_length:
+            shards.update(shard_terms(terms, term_sizes, prefix_length + 1))
+        else:
+            shards[prefix] = terms
+    return shards
+
+
+
+def build_search_index(analyses, articles=(), output_dir=SEARCH_INDEX_DIR):
+    """
+    Builds the sharded index for the given analyses and scraped articles, writes only the
+    files whose content changed and deletes shards that no longer exist. Returns build stats.
+    """
+    documents = collect_documents(analyses, articles)
+    postings = build_postings(documents)
+    # Each posting list is serialized once; shard files are assembled from these pieces
+    # (terms are [a-z0-9] only, so they need no JSON escaping).
+    encoded_terms = {term: _dumps(encode_postings(posting_list)) for term, posting_list in postings.items()}
+    term_sizes = {term: len(term) + len(encoded) + 4 for term, encoded in encoded_terms.items()}
+    shards = shard_terms(encoded_terms, term_sizes)
+
+    files = {}
+    for prefix, terms in shards.items():
+        files[f"terms-{prefix}.json"] = "{" + ",".join(f'"{term}":{terms[term]}' for term in sorted(terms)) + "}"
+    for block in range(0, len(documents), DOC_BLOCK_SIZE):
+        files[f"docs-{block // DOC_BLOCK_SIZE}.json"] = _dumps([doc["meta"] for doc in documents[block:block + DOC_BLOCK_SIZE]])
+    files["manifest.json"] = _dumps({
+        "version": INDEX_FORMAT_VERSION,
+        "doc_count": len(documents),
+        "doc_block_size": DOC_BLOCK_SIZE,
+        "min_term_length": MIN_TERM_LENGTH,
+        "max_term_length": MAX_TERM_LENGTH,
+        "stopwords": sorted(STOPWORDS),
+        "weight_scale": WEIGHT_SCALE,
+        "shards": {prefix: f"terms-{prefix}.json" for prefix in sorted(shards)},
+    })
+
+    os.makedirs(output_dir, exist_ok=True)
+    # Only changed shards are rewritten, so unchanged ones keep their mtime (and git/HTTP caches).
+    written = sum(write_if_changed(os.path.join(output_dir, name), text) for name, text in files.items())
+    stale = [name for name in os.listdir(output_dir) if name.endswith(".json") and name not in files]
+    for name in stale:
+        os.remove(os.path.join(output_dir, name))
+
+    shard_sizes = [len(files[f"terms-{prefix}.json"].encode('utf-8')) for prefix in shards]
+    stats = {
+        "documents": len(documents),
+        "terms": len(postings),
+        "shards": len(shards),
+        "max_shard_bytes": max(shard_sizes, default=0),
+        "total_bytes": sum(len(text.encode('utf-8')) for text in files.values()),
+        "files_written": written,
+        "files_removed": len(stale),
+    }
+    logging.info(f"Search index: {stats['documents']} docs, {stats['terms']} terms in {stats['shards']} shards "
+                 f"({stats['total_bytes'] // 1024} KB total, largest shard {stats['max_shard_bytes'] // 1024} KB); "
+                 f"{written} file(s) updated, {len(stale)} removed.")
+    return stats
+
+
+def load_articles(path):
+    """Scraped articles from ai_articles.json, or nothing if the scraper has not produced any."""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            logging.warning(f"Corrupt or empty {path}. Leaving scraped articles out of the search index.")
+            return []
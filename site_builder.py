@@ -0,0 +1,315 @@
+# site_builder.py (Incremental Static-Site Build: Analysis Pages, Era Archives, RSS Feed and Sitemap)
+#
+# Every output records a hash of its inputs in BUILD_STATE_FILE:
+#
+#   generated_articles/ai_analysis_<slug>.html   stored body (analysis_bodies/<id>.json), template version,
+#                                                index entry, rendered "Related eras" block
+#   generated_articles/index.html, era-<year>.html   the index entries they list, template version
+#   feed.xml, sitemap.xml                        their own content (cheap to produce, written only on change)
+#
+# A build hashes inputs, compares them with the recorded hashes and renders only what is
+# stale, spreading page renders over a process pool. A no-op build is a stat() per body
+# file plus some string hashing.
+
+import os
+import re
+import json
+import html
+import hashlib
+import inspect
+import logging
+from datetime import datetime
+from email.utils import format_datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from atomic_files import write_atomic, write_if_changed
+
+BODIES_DIR = "analysis_bodies"
+BUILD_STATE_FILE = "site_build_state.json"
+FEED_FILE = "feed.xml"
+SITEMAP_FILE = "sitemap.xml"
+# Where the Pages deploy serves the site; the workflow sets it from the repository it runs in.
+SITE_URL = os.getenv("SITE_URL", "https://minimaxa1.github.io/Wayback-Scraper/").rstrip("/") + "/"
+FEED_SIZE = 20
+HUB_LATEST = 10 # Most recent analyses listed on the archive hub page
+PARALLEL_THRESHOLD = 16 # Fewer stale pages than this render in-process; a pool costs more than it saves
+
+
+def body_path(analysis_id, bodies_dir=BODIES_DIR):
+    return os.path.join(bodies_dir, f"{analysis_id}.json")
+
+
+def write_body(analysis_id, era, generated_html, source_terms=None, bodies_dir=BODIES_DIR):
+    """
+    Stores the LLM output an analysis page is rendered from, so template changes can re-render
+    it later, with the term counts of its scraped sources for the related-eras graph (which a
+    shard merge builds on another machine). The sources' text itself is never stored.
+    """
+    record = {"id": analysis_id, "era": era, "generated_html": generated_html}
+    if source_terms:
+        record["source_terms"] = source_terms
+    write_atomic(body_path(analysis_id, bodies_dir), json.dumps(record, ensure_ascii=False, indent=2))
+
+
+def read_body(analysis_id, bodies_dir=BODIES_DIR):
+    with open(body_path(analysis_id, bodies_dir), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_source_terms(analysis_id, bodies_dir=BODIES_DIR):
+    """Scraped-source term counts stored with a body; empty for bodies stored without them (or missing)."""
+    try:
+        return read_body(analysis_id, bodies_dir).get("source_terms", {})
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def recover_body(entry):
+    """
+    Rebuilds a body record from a page rendered before bodies were stored: header title and
+    era, the index summary as the hook, and the content panel as the body. None if the page
+    does not have the expected structure.
+    """
+    html_path = entry.get("html_path", "")
+    if not os.path.exists(html_path):
+        return None
+    with open(html_path, 'r', encoding='utf-8') as f:
+        page = f.read()
+    era = re.search(r'<p>A Historical AI Insight from (.*?)</p>', page)
+    panel = re.search(r'<div class="content-panel">\s*(.*?)\s*</div>\s*(?:<!-- related-eras:start -->|<div class="cta-container">)', page, re.DOTALL)
+    if not era or not panel:
+        return None
+    generated_html = (f"<h1>{entry.get('title', '')}</h1>\n<p class=\"hook\">{entry.get('summary', '')}</p>\n"
+                      f"{panel.group(1)}")
+    return {"id": entry["id"], "era": era.group(1).strip(), "generated_html": generated_html}
+
+
+def era_year(era):
+    match = re.search(r'(\d{4})', era or "")
+    return match.group(1) if match else "unknown"
+
+
+def _sha(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8') if isinstance(part, str) else json.dumps(part, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        digest.update(b"\0")
+    return digest.hexdigest()[:20]
+
+
+def _render_page_job(job):
+    """Process-pool worker: renders one page and writes it if it changed."""
+    render_page, html_path, analysis_id, entry, related_block, bodies_dir = job
+    return html_path, write_if_changed(html_path, render_page(read_body(analysis_id, bodies_dir), entry, related_block))
+
+
+def archive_page_html(title, heading, items, links):
+    """Era archive pages, in the same dark style as the analysis pages."""
+    rows = "".join(
+        f'<li><a href="{html.escape(href)}">{html.escape(label)}</a><span>{html.escape(note)}</span></li>' for href, label, note in items
+    )
+    nav = "".join(f'<a href="{html.escape(href)}">{html.escape(label)}</a>' for href, label in links)
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>{html.escape(title)} - Architecting You</title>
+<link rel="alternate" type="application/rss+xml" title="AI Time Capsule" href="../{FEED_FILE}">
+<style>
+body{{font-family:Georgia,serif;line-height:1.7;color:#E0E0E0;background:#111;margin:0;padding:2rem}}
+main{{max-width:800px;margin:2rem auto}}
+h1{{font-family:monospace;text-transform:uppercase;letter-spacing:.2em;color:#FFF;text-align:center}}
+ul{{list-style:none;padding:0}}
+li{{display:flex;justify-content:space-between;gap:1rem;border-bottom:1px solid #333;padding:.6rem 0}}
+li span{{color:#888;white-space:nowrap}}
+a{{color:#00BFFF;text-decoration:none}}
+nav{{display:flex;flex-wrap:wrap;gap:1rem;justify-content:center;margin:2rem 0;font-family:monospace}}
+</style></head>
+<body>
+<main>
+<h1>{html.escape(heading)}</h1>
+<ul>{rows}</ul>
+<nav>{nav}</nav>
+</main>
+</body>
+</html>
+"""
+
+
+# Changes whenever archive_page_html's markup does, which makes every archive page stale.
+ARCHIVE_TEMPLATE_VERSION = hashlib.sha256(inspect.getsource(archive_page_html).encode('utf-8')).hexdigest()[:12]
+
+
+def feed_xml(entries):
+    latest = sorted(entries, key=lambda e: e.get("generated_date", ""), reverse=True)[:FEED_SIZE]
+    items = []
+    for entry in latest:
+        link = SITE_URL + entry["html_path"]
+        try:
+            published = format_datetime(datetime.fromisoformat(entry.get("generated_date", "")).astimezone())
+        except ValueError:
+            published = ""
+        items.append(f"""    <item>
+      <title>{html.escape(entry.get("title", ""))}</title>
+      <link>{html.escape(link)}</link>
+      <guid isPermaLink="false">{html.escape(entry["id"])}</guid>
+      <pubDate>{published}</pubDate>
+      <description>{html.escape(entry.get("summary", ""))}</description>
+    </item>""")
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0">
+  <channel>
+    <title>AI Time Capsule - Architecting You</title>
+    <link>{html.escape(SITE_URL)}ai-time-capsule.html</link>
+    <description>Historical AI discussions, revisited.</description>
+{chr(10).join(items)}
+  </channel>
+</rss>
+"""
+
+
+def sitemap_xml(entries, archive_paths):
+    urls = [(SITE_URL + "ai-time-capsule.html", None)]
+    urls += [(SITE_URL + path, None) for path in sorted(archive_paths)]
+    urls += [(SITE_URL + e["html_path"], (e.get("generated_date") or "")[:10] or None) for e in entries]
+    rows = "".join(f"  <url><loc>{html.escape(loc)}</loc>{f'<lastmod>{lastmod}</lastmod>' if lastmod else ''}</url>\n" for loc, lastmod in urls)
+    return f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n{rows}</urlset>\n'
+
+
+class SiteBuilder:
+    """
+    Incremental builder over the analyses index. `render_page(body, entry, related_block)`
+    must be a module-level function (it runs in worker processes); `template_version`
+    changes whenever its markup does.
+    """
+
+    def __init__(self, render_page, template_version, articles_dir="generated_articles",
+                 bodies_dir=BODIES_DIR, state_path=BUILD_STATE_FILE, feed_path=FEED_FILE, sitemap_path=SITEMAP_FILE, workers=None):
+        self.render_page = render_page
+        self.template_version = template_version
+        self.articles_dir = articles_dir
+        self.bodies_dir = bodies_dir
+        self.state_path = state_path
+        self.feed_path = feed_path
+        self.sitemap_path = sitemap_path
+        self.workers = workers or os.cpu_count() or 1
+        self.state = self._load()
+
+    def _load(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                try:
+                    return json.load(f)
+                except json.JSONDecodeError:
+                    logging.warning(f"Corrupt or empty {self.state_path}. Rebuilding everything.")
+        return {"bodies": {}, "outputs": {}}
+
+    def _save(self):
+        write_atomic(self.state_path, json.dumps(self.state, sort_keys=True))
+
+    def _body_info(self, analysis_id):
+        """(content hash, era) of a stored body, re-read only when its size or mtime changed; None if missing."""
+        path = body_path(analysis_id, self.bodies_dir)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        cached = self.state["bodies"].get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2], cached[3]
+        with open(path, 'rb') as f:
+            raw = f.read()
+        digest, era = hashlib.sha256(raw).hexdigest()[:20], json.loads(raw).get("era", "")
+        self.state["bodies"][path] = [stat.st_mtime_ns, stat.st_size, digest, era]
+        return digest, era
+
+    def _is_stale(self, output_path, input_hash):
+        return self.state["outputs"].get(output_path) != input_hash or not os.path.exists(output_path)
+
+    def ensure_bodies(self, entries):
+        """Recovers body records for pages rendered before bodies were stored. Returns how many were recovered."""
+        recovered = 0
+        for entry in entries:
+            if os.path.exists(body_path(entry["id"], self.bodies_dir)):
+                continue
+            body = recover_body(entry)
+            if body is None:
+                logging.warning(f"No stored body for {entry['id']} and its page could not be parsed; leaving the page as is.")
+                continue
+            write_body(entry["id"], body["era"], body["generated_html"], bodies_dir=self.bodies_dir)
+            recovered += 1
+        return recovered
+
+    def build(self, entries, related_blocks=None, force=False):
+        """
+        Renders stale analysis pages (in parallel), era archives, feed and sitemap.
+        `related_blocks` maps analysis id -> "Related eras" block HTML. Returns build stats.
+        """
+        related_blocks = related_blocks or {}
+        if force:
+            self.state["outputs"] = {}
+        stats = {"pages": 0, "pages_stale": 0, "pages_written": 0, "archives_written": 0, "feed_written": False, "sitemap_written": False}
+
+        jobs, pending_hashes, eras = [], {}, {}
+        for entry in entries:
+            body_info = self._body_info(entry["id"])
+            if body_info is None:
+                continue
+            body_hash, eras[entry["id"]] = body_info
+            stats["pages"] += 1
+            block = related_blocks.get(entry["id"], "")
+            input_hash = _sha(body_hash, self.template_version, entry, block)
+            if self._is_stale(entry["html_path"], input_hash):
+                jobs.append((self.render_page, entry["html_path"], entry["id"], entry, block, self.bodies_dir))
+                pending_hashes[entry["html_path"]] = input_hash
+        stats["pages_stale"] = len(jobs)
+
+        if len(jobs) >= PARALLEL_THRESHOLD and self.workers > 1:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(_render_page_job, jobs, chunksize=max(1, len(jobs) // (self.workers * 4))))
+        else:
+            results = [_render_page_job(job) for job in jobs]
+        for html_path, written in results:
+            stats["pages_written"] += written
+            self.state["outputs"][html_path] = pending_hashes[html_path]
+
+        archive_paths = self._build_archives([e for e in entries if e["id"] in eras], eras, stats)
+        stats["feed_written"] = write_if_changed(self.feed_path, feed_xml(entries))
+        stats["sitemap_written"] = write_if_changed(self.sitemap_path, sitemap_xml(entries, archive_paths))
+        self._save()
+        logging.info(f"Site build: {stats['pages_stale']} of {stats['pages']} pages stale, {stats['pages_written']} written; "
+                     f"{stats['archives_written']} archive page(s) written; feed {'updated' if stats['feed_written'] else 'unchanged'}, "
+                     f"sitemap {'updated' if stats['sitemap_written'] else 'unchanged'}.")
+        return stats
+
+    def _build_archives(self, entries, eras, stats):
+        """One page per era year plus a hub page; each is re-rendered only when the entries it lists change."""
+        by_year = {}
+        for entry in entries:
+            by_year.setdefault(era_year(eras[entry["id"]]), []).append(entry)
+
+        def month_key(entry):
+            try:
+                return datetime.strptime(eras[entry["id"]], "%B %Y")
+            except ValueError:
+                return datetime.min
+
+        outputs = {}
+        years = sorted(by_year)
+        for year in years:
+            listed = sorted(by_year[year], key=month_key)
+            items = [(os.path.basename(e["html_path"]), e.get("title", ""), eras[e["id"]]) for e in listed]
+            outputs[os.path.join(self.articles_dir, f"era-{year}.html")] = (f"AI Time Capsule: {year}", f"The AI Time Capsule: {year}", items)
+        latest = sorted(entries, key=lambda e: e.get("generated_date", ""), reverse=True)[:HUB_LATEST]
+        hub_items = [(f"era-{year}.html", f"Analyses from {year}", f"{len(by_year[year])} analyses") for year in years]
+        hub_items += [(os.path.basename(e["html_path"]), e.get("title", ""), "Latest") for e in latest]
+        outputs[os.path.join(self.articles_dir, "index.html")] = ("AI Time Capsule Archive", "The AI Time Capsule Archive", hub_items)
+
+        links = [("../index.html", "Home"), ("../ai-time-capsule.html", "AI Time Capsule"), ("index.html", "Archive"), (f"../{FEED_FILE}", "RSS")]
+        for path, (title, heading, items) in outputs.items():
+            input_hash = _sha(ARCHIVE_TEMPLATE_VERSION, title, items, links)
+            if self._is_stale(path, input_hash):
+                stats["archives_written"] += write_if_changed(path, archive_page_html(title, heading, items, links))
+                self.state["outputs"][path] = input_hash
+        return [path.replace("\\", "/") for path in outputs]
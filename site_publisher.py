@@ -0,0 +1,263 @@
+# site_publisher.py (Publish Stage: Minified, Fingerprinted and Precompressed Site Output)
+#
+# Mirrors the served site into PUBLISH_DIR:
+#
+#   ai_articles.json, ai_analyses_index.json,     minified, renamed to <name>.<content hash>.<ext> so they can be
+#   search_index/*.json                           cached forever; the search manifest is rewritten to point at the
+#                                                 fingerprinted shards and doc blocks
+#   generated_articles/*.html, ai-time-capsule.*, minified (HTML) but keep their names: other pages, the feed and
+#   feed.xml, sitemap.xml                         the sitemap link to them
+#   images/                                       copied as is
+#
+# Every text output also gets .gz and .br siblings for servers that serve precompressed files
+# (nginx gzip_static/brotli_static, most CDNs). ASSET_MANIFEST maps the logical names the
+# front end asks for to their current fingerprinted files; it is the only JSON file that
+# must be revalidated on every visit.
+#
+# Sources are re-processed only when their content hash changed, over a process pool; size
+# and mtime only decide whether a source has to be re-read to hash it.
+# Fingerprinted files of the previous publish are kept one more round so a browser holding
+# the old manifest can still finish loading.
+
+import os
+import re
+import glob
+import gzip
+import json
+import hashlib
+import inspect
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from atomic_files import TEMP_PREFIX, write_atomic, write_if_changed
+
+try:
+    import brotli
+except ImportError: # .br siblings are skipped without it
+    brotli = None
+
+PUBLISH_DIR = "public"
+PUBLISH_STATE_FILE = "publish_state.json"
+ASSET_MANIFEST = "asset-manifest.json"
+SEARCH_MANIFEST = "search_index/manifest.json"
+PUBLISH_SOURCES = [ # (glob, fingerprinted)
+    ("ai-time-capsule.html", False),
+    ("ai-time-capsule.js", False),
+    ("feed.xml", False),
+    ("sitemap.xml", False),
+    ("generated_articles/*.html", False),
+    ("images/**/*", False),
+    ("ai_articles.json", True),
+    ("ai_analyses_index.json", True),
+    ("search_index/terms-*.json", True),
+    ("search_index/docs-*.json", True),
+]
+ENTRY_POINTS = ["ai_articles.json", "ai_analyses_index.json", SEARCH_MANIFEST] # Listed in ASSET_MANIFEST
+MANIFEST_PAGES = ["ai-time-capsule.html"] # Published copies point their script at ASSET_MANIFEST (data-asset-manifest)
+COMPRESSIBLE_EXTENSIONS = {".html", ".json", ".js", ".css", ".xml", ".txt", ".svg"}
+MIN_COMPRESS_BYTES = 256 # Below this a compressed sibling saves less than the response headers cost
+FINGERPRINT_CHARS = 10
+BROTLI_QUALITY = 11 # Densest setting, ~25 ms per page; affordable because only changed files are compressed
+PARALLEL_THRESHOLD = 16 # Fewer changed files than this are processed in-process
+
+_PRESERVE_RE = re.compile(r'<(pre|textarea|script)\b.*?</\1\s*>', re.DOTALL | re.IGNORECASE)
+_COMMENT_RE = re.compile(r'<!--(?!\[if).*?-->', re.DOTALL)
+
+
+def _collapse_whitespace(fragment):
+    fragment = _COMMENT_RE.sub("", fragment)
+    fragment = re.sub(r'[ \t\r\f\v]*\n\s*', '\n', fragment) # Indentation and blank lines
+    return re.sub(r'[ \t\r\f\v]{2,}', ' ', fragment)
+
+
+def minify_html(text):
+    """
+    Drops comments, indentation and blank lines and collapses runs of spaces. A whitespace
+    run still leaves one character behind, so inline spacing renders exactly as before;
+    <pre>, <textarea> and <script> contents are left untouched.
+    """
+    parts, pos = [], 0
+    for match in _PRESERVE_RE.finditer(text):
+        parts.append(_collapse_whitespace(text[pos:match.start()]))
+        parts.append(match.group(0))
+        pos = match.end()
+    parts.append(_collapse_whitespace(text[pos:]))
+    return "".join(parts).strip() + "\n"
+
+
+def minify_json(text):
+    return json.dumps(json.loads(text), ensure_ascii=False, separators=(',', ':'))
+
+
+def announce_asset_manifest(text):
+    """Marks a published page as having ASSET_MANIFEST next to it; the unpublished page never asks for one."""
+    return re.sub(r'<html\b', f'<html data-asset-manifest="{ASSET_MANIFEST}"', text, count=1, flags=re.IGNORECASE)
+
+
+def fingerprinted_name(name, data):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:FINGERPRINT_CHARS]}{ext}"
+
+
+def _publish_job(job):
+    """
+    Process-pool worker: minifies, fingerprints and compresses one source.
+    `text` overrides the file content (used for the rewritten search manifest).
+    """
+    source, publish_dir, fingerprint, text = job
+    if text is None:
+        with open(source, 'rb') as f:
+            data = f.read()
+    else:
+        data = text.encode('utf-8')
+    raw_bytes = len(data)
+    ext = os.path.splitext(source)[1].lower()
+    if ext == ".json":
+        data = minify_json(data.decode('utf-8')).encode('utf-8')
+    elif ext == ".html":
+        text = minify_html(data.decode('utf-8'))
+        data = (announce_asset_manifest(text) if source.replace("\\", "/") in MANIFEST_PAGES else text).encode('utf-8')
+
+    name = source.replace("\\", "/")
+    if fingerprint:
+        name = fingerprinted_name(name, data)
+    outputs = {name: data}
+    sizes = {"raw": raw_bytes, "minified": len(data), "gzip": len(data), "brotli": len(data)}
+    if ext in COMPRESSIBLE_EXTENSIONS and len(data) >= MIN_COMPRESS_BYTES:
+        gzipped = gzip.compress(data, compresslevel=9, mtime=0) # mtime=0 keeps the bytes reproducible
+        if len(gzipped) < len(data):
+            outputs[f"{name}.gz"] = gzipped
+            sizes["gzip"] = sizes["brotli"] = len(gzipped)
+        if brotli is not None:
+            compressed = brotli.compress(data, quality=BROTLI_QUALITY)
+            if len(compressed) < sizes["gzip"]:
+                outputs[f"{name}.br"] = compressed
+                sizes["brotli"] = len(compressed)
+
+    written = sum(write_if_changed(os.path.join(publish_dir, path), payload) for path, payload in outputs.items())
+    return source, {"name": name, "outputs": sorted(outputs), "sizes": sizes, "written": written}
+
+
+# Changes whenever the minifiers, the output rules or the compressors available do, which makes every output stale.
+PUBLISH_VERSION = hashlib.sha256((inspect.getsource(_collapse_whitespace) + inspect.getsource(minify_html) + inspect.getsource(minify_json) +
+                                  inspect.getsource(announce_asset_manifest) + inspect.getsource(_publish_job) + str(brotli is not None)).encode('utf-8')).hexdigest()[:12]
+
+
+def _load_state(state_path):
+    if os.path.exists(state_path):
+        with open(state_path, 'r', encoding='utf-8') as f:
+            try:
+                state = json.load(f)
+            except json.JSONDecodeError:
+                logging.warning(f"Corrupt or empty {state_path}. Republishing everything.")
+                state = {}
+        if state.get("version") == PUBLISH_VERSION:
+            return state
+        return {"version": PUBLISH_VERSION, "sources": {}, "live": state.get("live", [])} # Still served to old manifests
+    return {"version": PUBLISH_VERSION, "sources": {}, "live": []}
+
+
+def _content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:20]
+
+
+def _source_hash(source, record):
+    """
+    Content hash of a source, re-read only when its size or mtime changed since `record`.
+    Freshness is decided on content, so a fresh checkout (new mtimes, same bytes) republishes nothing.
+    """
+    stat = os.stat(source)
+    stat_key = [stat.st_mtime_ns, stat.st_size]
+    if record is not None and record.get("stat") == stat_key and "hash" in record:
+        return stat_key, record["hash"]
+    with open(source, 'rb') as f:
+        return stat_key, _content_hash(f.read())
+
+
+def _is_fresh(record, content_hash, publish_dir):
+    return (record is not None and record.get("hash") == content_hash and
+            all(os.path.exists(os.path.join(publish_dir, path)) for path in record["outputs"]))
+
+
+def publish_site(publish_dir=PUBLISH_DIR, state_path=PUBLISH_STATE_FILE, sources=PUBLISH_SOURCES, force=False, workers=None):
+    """
+    Publishes changed sources into `publish_dir`, rewrites the search manifest and ASSET_MANIFEST,
+    removes outputs two publishes old, and logs the transfer bytes saved. Returns publish stats.
+    """
+    state = _load_state(state_path)
+    if force:
+        state["sources"] = {}
+    workers = workers or os.cpu_count() or 1
+    records, jobs = {}, []
+    for pattern, fingerprint in sources:
+        for source in sorted(glob.glob(pattern, recursive=True)):
+            if not os.path.isfile(source) or os.path.basename(source).startswith(TEMP_PREFIX):
+                continue
+            record = state["sources"].get(source)
+            stat_key, content_hash = _source_hash(source, record)
+            if _is_fresh(record, content_hash, publish_dir):
+                records[source] = dict(record, stat=stat_key, written=0)
+            else:
+                jobs.append((source, publish_dir, fingerprint, None))
+                records[source] = {"stat": stat_key, "hash": content_hash}
+
+    if len(jobs) >= PARALLEL_THRESHOLD and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_publish_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    else:
+        results = [_publish_job(job) for job in jobs]
+    for source, result in results:
+        records[source].update(result)
+    changed = len(jobs)
+
+    # The search manifest names its shards and doc blocks, so it is rewritten to their
+    # fingerprinted names (and fingerprinted itself) once those are known.
+    if os.path.exists(SEARCH_MANIFEST):
+        with open(SEARCH_MANIFEST, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        published_name = {os.path.basename(source): os.path.basename(record["name"])
+                          for source, record in records.items() if source.replace("\\", "/").startswith("search_index/")}
+        manifest["shards"] = {prefix: published_name.get(name, name) for prefix, name in manifest["shards"].items()}
+        manifest["docs"] = [published_name.get(f"docs-{block}.json", f"docs-{block}.json")
+                            for block in range(-(-manifest["doc_count"] // manifest["doc_block_size"]))]
+        text = json.dumps(manifest, sort_keys=True)
+        text_hash = _content_hash(text.encode('utf-8'))
+        record = state["sources"].get(SEARCH_MANIFEST)
+        if _is_fresh(record, text_hash, publish_dir):
+            records[SEARCH_MANIFEST] = dict(record, written=0)
+        else:
+            _, result = _publish_job((SEARCH_MANIFEST, publish_dir, True, text))
+            records[SEARCH_MANIFEST] = dict(result, hash=text_hash)
+            changed += 1
+
+    asset_manifest = {name: records[name]["name"] for name in ENTRY_POINTS if name in records}
+    manifest_written = write_if_changed(os.path.join(publish_dir, ASSET_MANIFEST),
+                                        json.dumps(asset_manifest, indent=2, sort_keys=True).encode('utf-8'))
+
+    live = sorted({path for record in records.values() for path in record["outputs"]} | {ASSET_MANIFEST})
+    keep = set(live) | set(state.get("live", []))
+    removed = 0
+    for root, _, files in os.walk(publish_dir):
+        for filename in files:
+            path = os.path.relpath(os.path.join(root, filename), publish_dir).replace("\\", "/")
+            if path not in keep:
+                os.remove(os.path.join(root, filename))
+                removed += 1
+
+    stats = {"files": len(records), "files_changed": changed, "outputs_written": sum(r["written"] for r in records.values()) + manifest_written,
+             "outputs_removed": removed}
+    text_records = [r for source, r in records.items() if os.path.splitext(source)[1].lower() in COMPRESSIBLE_EXTENSIONS]
+    for size in ("raw", "minified", "gzip", "brotli"):
+        stats[f"{size}_bytes"] = sum(r["sizes"][size] for r in text_records) # Images are already compressed
+    stats["saved_bytes"] = stats["raw_bytes"] - stats["brotli_bytes"]
+
+    state["sources"] = {source: {k: v for k, v in record.items() if k != "written"} for source, record in records.items()}
+    state["live"] = live
+    write_atomic(state_path, json.dumps(state, sort_keys=True))
+
+    raw = stats["raw_bytes"] or 1
+    logging.info(f"Publish: {stats['files_changed']} of {stats['files']} file(s) changed, {stats['outputs_written']} output(s) written, "
+                 f"{stats['outputs_removed']} removed. Transfer size {stats['raw_bytes']:,} -> {stats['minified_bytes']:,} minified, "
+                 f"{stats['gzip_bytes']:,} gzip, {stats['brotli_bytes']:,} brotli bytes "
+                 f"(saved {stats['saved_bytes']:,}, {100 * stats['saved_bytes'] / raw:.0f}%).")
+    return stats
@@ -0,0 +1,8 @@
+# tests/conftest.py (Puts the Repository Root on sys.path for the Unit Tests)
+
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
@@ -0,0 +1,34 @@
+# tests/test_date_resolver.py (Date Prefilter: What Search Results Are Dropped Before Fetching)
+
+from date_resolver import DateResolver, CONFIDENCE_HIGH, CONFIDENCE_MEDIUM, CONFIDENCE_NONE
+
+
+def resolver(tmp_path):
+    return DateResolver(str(tmp_path / "url_date_cache.json"), (1990, 2015))
+
+
+def test_filter_drops_confidently_out_of_range_results(tmp_path):
+    results = [
+        {"link": "https://aaai.org/papers/expert-systems.html", "pagemap_dates": {"citation_publication_date": "1987/05/01"}},
+        {"link": "https://www.wired.com/2019/03/deep-learning-wins/"},
+        {"link": "https://www.wired.com/1997/05/deep-blue/"},
+        {"link": "https://ieee.org/papers/neural-nets.html", "pagemap_dates": {"dc.date": "2003-06-10"}},
+        {"link": "https://mit.edu/ai/undated-report.html"},
+    ]
+    kept = resolver(tmp_path).filter_candidates(results)
+    assert [r["link"] for r in kept] == [
+        "https://www.wired.com/1997/05/deep-blue/",
+        "https://ieee.org/papers/neural-nets.html",
+        "https://mit.edu/ai/undated-report.html",
+    ]
+
+
+def test_resolutions_are_cached_and_never_fetched(tmp_path):
+    first = resolver(tmp_path)
+    assert first.resolve({"link": "https://mit.edu/ai/undated-report.html"})["confidence"] == CONFIDENCE_NONE
+    assert first.resolve({"link": "https://www.wired.com/1997/05/deep-blue/"})["confidence"] == CONFIDENCE_MEDIUM
+    assert first.resolve({"link": "https://x.org/a", "pagemap_dates": {"datepublished": "2001"}})["confidence"] == CONFIDENCE_HIGH
+    first.save()
+
+    second = resolver(tmp_path)
+    assert second.cache == first.cache
@@ -0,0 +1,66 @@
+# tests/test_domain_health.py (Domain Health: What Counts Against a Domain and How Latency Is Sampled)
+
+import pytest
+import requests
+
+import generate_ai_analysis as gaa
+from cassette import Cassette, MODE_RECORD, MODE_REPLAY
+from domain_health import (DomainHealth, MIN_SAMPLES, OUTCOME_ERROR, OUTCOME_OK, OUTCOME_PARSE_FAILURE,
+                           OUTCOME_REJECTED, OUTCOME_TIMEOUT)
+
+STUB_PAGE = "<html><head><title>Sign in</title></head><body><p>Subscribe to read this article.</p></body></html>"
+
+
+@pytest.fixture
+def health(tmp_path, monkeypatch):
+    tracker = DomainHealth(str(tmp_path / "domain_health.json"), default_timeout=25)
+    monkeypatch.setattr(gaa, "DOMAIN_HEALTH", tracker)
+    return tracker
+
+
+def test_stub_pages_open_the_breaker(health, tmp_path, monkeypatch):
+    root = str(tmp_path / "cassette")
+    urls = [f"https://www.sciencedirect.com/science/article/pii/{n}" for n in range(MIN_SAMPLES)]
+    recorder = Cassette(root, MODE_RECORD)
+    for url in urls:
+        recorder.put_document(url, "text/html; charset=utf-8", STUB_PAGE.encode('utf-8'))
+    monkeypatch.setattr(gaa, "CASSETTE", Cassette(root, MODE_REPLAY))
+
+    for url in urls:
+        assert gaa.scrape_full_article_text(url) is None
+    assert health.domains["sciencedirect.com"]["outcomes"][-1] == OUTCOME_PARSE_FAILURE
+    assert health.is_open(urls[0])
+
+
+def test_timeouts_feed_the_latency_samples(health, monkeypatch):
+    def time_out(url):
+        raise requests.exceptions.Timeout("read timed out")
+
+    monkeypatch.setattr(gaa, "CASSETTE", None)
+    monkeypatch.setattr(gaa, "fetch_document", time_out)
+    assert gaa.scrape_full_article_text("https://slow.example.org/paper.html") is None
+    entry = health.domains["slow.example.org"]
+    assert entry["outcomes"] == [OUTCOME_TIMEOUT]
+    assert len(entry["latencies"]) == 1
+
+
+def test_breaker_opens_after_min_samples_of_failures(tmp_path):
+    tracker = DomainHealth(str(tmp_path / "domain_health.json"), default_timeout=25)
+    url = "https://onlinelibrary.wiley.com/doi/10.1002/aaai.1"
+    for _ in range(MIN_SAMPLES - 1):
+        tracker.record(url, OUTCOME_ERROR)
+    assert not tracker.is_open(url) # Too few samples to judge
+    tracker.record(url, OUTCOME_ERROR)
+    assert tracker.is_open(url)
+    assert tracker.is_open("https://www.onlinelibrary.wiley.com/doi/other") # www. and paths share the breaker
+
+    tracker.save()
+    assert DomainHealth(str(tmp_path / "domain_health.json"), default_timeout=25).is_open(url)
+
+
+def test_breaker_stays_closed_while_most_fetches_succeed(tmp_path):
+    tracker = DomainHealth(str(tmp_path / "domain_health.json"), default_timeout=25)
+    url = "https://aaai.org/papers/1.html"
+    for outcome in [OUTCOME_ERROR, OUTCOME_OK, OUTCOME_REJECTED] * 4:
+        tracker.record(url, outcome)
+    assert not tracker.is_open(url)
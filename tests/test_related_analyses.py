@@ -0,0 +1,27 @@
+# tests/test_related_analyses.py (Related Eras: Linking on Stored Source Term Counts)
+
+from related_analyses import RelatedAnalyses, term_counts
+from site_builder import write_body, read_body, read_source_terms
+
+SOURCES = {
+    "analysis_a": "Expert systems encode rules from knowledge engineers; inference engines chain the rules.",
+    "analysis_b": "Knowledge engineers wrote rules for expert systems and their inference engines.",
+    "analysis_c": "Backpropagation trains multilayer perceptrons on handwritten digit images.",
+}
+
+
+def test_bodies_store_term_counts_not_source_text(tmp_path):
+    terms = term_counts(SOURCES["analysis_a"], limit=3)
+    write_body("analysis_a", "May 1988", "<h1>AI</h1>", terms, bodies_dir=str(tmp_path))
+    body = read_body("analysis_a", str(tmp_path))
+    assert body["source_terms"] == terms and len(terms) == 3
+    assert SOURCES["analysis_a"] not in str(body)
+    assert read_source_terms("analysis_missing", str(tmp_path)) == {}
+
+
+def test_sync_links_on_source_terms(tmp_path):
+    index = [{"id": analysis_id, "html_path": str(tmp_path / f"{analysis_id}.html")} for analysis_id in SOURCES]
+    linker = RelatedAnalyses(str(tmp_path / "related_index"), k=1)
+    linker.sync(index, {analysis_id: term_counts(text) for analysis_id, text in SOURCES.items()})
+    assert linker.neighbors["analysis_a"][0][0] == "analysis_b"
+    assert linker.neighbors["analysis_b"][0][0] == "analysis_a"
@@ -0,0 +1,64 @@
+# tests/test_run_journal.py (Run Journal: Interrupted Attempts Resume Without Redoing Completed Stages)
+
+import os
+from datetime import datetime
+
+import pytest
+
+import generate_ai_analysis as gaa
+from run_journal import RunJournal, attempt_id_for_month, STAGE_ABANDONED
+
+MONTH = datetime(1997, 5, 1)
+ARTICLES = [{"title": "Deep Blue beats Kasparov", "text": "Chess machine intelligence. " * 40,
+             "url": "https://www.wired.com/1997/05/deep-blue/", "publish_date": "1997-05-11", "source": "https://www.wired.com"}]
+GENERATED = '<h1>AI in the Era of May 1997</h1>\n<p class="hook">A machine won at chess.</p>\n<h3>Search</h3><p>Brute force.</p>'
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    os.makedirs(tmp_path / gaa.GENERATED_ARTICLES_DIR)
+    monkeypatch.chdir(tmp_path)
+    for name in ("CASSETTE", "DATE_RESOLVER", "DOMAIN_HEALTH", "USAGE_LEDGER", "RELATED_ANALYSES"):
+        monkeypatch.setattr(gaa, name, None)
+    monkeypatch.setattr(gaa, "pause", lambda seconds: None)
+    return tmp_path
+
+
+def fail_if_called(stage):
+    def fail(*args, **kwargs):
+        raise AssertionError(f"{stage} ran again on resume")
+    return fail
+
+
+def test_resume_skips_completed_stages(workdir, monkeypatch):
+    attempt_id = attempt_id_for_month(MONTH)
+    journal = RunJournal("run_journal.jsonl")
+    journal.record(attempt_id, "searched", cse_pages=[[{"link": ARTICLES[0]["url"]}]], cse_exhausted=True)
+    journal.record(attempt_id, "scraped", scraped_articles=ARTICLES)
+    journal.record(attempt_id, "packed", prompt="prompt")
+    journal.record(attempt_id, "generated", generated_html=GENERATED)
+
+    resumed = RunJournal("run_journal.jsonl") # As the next run loads it
+    assert resumed.resumable() == [attempt_id]
+    monkeypatch.setattr(gaa, "search_and_scrape", fail_if_called("search"))
+    monkeypatch.setattr(gaa, "build_synthesis_prompt", fail_if_called("packing"))
+    monkeypatch.setattr(gaa, "generate_from_prompt", fail_if_called("generation"))
+
+    index = []
+    entry = gaa.run_attempt(resumed, MONTH, index, index_path="index.json")
+    assert entry and index == [entry]
+    assert os.path.exists(entry["html_path"])
+    assert resumed.reached(attempt_id, "indexed")
+    assert resumed.resumable() == [] and attempt_id in resumed.completed()
+
+
+def test_abandoned_attempts_start_over(workdir):
+    attempt_id = attempt_id_for_month(MONTH)
+    journal = RunJournal("run_journal.jsonl")
+    journal.record(attempt_id, "scraped", scraped_articles=ARTICLES)
+    journal.record(attempt_id, STAGE_ABANDONED, reason="nothing_scraped")
+
+    reloaded = RunJournal("run_journal.jsonl")
+    assert reloaded.resumable() == [] and attempt_id not in reloaded.completed()
+    assert not reloaded.reached(attempt_id, "searched")
+    assert "scraped_articles" not in reloaded.data(attempt_id)
@@ -0,0 +1,88 @@
+# tests/test_sharding.py (Shard Partition and Merge Against a Single Run, Over a Replayed Cassette)
+
+import os
+import json
+import random
+import shutil
+import sys
+from datetime import datetime
+
+import pytest
+
+import generate_ai_analysis as gaa
+from cassette import Cassette, MODE_REPLAY
+from run_journal import RunJournal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from bench_pipeline import build_synthetic_cassette # noqa: E402
+
+YEAR = 2000
+SHARDS = 3
+VOLATILE_FIELDS = ("generated_date", "featured_image") # Run time and a random header image
+
+
+@pytest.fixture
+def replay(tmp_path, monkeypatch):
+    monkeypatch.setattr(gaa, "PAST_YEAR_RANGE", (YEAR, YEAR))
+    monkeypatch.setattr(gaa, "MAX_SEARCH_ATTEMPTS_PER_RUN", 200)
+    # Candidate order is a random draw and which candidates fill an attempt depends on fetch
+    # timing; pin both so the single run and the shards scrape the same articles per month.
+    monkeypatch.setattr(gaa.random, "shuffle", lambda items: None)
+    monkeypatch.setattr(gaa, "SCRAPE_WORKERS", 1)
+    root = str(tmp_path / "cassette")
+    build_synthetic_cassette(root, gaa)
+    monkeypatch.setattr(gaa, "CASSETTE", Cassette(root, MODE_REPLAY))
+    for name in ("DATE_RESOLVER", "DOMAIN_HEALTH", "USAGE_LEDGER", "RELATED_ANALYSES"):
+        monkeypatch.setattr(gaa, name, None)
+    cwd = os.getcwd()
+    yield tmp_path
+    os.chdir(cwd)
+
+
+def generate(workdir, months, index_path, link_related):
+    os.makedirs(workdir / gaa.GENERATED_ARTICLES_DIR)
+    os.chdir(workdir)
+    random.seed(1234)
+    gaa.init_run_state(link_related=link_related)
+    index = gaa.load_existing_index(index_path)
+    added = gaa.generate_analyses(RunJournal("run_journal.jsonl"), index, len(months), months, index_path=index_path)
+    gaa.save_index(index, index_path)
+    return added
+
+
+def published(workdir):
+    with open(workdir / gaa.INDEX_FILE, 'r', encoding='utf-8') as f:
+        entries = [{k: v for k, v in entry.items() if k not in VOLATILE_FIELDS} for entry in json.load(f)]
+    bodies = {}
+    for name in os.listdir(workdir / "analysis_bodies"):
+        with open(workdir / "analysis_bodies" / name, 'r', encoding='utf-8') as f:
+            bodies[name] = json.load(f)
+    return sorted(entries, key=lambda entry: entry["id"]), bodies
+
+
+def test_shards_partition_the_months():
+    shards = [gaa.shard_months(i, SHARDS, YEAR, YEAR + 1) for i in range(1, SHARDS + 1)]
+    months = [month for shard in shards for month in shard]
+    assert len(months) == len(set(months)) == 24
+    assert set(months) == {datetime(year, month, 1) for year in (YEAR, YEAR + 1) for month in range(1, 13)}
+
+
+def test_sharded_runs_merge_to_the_single_run_output(replay):
+    months = gaa.shard_months(1, 1, YEAR, YEAR)
+    single = generate(replay / "single", months, gaa.INDEX_FILE, link_related=True)
+    assert single
+
+    merge_dir = replay / "merged"
+    for i in range(1, SHARDS + 1):
+        shard_dir = replay / f"shard-{i}"
+        generate(shard_dir, gaa.shard_months(i, SHARDS, YEAR, YEAR), gaa.shard_fragment_path(i, SHARDS), link_related=False)
+        # What the workflow's shard artifact carries to the merge job
+        for name in (gaa.GENERATED_ARTICLES_DIR, "analysis_bodies", gaa.INDEX_FRAGMENTS_DIR):
+            if os.path.isdir(shard_dir / name):
+                shutil.copytree(shard_dir / name, merge_dir / name, dirs_exist_ok=True)
+    os.chdir(merge_dir)
+    merged = gaa.merge_index_fragments()
+
+    assert len(merged) == len(single)
+    assert published(merge_dir) == published(replay / "single")
+    assert gaa.merge_index_fragments() == [] # Merging again adds nothing
@@ -0,0 +1,58 @@
+# tests/test_site_builder.py (SiteBuilder: Body Recovery and Rebuilds with a Non-Default Bodies Directory)
+
+import os
+
+from site_builder import SiteBuilder, body_path, read_body, write_body
+
+LEGACY_PAGE = """<html><body>
+<header><h1>AI in the Era of March 1994</h1><p>A Historical AI Insight from March 1994</p></header>
+<div class="content-panel">
+<h3>Expert systems</h3><p>Rules everywhere.</p>
+</div>
+<div class="cta-container"></div>
+</body></html>
+"""
+
+
+def render_page(body, entry, related_block=None):
+    return f"<html><body>{body['generated_html']}{related_block or ''}</body></html>\n"
+
+
+def make_builder(tmp_path, template_version="v1"):
+    return SiteBuilder(render_page, template_version, articles_dir=str(tmp_path / "generated_articles"),
+                       bodies_dir=str(tmp_path / "bodies"), state_path=str(tmp_path / "state.json"),
+                       feed_path=str(tmp_path / "feed.xml"), sitemap_path=str(tmp_path / "sitemap.xml"), workers=1)
+
+
+def legacy_entry(tmp_path):
+    html_path = tmp_path / "generated_articles" / "ai_analysis_legacy.html"
+    html_path.parent.mkdir(parents=True, exist_ok=True)
+    html_path.write_text(LEGACY_PAGE, encoding='utf-8')
+    return {"id": "analysis_legacy", "title": "AI in the Era of March 1994", "summary": "What 1994 expected.",
+            "html_path": str(html_path), "generated_date": "2025-01-01T00:00:00"}
+
+
+def test_ensure_bodies_writes_into_custom_bodies_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # Any write to the default analysis_bodies/ would land here
+    entry = legacy_entry(tmp_path)
+    builder = make_builder(tmp_path)
+
+    assert builder.ensure_bodies([entry]) == 1
+    body = read_body(entry["id"], builder.bodies_dir)
+    assert body["era"] == "March 1994"
+    assert "source_terms" not in body
+    assert "Rules everywhere." in body["generated_html"]
+    assert not os.path.exists(body_path(entry["id"]))
+    assert builder.ensure_bodies([entry]) == 0
+
+
+def test_build_renders_from_custom_bodies_dir(tmp_path):
+    builder = make_builder(tmp_path)
+    entry = {"id": "analysis_a", "title": "AI in the Era of May 1990", "summary": "S.",
+             "html_path": str(tmp_path / "generated_articles" / "ai_analysis_a.html"), "generated_date": "2025-01-01T00:00:00"}
+    write_body(entry["id"], "May 1990", "<h1>AI in the Era of May 1990</h1>", bodies_dir=builder.bodies_dir)
+
+    stats = builder.build([entry])
+    assert stats["pages"] == 1 and stats["pages_written"] == 1
+    assert "AI in the Era of May 1990" in open(entry["html_path"], encoding='utf-8').read()
+    assert make_builder(tmp_path).build([entry])["pages_stale"] == 0
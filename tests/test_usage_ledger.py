@@ -0,0 +1,102 @@
+# tests/test_usage_ledger.py (Usage Ledger: Daily Quota Errors, Rate-Limit Retries and Shared Free Allowance)
+
+import json
+from datetime import date
+
+import generate_ai_analysis as gaa
+from usage_ledger import UsageLedger, is_daily_quota_error
+
+PRICES = {"cse_free_per_day": 100, "cse_per_query": 0.005, "gemini_input_per_mtok": 0.1, "gemini_output_per_mtok": 0.4}
+CSE_DAILY_ERROR = json.dumps({"error": {"code": 429, "message": "Quota exceeded for quota metric 'Queries' and limit 'Queries per day' of service 'customsearch.googleapis.com'"}})
+CSE_MINUTE_ERROR = json.dumps({"error": {"code": 429, "message": "Quota exceeded for quota metric 'Queries' and limit 'Queries per minute' of service 'customsearch.googleapis.com'"}})
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.text = json.dumps(body) if isinstance(body, dict) else body
+        self.headers = {}
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise gaa.requests.exceptions.HTTPError(f"{self.status_code} error")
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+def ledger(path, cse_limit=100, prices=PRICES, extra_paths=()):
+    return UsageLedger(str(path), cse_limit, 1500, 1_000_000, prices, extra_paths=extra_paths)
+
+
+def test_only_daily_limits_count_as_exhausted():
+    assert is_daily_quota_error(CSE_DAILY_ERROR)
+    assert is_daily_quota_error("429 Quota exceeded ... quota_id: \"GenerateRequestsPerDayPerProjectPerModel-FreeTier\"")
+    assert not is_daily_quota_error(CSE_MINUTE_ERROR)
+    assert not is_daily_quota_error("429 Quota exceeded ... quota_id: \"GenerateRequestsPerMinutePerProjectPerModel-FreeTier\"")
+
+
+def cse_run(tmp_path, monkeypatch, responses):
+    session = FakeSession(responses)
+    usage = ledger(tmp_path / "usage_ledger.jsonl")
+    monkeypatch.setattr(gaa, "HTTP_SESSION", session)
+    monkeypatch.setattr(gaa, "USAGE_LEDGER", usage)
+    monkeypatch.setattr(gaa, "CASSETTE", None)
+    monkeypatch.setattr(gaa, "GOOGLE_API_KEY", "key")
+    monkeypatch.setattr(gaa, "GOOGLE_CSE_ID", "cx")
+    monkeypatch.setattr(gaa, "pause", lambda seconds: None)
+    results, _ = gaa.fetch_google_cse_page("neural networks")
+    return session, usage, results
+
+
+def test_cse_rate_limit_is_retried_not_exhausted(tmp_path, monkeypatch):
+    item = {"link": "https://aaai.org/papers/1.html", "title": "Neural networks", "snippet": "AI"}
+    session, usage, _ = cse_run(tmp_path, monkeypatch, [FakeResponse(429, CSE_MINUTE_ERROR), FakeResponse(200, {"items": [item]})])
+    assert session.calls == 2
+    assert usage.remaining()["cse"] == 99
+
+
+def test_cse_daily_quota_marks_exhausted(tmp_path, monkeypatch):
+    session, usage, results = cse_run(tmp_path, monkeypatch, [FakeResponse(429, CSE_DAILY_ERROR)])
+    assert session.calls == 1 and results == []
+    assert usage.remaining()["cse"] == 0
+
+
+def test_free_cse_allowance_applies_once_across_shards(tmp_path):
+    shard_prices = dict(PRICES, cse_free_per_day=0)
+    paths = [tmp_path / f"usage_ledger.shard-{n}-of-2.jsonl" for n in (1, 2)]
+    for path in paths:
+        shard = ledger(path, cse_limit=50, prices=shard_prices)
+        for _ in range(60):
+            shard.record_cse()
+    assert shard.cost(shard.usage()) == 60 * 0.005
+
+    merged = ledger(tmp_path / "usage_ledger.jsonl", extra_paths=[str(p) for p in paths])
+    assert merged.usage()["cse"] == 120
+    assert round(merged.cost(merged.usage()), 6) == 20 * 0.005
+
+
+def test_totals_reset_at_pacific_midnight(tmp_path):
+    path = tmp_path / "usage_ledger.jsonl"
+    # 06:59 / 07:01 UTC on 10 March 2026 are either side of midnight PDT (UTC-7, DST began 8 March)
+    entries = [{"kind": "cse", "ts": "2026-03-10T06:59:00+00:00"},
+               {"kind": "gemini", "input_tokens": 1000, "output_tokens": 200, "ts": "2026-03-10T06:59:30+00:00"},
+               {"kind": "cse", "ts": "2026-03-10T07:01:00+00:00"},
+               {"kind": "exhausted", "service": "cse", "ts": "2026-03-10T06:00:00+00:00"}]
+    path.write_text("".join(json.dumps(entry) + "\n" for entry in entries), encoding='utf-8')
+
+    usage = ledger(path)
+    before, after = usage.usage(date(2026, 3, 9)), usage.usage(date(2026, 3, 10))
+    assert (before["cse"], before["gemini_requests"], before["input_tokens"]) == (1, 1, 1000)
+    assert before["exhausted"] == {"cse"}
+    assert (after["cse"], after["gemini_requests"], after["exhausted"]) == (1, 0, set())
@@ -0,0 +1,153 @@
+# usage_ledger.py (Persistent CSE/Gemini Usage Ledger with Daily Budgets and Cost Reporting)
+
+import os
+import re
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+# Google resets both the Custom Search and the Gemini free-tier daily quotas at midnight Pacific.
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+
+KIND_CSE = "cse"
+KIND_GEMINI = "gemini"
+KIND_PUBLISHED = "published"
+KIND_EXHAUSTED = "exhausted" # The API itself said the daily quota is gone, whatever our count says
+
+# Quota errors name the limit they hit ("Queries per day", "GenerateRequestsPerDayPerProjectPerModel-FreeTier",
+# "dailyLimitExceeded"); per-minute rate limits clear on their own and only call for a backoff.
+DAILY_QUOTA_PATTERN = re.compile(r'per\s*day|daily', re.IGNORECASE)
+
+
+def is_daily_quota_error(detail):
+    """True if a 429 / ResourceExhausted error body or message names a daily limit."""
+    return bool(DAILY_QUOTA_PATTERN.search(str(detail or "")))
+
+
+class UsageLedger:
+    """
+    Append-only JSON Lines record of every billable call (CSE queries, Gemini requests with
+    their input/output token counts) and every published analysis. The run loop asks it how
+    much of today's budget is left instead of guessing with a fixed attempt count.
+    `extra_paths` are other ledgers (e.g. every shard's) folded into the totals read-only.
+    """
+
+    def __init__(self, path, cse_daily_limit, gemini_daily_requests, gemini_daily_tokens, prices, extra_paths=()):
+        self.path = path
+        self.limits = {"cse": cse_daily_limit, "gemini_requests": gemini_daily_requests, "gemini_tokens": gemini_daily_tokens}
+        self.prices = prices
+        self.lock = threading.Lock()
+        self.days = {} # Quota day -> running totals, so budget checks never rescan the ledger
+        for ledger_path in (path, *extra_paths):
+            self._load(ledger_path)
+
+    def _load(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # Torn final line from an interrupted run
+                self._tally(entry, self._quota_day(entry["ts"]))
+
+    def _tally(self, entry, day):
+        totals = self.days.setdefault(day, {"cse": 0, "gemini_requests": 0, "input_tokens": 0, "output_tokens": 0,
+                                            "published": 0, "exhausted": set()})
+        kind = entry["kind"]
+        if kind == KIND_CSE:
+            totals["cse"] += 1
+        elif kind == KIND_GEMINI:
+            totals["gemini_requests"] += 1
+            totals["input_tokens"] += entry["input_tokens"]
+            totals["output_tokens"] += entry["output_tokens"]
+        elif kind == KIND_PUBLISHED:
+            totals["published"] += 1
+        elif kind == KIND_EXHAUSTED:
+            totals["exhausted"].add(entry["service"])
+
+    def _append(self, entry):
+        now = datetime.now(timezone.utc)
+        entry["ts"] = now.isoformat()
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._tally(entry, now.astimezone(QUOTA_TIMEZONE).date())
+
+    def record_cse(self):
+        self._append({"kind": KIND_CSE})
+
+    def record_gemini(self, input_tokens, output_tokens):
+        self._append({"kind": KIND_GEMINI, "input_tokens": int(input_tokens or 0), "output_tokens": int(output_tokens or 0)})
+
+    def record_published(self, analysis_id):
+        self._append({"kind": KIND_PUBLISHED, "analysis_id": analysis_id})
+
+    def record_exhausted(self, service):
+        self._append({"kind": KIND_EXHAUSTED, "service": service})
+
+    @staticmethod
+    def _quota_day(ts):
+        return datetime.fromisoformat(ts).astimezone(QUOTA_TIMEZONE).date()
+
+    def usage(self, day=None):
+        day = day or datetime.now(QUOTA_TIMEZONE).date()
+        with self.lock:
+            totals = self.days.get(day)
+            if totals is None:
+                return {"cse": 0, "gemini_requests": 0, "input_tokens": 0, "output_tokens": 0, "published": 0, "exhausted": set()}
+            return dict(totals, exhausted=set(totals["exhausted"]))
+
+    def remaining(self):
+        """What is left of today's budget: CSE queries, Gemini requests and Gemini tokens."""
+        used = self.usage()
+        remaining = {
+            "cse": max(0, self.limits["cse"] - used["cse"]),
+            "gemini_requests": max(0, self.limits["gemini_requests"] - used["gemini_requests"]),
+            "gemini_tokens": max(0, self.limits["gemini_tokens"] - used["input_tokens"] - used["output_tokens"]),
+        }
+        if "cse" in used["exhausted"]:
+            remaining["cse"] = 0
+        if "gemini" in used["exhausted"]:
+            remaining["gemini_requests"] = remaining["gemini_tokens"] = 0
+        return remaining
+
+    def has_budget(self, service):
+        remaining = self.remaining()
+        if service == KIND_CSE:
+            return remaining["cse"] > 0
+        return remaining["gemini_requests"] > 0 and remaining["gemini_tokens"] > 0
+
+    def cost(self, usage):
+        """
+        Dollar cost of a day's usage; CSE bills only past its free daily allowance. Shard ledgers
+        get an allowance of zero: it is shared, so the merge command applies it once to the total.
+        """
+        billable_cse = max(0, usage["cse"] - self.prices["cse_free_per_day"])
+        return (billable_cse * self.prices["cse_per_query"]
+                + usage["input_tokens"] / 1e6 * self.prices["gemini_input_per_mtok"]
+                + usage["output_tokens"] / 1e6 * self.prices["gemini_output_per_mtok"])
+
+    def report(self):
+        today = self.usage()
+        with self.lock:
+            days = list(self.days.values())
+        total_cost = sum(self.cost(totals) for totals in days)
+        total_published = sum(totals["published"] for totals in days)
+        today_cost = self.cost(today)
+        remaining = self.remaining()
+        logging.info(
+            f"Usage today: {today['cse']}/{self.limits['cse']} CSE queries, {today['gemini_requests']}/{self.limits['gemini_requests']} Gemini requests, "
+            f"{today['input_tokens']}+{today['output_tokens']} tokens (remaining: {remaining['cse']} CSE, {remaining['gemini_requests']} Gemini requests)."
+        )
+        logging.info(
+            f"Cost today: ${today_cost:.4f} for {today['published']} published analyses"
+            + (f" (${today_cost / today['published']:.4f} each)" if today['published'] else "")
+            + f". All time: ${total_cost:.4f} for {total_published}"
+            + (f" (${total_cost / total_published:.4f} each)." if total_published else ".")
+        )